@@ -0,0 +1,5 @@
+export HTTP_PROXY=http://127.0.0.1:7890
+export HTTPS_PROXY=http://127.0.0.1:7890
+
+cd src/gen
+python pipeline.py --start-date 2023-01-01 --end-date 2025-12-31 --compute-workers 2 --queue-size 4
\ No newline at end of file
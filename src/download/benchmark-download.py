@@ -0,0 +1,80 @@
+#!/usr/bin/env python
+
+"""
+  Benchmark the download engine against the local fixture server.
+
+  Starts fixture.py in-process, points the downloaders at it and downloads the whole
+  synthetic tree once per worker count into a fresh directory, reporting files/s and
+  MB/s together with the retries the injected errors caused.
+
+  e.g. python benchmark-download.py -workers 1 4 8 16 -latency 0.05 -bandwidth 2 -truncate 0.05 -c 1
+"""
+
+import os
+import sys
+import time as time_module
+import shutil
+import tempfile
+from argparse import ArgumentParser
+from fixture import add_fixture_arguments, fixture_from_args
+
+
+def run_benchmark(server, tree, workers, checksum=0, plan=0):
+  """Download every archive of tree into a temporary directory; returns the measurements"""
+  # enums reads the base URLs at import time
+  from utility import download_files_concurrently
+  from planner import sync_files
+
+  jobs = [(key.rsplit('/', 1)[0] + '/', key.rsplit('/', 1)[1]) for key in tree.archive_keys()]
+  folder = tempfile.mkdtemp(prefix='binance-benchmark-')
+  before = server.snapshot()
+  start_time = time_module.time()
+  try:
+    if plan == 1:
+      succeeded = sync_files(jobs, None, folder, checksum, workers)
+    else:
+      succeeded = download_files_concurrently(jobs, None, folder, checksum, workers)
+    elapsed = time_module.time() - start_time
+  finally:
+    shutil.rmtree(folder, ignore_errors=True)
+
+  after = server.snapshot()
+  stats = {key: after[key] - before[key] for key in after}
+  stats.update(workers=workers, files=len(jobs), succeeded=succeeded, seconds=elapsed,
+               files_per_second=succeeded / elapsed if elapsed else 0,
+               mb_per_second=stats['bytes_sent'] / 1e6 / elapsed if elapsed else 0)
+  return stats
+
+def print_report(results):
+  print("\n{:>7} {:>7} {:>7} {:>9} {:>8} {:>8} {:>8} {:>8} {:>8} {:>6} {:>6} {:>6}".format(
+    'workers', 'files', 'ok', 'MB', 'seconds', 'files/s', 'MB/s', 'requests', 'ranges', '404', '5xx', 'cut'))
+  for r in results:
+    print("{:>7} {:>7} {:>7} {:>9.1f} {:>8.2f} {:>8.1f} {:>8.2f} {:>8} {:>8} {:>6} {:>6} {:>6}".format(
+      r['workers'], r['files'], r['succeeded'], r['bytes_sent'] / 1e6, r['seconds'], r['files_per_second'],
+      r['mb_per_second'], r['requests'], r['ranges'], r['injected_404'], r['injected_5xx'], r['truncated']))
+
+if __name__ == "__main__":
+    parser = ArgumentParser(description="Benchmark the downloaders against a local synthetic data.binance.vision")
+    parser.add_argument(
+        '-workers', dest='workers', default=[1, 4, 8, 16], type=int, nargs='+',
+        help='Worker counts to benchmark, default 1 4 8 16')
+    parser.add_argument(
+        '-c', dest='checksum', default=0, type=int, choices=[0, 1],
+        help='1 to download and verify checksum files, default 0')
+    parser.add_argument(
+        '-plan', dest='plan', default=0, type=int, choices=[0, 1],
+        help='1 to go through the sync planner (remote listing first), default 0')
+    add_fixture_arguments(parser)
+    args = parser.parse_args(sys.argv[1:])
+
+    tree, server = fixture_from_args(args)
+    os.environ['BINANCE_BASE_URL'] = server.url + '/'
+    os.environ['BINANCE_LISTING_URL'] = server.url + '/bucket'
+
+    print("Generating {} archives".format(len(tree.archive_keys())))
+    for key in tree.archive_keys():
+      tree.get(key)
+
+    results = [run_benchmark(server, tree, workers, args.checksum, args.plan) for workers in args.workers]
+    print_report(results)
+    server.shutdown()
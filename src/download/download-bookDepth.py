@@ -12,12 +12,12 @@ import sys
 from datetime import *
 import pandas as pd
 from enums import *
-from utility import download_file, get_all_symbols, get_parser, get_start_end_date_objects, convert_to_date_object, \
-  get_path
+from utility import download_files_concurrently, get_all_symbols, get_parser, get_start_end_date_objects, convert_to_date_object, \
+  get_path, open_verified_ledger, open_symbol_registry, audit_archives, convert_archives
+from planner import sync_files
 
 
-def download_daily_book_depth(trading_type, symbols, num_symbols, dates, start_date, end_date, folder, checksum):
-  current = 0
+def download_daily_book_depth(trading_type, symbols, num_symbols, dates, start_date, end_date, folder, checksum, workers, ledger=None, plan=1, dry_run=0, registry=None):
   date_range = None
 
   if start_date and end_date:
@@ -35,68 +35,45 @@ def download_daily_book_depth(trading_type, symbols, num_symbols, dates, start_d
 
   print("Found {} symbols".format(num_symbols))
 
+  jobs = []
   for symbol in symbols:
-    print("[{}/{}] - start download daily {} bookDepth ".format(current+1, num_symbols, symbol))
     for date in dates:
       current_date = convert_to_date_object(date)
       if current_date >= start_date and current_date <= end_date:
         path = get_path(trading_type, "bookDepth", "daily", symbol)
         file_name = "{}-bookDepth-{}.zip".format(symbol.upper(), date)
+        jobs.append((path, file_name))
 
-        checksum_file_path = None
-
-        # If checksum verification is enabled, download checksum file first
-        if checksum == 1:
-          checksum_path = get_path(trading_type, "bookDepth", "daily", symbol)
-          checksum_file_name = "{}-bookDepth-{}.zip.CHECKSUM".format(symbol.upper(), date)
-
-          # Download checksum file
-          checksum_success = download_file(checksum_path, checksum_file_name, date_range, folder)
-
-          if checksum_success:
-            # Build the full path to the checksum file
-            import os
-            base_path = checksum_path
-            if folder:
-              base_path = os.path.join(folder, base_path)
-            if date_range:
-              date_range_str = date_range.replace(" ", "_")
-              base_path = os.path.join(base_path, date_range_str)
-            from utility import get_destination_dir
-            checksum_file_path = get_destination_dir(os.path.join(base_path, checksum_file_name), folder)
-
-            # Verify checksum file is valid (should contain SHA256 hash)
-            if os.path.exists(checksum_file_path):
-              try:
-                with open(checksum_file_path, 'r') as f:
-                  checksum_content = f.read().strip()
-                  # Basic validation: SHA256 hash should be 64 hex characters
-                  hash_value = checksum_content.split()[0]
-                  if len(hash_value) != 64 or not all(c in '0123456789abcdefABCDEF' for c in hash_value):
-                    print("\nWarning: Checksum file appears to be invalid: {}".format(checksum_file_path))
-                    checksum_file_path = None
-              except Exception as e:
-                print("\nWarning: Failed to validate checksum file: {}".format(str(e)))
-                checksum_file_path = None
-
-        # Download the data file with checksum verification
-        download_file(path, file_name, date_range, folder, checksum_file_path)
-
-    current += 1
+  if plan == 1 or dry_run == 1:
+    sync_files(jobs, date_range, folder, checksum, workers, ledger, dry_run, registry)
+  else:
+    download_files_concurrently(jobs, date_range, folder, checksum, workers, ledger)
 
 if __name__ == "__main__":
     parser = get_parser('bookDepth')
     args = parser.parse_args(sys.argv[1:])
 
+    registry = open_symbol_registry(args.type, args.folder, args.refresh_symbols)
     if not args.symbols:
       print("fetching all symbols from exchange")
-      symbols = get_all_symbols(args.type)
+      symbols = get_all_symbols(args.type, registry=registry)
       num_symbols = len(symbols)
     else:
       symbols = args.symbols
       num_symbols = len(symbols)
       print("fetching {} symbols from exchange".format(num_symbols))
 
+    ledger = None
+    if args.checksum == 1 or args.audit == 1:
+      ledger = open_verified_ledger(args.folder, args.reverify)
+
+    dataset_paths = [get_path(args.type, "bookDepth", "daily", symbol) for symbol in symbols]
+
+    if args.audit == 1:
+      failed = audit_archives(dataset_paths, args.folder, args.workers, ledger)
+      ledger.close()
+      sys.exit(1 if failed else 0)
+
     if args.dates:
       dates = args.dates
     else:
@@ -106,4 +83,10 @@ if __name__ == "__main__":
       dates = [date.strftime("%Y-%m-%d") for date in dates]
     print("dates: {}".format(dates))
     # Only support daily download for bookDepth
-    download_daily_book_depth(args.type, symbols, num_symbols, dates, args.startDate, args.endDate, args.folder, args.checksum)
+    download_daily_book_depth(args.type, symbols, num_symbols, dates, args.startDate, args.endDate, args.folder, args.checksum, args.workers, ledger, args.plan, args.dry_run, registry)
+
+    if args.convert == 1 and args.dry_run == 0:
+      convert_archives(dataset_paths, args.folder, args.workers, args.keep_zip, args.checksum, ledger)
+
+    if ledger is not None:
+      ledger.close()
@@ -1,3 +1,4 @@
+import os
 from datetime import *
 
 YEARS = ['2017', '2018', '2019', '2020', '2021', '2022', '2023', '2024', '2025']
@@ -6,6 +7,8 @@ DAILY_INTERVALS = ["1s", "1m", "3m", "5m", "15m", "30m", "1h", "2h", "4h", "6h",
 TRADING_TYPE = ["spot", "um", "cm"]
 MONTHS = list(range(1,13))
 PERIOD_START_DATE = '2023-01-01'
-BASE_URL = 'https://data.binance.vision/'
+# BINANCE_BASE_URL and BINANCE_LISTING_URL point the downloaders at a local stand-in such as fixture.py
+BASE_URL = os.environ.get('BINANCE_BASE_URL', 'https://data.binance.vision/')
 START_DATE = date(int(YEARS[0]), MONTHS[0], 1)
 END_DATE = datetime.date(datetime.now())
+S3_LISTING_URL = os.environ.get('BINANCE_LISTING_URL', 'https://s3-ap-northeast-1.amazonaws.com/data.binance.vision')
@@ -0,0 +1,306 @@
+#!/usr/bin/env python
+
+"""
+  Local stand-in for data.binance.vision, for exercising the downloaders offline.
+
+  Serves a synthetic tree in the data/futures/<type>/daily/... layout (bookDepth and
+  1m klines archives with their .CHECKSUM files) plus the S3 bucket listing the sync
+  planner reads (any path with a prefix= query). Latency, per-response bandwidth, error
+  injection (404, 503, truncated bodies) and Range requests are configurable, so
+  concurrency, retries and resumes can be measured without the network.
+
+  e.g. python fixture.py -port 8765 -latency 0.05 -bandwidth 5 -truncate 0.1
+       BINANCE_BASE_URL=http://127.0.0.1:8765/ BINANCE_LISTING_URL=http://127.0.0.1:8765/bucket \
+         python download-bookDepth.py -t um -s BTCUSDT -startDate 2024-01-01 -endDate 2024-01-31 -c 1
+"""
+
+import io
+import re
+import sys
+import time as time_module
+import random
+import zipfile
+import hashlib
+import threading
+from datetime import date, timedelta
+from urllib.parse import urlsplit, parse_qs
+from xml.sax.saxutils import escape
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+from argparse import ArgumentParser
+
+FIXTURE_SYMBOLS = ['BTCUSDT', 'ETHUSDT']
+FIXTURE_START_DATE = '2024-01-01'
+FIXTURE_DAYS = 30
+FIXTURE_BOOK_DEPTH_ROWS = 5000
+LISTING_PAGE_SIZE = 1000
+SEND_CHUNK_SIZE = 64 * 1024
+RANGE_PATTERN = re.compile(r'bytes=(\d+)-(\d*)$')
+S3_XMLNS = 'http://s3.amazonaws.com/doc/2006-03-01/'
+
+
+def _book_depth_csv(rng, day, rows):
+  lines = ['timestamp,percentage,depth,notional']
+  for i in range(rows):
+    seconds = i * 86400 // rows
+    timestamp = '{} {:02d}:{:02d}:{:02d}'.format(day, seconds // 3600, seconds // 60 % 60, seconds % 60)
+    depth = rng.uniform(100, 10000)
+    lines.append('{},{},{:.2f},{:.5f}'.format(timestamp, rng.randint(-5, 5), depth, depth * rng.uniform(40000, 45000)))
+  return '\n'.join(lines) + '\n'
+
+def _kline_csv(rng, day):
+  lines = ['open_time,open,high,low,close,volume,close_time,quote_volume,count,taker_buy_volume,taker_buy_quote_volume,ignore']
+  start = (date.fromisoformat(day) - date(1970, 1, 1)).days * 86400000
+  price = rng.uniform(40000, 45000)
+  for minute in range(1440):
+    open_time = start + minute * 60000
+    close = price * (1 + rng.gauss(0, 0.0005))
+    volume = rng.uniform(1, 100)
+    lines.append('{},{:.2f},{:.2f},{:.2f},{:.2f},{:.3f},{},{:.4f},{},{:.3f},{:.4f},0'.format(
+      open_time, price, max(price, close) * 1.0002, min(price, close) * 0.9998, close, volume,
+      open_time + 59999, volume * close, rng.randint(100, 2000), volume / 2, volume * close / 2))
+    price = close
+  return '\n'.join(lines) + '\n'
+
+
+class FixtureTree:
+  """
+  Synthetic archives keyed by their path on data.binance.vision.
+  Archives are generated on first request (deterministically per path) and kept in memory.
+  """
+
+  def __init__(self, symbols=FIXTURE_SYMBOLS, start_date=FIXTURE_START_DATE, days=FIXTURE_DAYS,
+               rows=FIXTURE_BOOK_DEPTH_ROWS, trading_type='um'):
+    self.rows = rows
+    self._files = {}
+    self._lock = threading.Lock()
+    self._generators = {}
+    first_day = date.fromisoformat(start_date)
+    for symbol in symbols:
+      for offset in range(days):
+        day = (first_day + timedelta(days=offset)).isoformat()
+        book_depth = 'data/futures/{}/daily/bookDepth/{}/{}-bookDepth-{}.zip'.format(trading_type, symbol, symbol, day)
+        klines = 'data/futures/{}/daily/klines/{}/1m/{}-1m-{}.zip'.format(trading_type, symbol, symbol, day)
+        self._generators[book_depth] = lambda rng, day=day: _book_depth_csv(rng, day, self.rows)
+        self._generators[klines] = lambda rng, day=day: _kline_csv(rng, day)
+
+  def archive_keys(self):
+    return sorted(self._generators)
+
+  def _build(self, key):
+    csv_text = self._generators[key](random.Random(key))
+    buffer = io.BytesIO()
+    with zipfile.ZipFile(buffer, 'w', compression=zipfile.ZIP_DEFLATED) as z:
+      z.writestr(key.rsplit('/', 1)[1][:-len('.zip')] + '.csv', csv_text)
+    archive = buffer.getvalue()
+    checksum = '{}  {}\n'.format(hashlib.sha256(archive).hexdigest(), key.rsplit('/', 1)[1]).encode()
+    self._files[key] = archive
+    self._files[key + '.CHECKSUM'] = checksum
+
+  def get(self, key):
+    """Body of a file, or None if it is not part of the tree"""
+    archive_key = key[:-len('.CHECKSUM')] if key.endswith('.CHECKSUM') else key
+    if archive_key not in self._generators:
+      return None
+    with self._lock:
+      if key not in self._files:
+        self._build(archive_key)
+      return self._files[key]
+
+  def list(self, prefix):
+    """{key: size} of the files directly under prefix, as a delimiter='/' listing returns them"""
+    keys = [key for key in self._generators if key.startswith(prefix) and '/' not in key[len(prefix):]]
+    listing = {}
+    for key in keys:
+      listing[key] = len(self.get(key))
+      listing[key + '.CHECKSUM'] = len(self.get(key + '.CHECKSUM'))
+    return listing
+
+
+class FixtureServer(ThreadingHTTPServer):
+  """
+  HTTP server for a FixtureTree.
+  latency is added to every response (seconds), bandwidth caps each response body (bytes/s, 0 for
+  no cap), and the *_rate arguments are the fraction of file requests answered with a 404, a 503,
+  or a body cut off halfway.
+  """
+
+  daemon_threads = True
+
+  def __init__(self, address, tree, latency=0.0, bandwidth=0, not_found_rate=0.0, server_error_rate=0.0,
+               truncate_rate=0.0, page_size=LISTING_PAGE_SIZE, seed=0):
+    super().__init__(address, FixtureHandler)
+    self.tree = tree
+    self.latency = latency
+    self.bandwidth = bandwidth
+    self.not_found_rate = not_found_rate
+    self.server_error_rate = server_error_rate
+    self.truncate_rate = truncate_rate
+    self.page_size = page_size
+    self._rng = random.Random(seed)
+    self._lock = threading.Lock()
+    self.stats = {'requests': 0, 'listings': 0, 'ranges': 0, 'bytes_sent': 0,
+                  'injected_404': 0, 'injected_5xx': 0, 'truncated': 0}
+
+  @property
+  def url(self):
+    return 'http://{}:{}'.format(*self.server_address[:2])
+
+  def count(self, key, n=1):
+    with self._lock:
+      self.stats[key] += n
+
+  def roll(self):
+    with self._lock:
+      return self._rng.random()
+
+  def snapshot(self):
+    with self._lock:
+      return dict(self.stats)
+
+
+class FixtureHandler(BaseHTTPRequestHandler):
+  protocol_version = 'HTTP/1.1'
+
+  def log_message(self, format, *args):
+    pass
+
+  def _send_empty(self, status, headers=None):
+    self.send_response(status)
+    for name, value in (headers or {}).items():
+      self.send_header(name, value)
+    self.send_header('Content-Length', '0')
+    self.end_headers()
+
+  def _send_body(self, status, body, headers=None, cut_at=None):
+    self.send_response(status)
+    for name, value in (headers or {}).items():
+      self.send_header(name, value)
+    self.send_header('Content-Length', str(len(body)))
+    self.end_headers()
+
+    end = len(body) if cut_at is None else cut_at
+    bandwidth = self.server.bandwidth
+    for start in range(0, end, SEND_CHUNK_SIZE):
+      chunk = body[start:min(start + SEND_CHUNK_SIZE, end)]
+      self.wfile.write(chunk)
+      self.server.count('bytes_sent', len(chunk))
+      if bandwidth:
+        time_module.sleep(len(chunk) / bandwidth)
+    if cut_at is not None:
+      self.wfile.flush()
+      self.close_connection = True
+
+  def _send_listing(self, query):
+    prefix = query.get('prefix', [''])[0]
+    marker = query.get('marker', [''])[0]
+    entries = sorted(entry for entry in self.server.tree.list(prefix).items() if entry[0] > marker)
+    page = entries[:self.server.page_size]
+    contents = ''.join('<Contents><Key>{}</Key><Size>{}</Size></Contents>'.format(escape(key), size) for key, size in page)
+    body = ('<?xml version="1.0" encoding="UTF-8"?>\n<ListBucketResult xmlns="{}"><Prefix>{}</Prefix>'
+            '<IsTruncated>{}</IsTruncated>{}{}</ListBucketResult>').format(
+      S3_XMLNS, escape(prefix), 'true' if len(entries) > len(page) else 'false',
+      '<NextMarker>{}</NextMarker>'.format(escape(page[-1][0])) if len(entries) > len(page) else '', contents).encode()
+    self.server.count('listings')
+    self._send_body(200, body, {'Content-Type': 'application/xml'})
+
+  def do_GET(self):
+    self.server.count('requests')
+    if self.server.latency:
+      time_module.sleep(self.server.latency)
+
+    parts = urlsplit(self.path)
+    query = parse_qs(parts.query)
+    if 'prefix' in query:
+      return self._send_listing(query)
+
+    body = self.server.tree.get(parts.path.lstrip('/'))
+    roll = self.server.roll()
+    if body is None or roll < self.server.not_found_rate:
+      if body is not None:
+        self.server.count('injected_404')
+      return self._send_empty(404)
+    roll -= self.server.not_found_rate
+    if roll < self.server.server_error_rate:
+      self.server.count('injected_5xx')
+      return self._send_empty(503)
+    roll -= self.server.server_error_rate
+
+    status, headers = 200, {'Accept-Ranges': 'bytes'}
+    match = RANGE_PATTERN.match(self.headers.get('Range', ''))
+    if match:
+      self.server.count('ranges')
+      start = int(match.group(1))
+      end = min(int(match.group(2)), len(body) - 1) if match.group(2) else len(body) - 1
+      if start >= len(body):
+        return self._send_empty(416, {'Content-Range': 'bytes */{}'.format(len(body))})
+      headers['Content-Range'] = 'bytes {}-{}/{}'.format(start, end, len(body))
+      status, body = 206, body[start:end + 1]
+
+    cut_at = None
+    if roll < self.server.truncate_rate and len(body) > 1:
+      self.server.count('truncated')
+      cut_at = len(body) // 2
+    self._send_body(status, body, headers, cut_at)
+
+
+def start_fixture_server(tree, port=0, **options):
+  """Start a FixtureServer on 127.0.0.1 in a daemon thread; port 0 picks a free port"""
+  server = FixtureServer(('127.0.0.1', port), tree, **options)
+  threading.Thread(target=server.serve_forever, name='fixture-server', daemon=True).start()
+  return server
+
+def add_fixture_arguments(parser):
+  parser.add_argument(
+      '-s', dest='symbols', default=FIXTURE_SYMBOLS, nargs='+',
+      help='Symbols in the synthetic tree, default {}'.format(' '.join(FIXTURE_SYMBOLS)))
+  parser.add_argument(
+      '-startDate', dest='startDate', default=FIXTURE_START_DATE,
+      help='First date in the synthetic tree, default {}'.format(FIXTURE_START_DATE))
+  parser.add_argument(
+      '-days', dest='days', default=FIXTURE_DAYS, type=int,
+      help='Number of days per symbol, default {}'.format(FIXTURE_DAYS))
+  parser.add_argument(
+      '-rows', dest='rows', default=FIXTURE_BOOK_DEPTH_ROWS, type=int,
+      help='Rows per bookDepth archive, default {}'.format(FIXTURE_BOOK_DEPTH_ROWS))
+  parser.add_argument(
+      '-latency', dest='latency', default=0.0, type=float,
+      help='Seconds added to every response, default 0')
+  parser.add_argument(
+      '-bandwidth', dest='bandwidth', default=0.0, type=float,
+      help='MB/s cap per response body, 0 for no cap, default 0')
+  parser.add_argument(
+      '-not-found', dest='not_found', default=0.0, type=float,
+      help='Fraction of file requests answered with 404, default 0')
+  parser.add_argument(
+      '-server-error', dest='server_error', default=0.0, type=float,
+      help='Fraction of file requests answered with 503, default 0')
+  parser.add_argument(
+      '-truncate', dest='truncate', default=0.0, type=float,
+      help='Fraction of file requests whose body is cut off halfway, default 0')
+  parser.add_argument(
+      '-seed', dest='seed', default=0, type=int,
+      help='Seed for error injection, default 0')
+
+def fixture_from_args(args, port=0):
+  """Build the tree and start the server described by add_fixture_arguments options"""
+  tree = FixtureTree(args.symbols, args.startDate, args.days, args.rows)
+  return tree, start_fixture_server(
+    tree, port, latency=args.latency, bandwidth=int(args.bandwidth * 1e6), not_found_rate=args.not_found,
+    server_error_rate=args.server_error, truncate_rate=args.truncate, seed=args.seed)
+
+if __name__ == "__main__":
+    parser = ArgumentParser(description="Serve a synthetic data.binance.vision tree on 127.0.0.1")
+    parser.add_argument(
+        '-port', dest='port', default=8765, type=int,
+        help='Port to listen on, default 8765')
+    add_fixture_arguments(parser)
+    args = parser.parse_args(sys.argv[1:])
+
+    tree, server = fixture_from_args(args, args.port)
+    print("Serving {} archives at {}/".format(len(tree.archive_keys()), server.url))
+    print("export BINANCE_BASE_URL={}/ BINANCE_LISTING_URL={}/bucket".format(server.url, server.url))
+    try:
+      while True:
+        time_module.sleep(60)
+    except KeyboardInterrupt:
+      server.shutdown()
@@ -0,0 +1,68 @@
+"""
+  Persistent record of archives whose SHA256 already matched their .CHECKSUM file.
+
+  An entry is keyed by the archive path and only trusted while the file's size and
+  mtime are unchanged, so a replaced or truncated archive is always rehashed.
+"""
+
+import os
+import sqlite3
+import threading
+import time as time_module
+
+LEDGER_FILE_NAME = '.verified-archives.sqlite'
+
+
+class VerifiedLedger:
+  """SQLite ledger of verified archives, safe to share between download worker threads"""
+
+  def __init__(self, db_path, reverify=False):
+    self.db_path = db_path
+    # with reverify set, lookups always miss but fresh results are still recorded
+    self.reverify = reverify
+    self._lock = threading.Lock()
+    self._conn = sqlite3.connect(db_path, check_same_thread=False)
+    with self._lock:
+      self._conn.execute('PRAGMA journal_mode=WAL')
+      self._conn.execute(
+        'CREATE TABLE IF NOT EXISTS verified ('
+        ' path TEXT PRIMARY KEY,'
+        ' size INTEGER NOT NULL,'
+        ' mtime_ns INTEGER NOT NULL,'
+        ' sha256 TEXT NOT NULL,'
+        ' verified_at REAL NOT NULL)')
+      self._conn.commit()
+
+  def lookup(self, file_path):
+    """Return the recorded SHA256 of file_path if the file is unchanged since it was verified"""
+    if self.reverify:
+      return None
+    try:
+      stat = os.stat(file_path)
+    except OSError:
+      return None
+    with self._lock:
+      row = self._conn.execute(
+        'SELECT size, mtime_ns, sha256 FROM verified WHERE path = ?',
+        (os.path.realpath(file_path),)).fetchone()
+    if row and row[0] == stat.st_size and row[1] == stat.st_mtime_ns:
+      return row[2]
+    return None
+
+  def record(self, file_path, sha256):
+    """Remember that file_path, as it is on disk now, hashes to sha256"""
+    stat = os.stat(file_path)
+    with self._lock:
+      self._conn.execute(
+        'INSERT OR REPLACE INTO verified (path, size, mtime_ns, sha256, verified_at) VALUES (?, ?, ?, ?, ?)',
+        (os.path.realpath(file_path), stat.st_size, stat.st_mtime_ns, sha256.lower(), time_module.time()))
+      self._conn.commit()
+
+  def forget(self, file_path):
+    with self._lock:
+      self._conn.execute('DELETE FROM verified WHERE path = ?', (os.path.realpath(file_path),))
+      self._conn.commit()
+
+  def close(self):
+    with self._lock:
+      self._conn.close()
@@ -0,0 +1,203 @@
+"""
+  Sync planner: decide which archives actually need to be requested.
+
+  Instead of issuing one request per candidate date, each dataset directory is listed
+  once remotely (the public S3 bucket listing behind data.binance.vision) and once
+  locally. Dates before a symbol's first published archive, dates that are not published
+  yet and archives already on disk drop out of the plan before any download starts.
+  With a symbol registry, dates outside a symbol's listing lifetime are dropped before
+  any listing request, so a directory of a delisted symbol is not listed at all.
+"""
+
+import os
+import re
+import json
+import urllib.error
+import xml.etree.ElementTree as ET
+from urllib.parse import quote
+from enums import *
+from utility import open_url, get_save_path, get_destination_dir, get_columnar_path, download_files_concurrently, \
+  DEFAULT_WORKERS, PART_SUFFIX
+
+MANIFEST_FILE_NAME = '.sync-manifest.json'
+S3_NAMESPACE = '{http://s3.amazonaws.com/doc/2006-03-01/}'
+ARCHIVE_DATE_PATTERN = re.compile(r'(\d{4}-\d{2}(?:-\d{2})?)\.zip$')
+
+
+def archive_date(file_name):
+  """Date ('YYYY-MM-DD') or month ('YYYY-MM') encoded in an archive name, or None"""
+  match = ARCHIVE_DATE_PATTERN.search(file_name)
+  return match.group(1) if match else None
+
+def list_remote_dir(base_path):
+  """
+  List the archives published under base_path, following pagination.
+  Returns {file_name: size_in_bytes} for the .zip files only.
+  """
+  archives = {}
+  marker = ''
+  while True:
+    url = '{}?delimiter=/&prefix={}'.format(S3_LISTING_URL, quote(base_path))
+    if marker:
+      url += '&marker={}'.format(quote(marker))
+    root = ET.fromstring(open_url(url).read())
+
+    keys = []
+    for content in root.iter(S3_NAMESPACE + 'Contents'):
+      key = content.findtext(S3_NAMESPACE + 'Key')
+      keys.append(key)
+      if key.endswith('.zip'):
+        archives[key[len(base_path):]] = int(content.findtext(S3_NAMESPACE + 'Size') or 0)
+
+    if root.findtext(S3_NAMESPACE + 'IsTruncated') != 'true' or not keys:
+      return archives
+    marker = root.findtext(S3_NAMESPACE + 'NextMarker') or keys[-1]
+
+def list_local_dir(base_path, date_range=None, folder=None):
+  """Return {file_name: size_in_bytes} for every finished file already stored for base_path"""
+  local_dir = os.path.dirname(get_save_path(base_path, 'x', date_range, folder))
+  files = {}
+  try:
+    with os.scandir(local_dir) as entries:
+      for entry in entries:
+        if entry.is_file() and not entry.name.endswith(PART_SUFFIX):
+          files[entry.name] = entry.stat().st_size
+  except FileNotFoundError:
+    pass
+  return files
+
+
+class SyncPlan:
+  """Outcome of planning: the jobs to run plus per-directory statistics for the summary"""
+
+  def __init__(self):
+    self.jobs = []
+    self.stale = []
+    self.directories = []
+
+  @property
+  def total_bytes(self):
+    return sum(d['bytes'] for d in self.directories)
+
+  def print_summary(self):
+    print("\nSync plan:")
+    for d in self.directories:
+      print("  {}: first available {}, {} candidates, {} present, {} unpublished, {} to fetch ({:.1f} MB){}{}{}".format(
+        d['path'], d['first_date'] or 'unknown', d['candidates'], d['present'], d['unpublished'],
+        d['fetch'], d['bytes'] / 1e6,
+        ", {} outside listing".format(d['unlisted']) if d['unlisted'] else '',
+        ", {} to verify".format(d['verify']) if d['verify'] else '',
+        '' if d['listed'] or d['unlisted'] == d['candidates'] else ' [remote listing unavailable]'))
+    fetch = sum(d['fetch'] for d in self.directories)
+    verify = sum(d['verify'] for d in self.directories)
+    unlisted = sum(d['unlisted'] for d in self.directories)
+    print("Total: {} files to fetch ({:.1f} MB), {} present files to verify, {} stale files to replace, {} dates outside listing".format(
+      fetch, self.total_bytes / 1e6, verify, len(self.stale), unlisted))
+
+
+def load_manifest(folder=None):
+  """First available dates learned by earlier runs, keyed by dataset path"""
+  try:
+    with open(get_destination_dir(MANIFEST_FILE_NAME, folder)) as f:
+      return json.load(f)
+  except (OSError, ValueError):
+    return {}
+
+def save_manifest(manifest, folder=None):
+  manifest_path = get_destination_dir(MANIFEST_FILE_NAME, folder)
+  os.makedirs(os.path.dirname(manifest_path), exist_ok=True)
+  with open(manifest_path + '.tmp', 'w') as f:
+    json.dump(manifest, f, indent=2, sort_keys=True)
+  os.replace(manifest_path + '.tmp', manifest_path)
+
+def plan_downloads(jobs, date_range=None, folder=None, checksum=0, ledger=None, registry=None):
+  """
+  Reduce candidate (base_path, file_name) jobs to the ones that need work.
+
+  A candidate is dropped when it is dated before the first published archive of its
+  directory, when it is not in the remote listing, or when it is already on disk with
+  the published size (and, with checksum == 1, its .CHECKSUM file). Present archives that
+  the ledger has not verified yet are kept with checksum == 1 so they get checked locally.
+  If a remote listing fails, the first date learned by an earlier run is used instead.
+  With a registry, candidates dated outside the symbol's listing/delivery dates are dropped first.
+  """
+  plan = SyncPlan()
+  manifest = load_manifest(folder)
+
+  by_path = {}
+  for base_path, file_name in jobs:
+    by_path.setdefault(base_path, []).append(file_name)
+
+  for base_path, all_file_names in by_path.items():
+    file_names = all_file_names
+    if registry is not None:
+      file_names = [file_name for file_name in all_file_names
+                    if not archive_date(file_name) or registry.is_listed_on(file_name.split('-')[0], archive_date(file_name))]
+    stats = {'path': base_path, 'first_date': manifest.get(base_path), 'listed': False, 'candidates': len(all_file_names),
+             'present': 0, 'unpublished': 0, 'unlisted': len(all_file_names) - len(file_names),
+             'fetch': 0, 'verify': 0, 'bytes': 0}
+    if not file_names:
+      plan.directories.append(stats)
+      continue
+
+    try:
+      remote = list_remote_dir(base_path)
+      listed = True
+    except (urllib.error.URLError, OSError, ET.ParseError) as e:
+      print("Remote listing failed for {}: {}".format(base_path, str(e)))
+      remote = None
+      listed = False
+
+    if remote:
+      manifest[base_path] = min(filter(None, map(archive_date, remote)), default=None)
+    first_date = manifest.get(base_path)
+
+    local = list_local_dir(base_path, date_range, folder)
+    stats['first_date'] = first_date
+    stats['listed'] = listed
+
+    for file_name in file_names:
+      date = archive_date(file_name)
+      if remote is not None and file_name not in remote or first_date and date and date < first_date:
+        stats['unpublished'] += 1
+        continue
+
+      if get_columnar_path(file_name) in local and file_name not in local:
+        # converted to Parquet and the archive dropped
+        stats['present'] += 1
+        continue
+
+      remote_size = remote.get(file_name) if remote else None
+      local_size = local.get(file_name)
+      present = local_size is not None and (remote_size is None or local_size == remote_size)
+      if local_size is not None and not present:
+        # a truncated or replaced archive would otherwise be skipped as "already exists"
+        plan.stale.append(get_save_path(base_path, file_name, date_range, folder))
+      if present and checksum == 1 and file_name + '.CHECKSUM' not in local:
+        present = False
+
+      if not present:
+        stats['fetch'] += 1
+        stats['bytes'] += remote_size or 0
+        plan.jobs.append((base_path, file_name))
+        continue
+
+      stats['present'] += 1
+      if checksum == 1 and (ledger is None or ledger.lookup(get_save_path(base_path, file_name, date_range, folder)) is None):
+        stats['verify'] += 1
+        plan.jobs.append((base_path, file_name))
+
+    plan.directories.append(stats)
+
+  save_manifest(manifest, folder)
+  return plan
+
+def sync_files(jobs, date_range=None, folder=None, checksum=0, workers=DEFAULT_WORKERS, ledger=None, dry_run=0, registry=None):
+  """Plan the candidate jobs, print the summary and download what is missing unless dry_run == 1"""
+  plan = plan_downloads(jobs, date_range, folder, checksum, ledger, registry)
+  plan.print_summary()
+  if dry_run == 1:
+    return 0
+  for save_path in plan.stale:
+    os.remove(save_path)
+  return download_files_concurrently(plan.jobs, date_range, folder, checksum, workers, ledger)
@@ -0,0 +1,109 @@
+"""
+  Local cache of exchangeInfo symbol lists.
+
+  The symbol list of each market type is fetched at most once per TTL and kept as
+  JSON next to the downloaded data, together with each symbol's listing (onboardDate)
+  and delivery/delisting (deliveryDate) dates where the exchange publishes them.
+  When the exchange cannot be reached the cached copy is used, however old it is.
+"""
+
+import os
+import json
+import time as time_module
+import urllib.request
+from datetime import datetime, timezone
+
+SYMBOL_CACHE_FILE_NAME = '.exchange-info-{}.json'
+SYMBOL_CACHE_TTL_SECONDS = 24 * 60 * 60
+EXCHANGE_INFO_URLS = {
+  'um': 'https://fapi.binance.com/fapi/v1/exchangeInfo',
+  'cm': 'https://dapi.binance.com/dapi/v1/exchangeInfo',
+  'spot': 'https://api.binance.com/api/v3/exchangeInfo',
+}
+EXCHANGE_INFO_TIMEOUT = 30
+
+
+def _ms_to_date(ms):
+  if not ms:
+    return None
+  return datetime.fromtimestamp(int(ms) / 1000, tz=timezone.utc).strftime('%Y-%m-%d')
+
+
+class SymbolRegistry:
+  """Symbols of one market type with their lifetimes, refreshed from exchangeInfo when stale"""
+
+  def __init__(self, cache_path, trading_type, ttl=SYMBOL_CACHE_TTL_SECONDS):
+    self.cache_path = cache_path
+    self.trading_type = trading_type
+    self.ttl = ttl
+    self.fetched_at = 0
+    self.entries = {}
+    self._read_cache()
+
+  def _read_cache(self):
+    try:
+      with open(self.cache_path) as f:
+        cache = json.load(f)
+    except (OSError, ValueError):
+      return
+    self.fetched_at = cache.get('fetched_at', 0)
+    self.entries = cache.get('symbols', {})
+
+  def _write_cache(self):
+    os.makedirs(os.path.dirname(self.cache_path), exist_ok=True)
+    tmp_path = self.cache_path + '.tmp'
+    with open(tmp_path, 'w') as f:
+      json.dump({'trading_type': self.trading_type, 'fetched_at': self.fetched_at, 'symbols': self.entries},
+                f, indent=2, sort_keys=True)
+    os.replace(tmp_path, self.cache_path)
+
+  @property
+  def stale(self):
+    return time_module.time() - self.fetched_at > self.ttl
+
+  def refresh(self):
+    """Fetch exchangeInfo and rewrite the cache"""
+    response = urllib.request.urlopen(EXCHANGE_INFO_URLS[self.trading_type], timeout=EXCHANGE_INFO_TIMEOUT).read()
+    self.entries = {
+      symbol['symbol']: {
+        'status': symbol.get('status') or symbol.get('contractStatus'),
+        'onboard_date': _ms_to_date(symbol.get('onboardDate')),
+        'delivery_date': _ms_to_date(symbol.get('deliveryDate')),
+      }
+      for symbol in json.loads(response)['symbols']
+    }
+    self.fetched_at = time_module.time()
+    self._write_cache()
+
+  def ensure_fresh(self, force=False):
+    """Refresh if the cache is missing, expired or force is set; fall back to the cache when offline"""
+    if not force and self.entries and not self.stale:
+      return
+    try:
+      self.refresh()
+    except Exception as e:
+      if not self.entries:
+        raise
+      print("Could not refresh symbols from exchange ({}), using cached list from {}".format(
+        str(e), datetime.fromtimestamp(self.fetched_at).strftime('%Y-%m-%d %H:%M')))
+
+  def symbols(self):
+    return list(self.entries)
+
+  def lifetime(self, symbol):
+    """(first_date, last_date) as 'YYYY-MM-DD' strings, either of which may be None if unknown"""
+    entry = self.entries.get(symbol.upper())
+    if not entry:
+      return None, None
+    return entry.get('onboard_date'), entry.get('delivery_date')
+
+  def is_listed_on(self, symbol, period):
+    """
+    Whether `symbol` traded during `period`, a 'YYYY-MM-DD' date or a 'YYYY-MM' month.
+    Unknown symbols and unknown dates count as listed.
+    """
+    first_date, last_date = self.lifetime(symbol)
+    if len(period) == 7:
+      # a month overlaps the lifetime if it ends after listing and starts before delivery
+      return (first_date is None or first_date[:7] <= period) and (last_date is None or period <= last_date[:7])
+    return (first_date is None or first_date <= period) and (last_date is None or period <= last_date)
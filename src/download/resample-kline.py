@@ -0,0 +1,36 @@
+#!/usr/bin/env python
+
+"""
+  script to build higher kline intervals from downloaded 1s or 1m klines.
+  the derived archives are written next to the downloaded ones, in the same layout.
+
+  e.g. STORE_DIRECTORY=/data/ ./resample-kline.py -t um -s ETHUSDT -base 1m -i 5m 15m 1h 1d
+
+"""
+
+import os
+import sys
+from enums import *
+from utility import get_parser, get_path, get_save_path, convert_to_date_object
+from resample import resample_klines
+
+
+if __name__ == "__main__":
+    parser = get_parser('klines')
+    args = parser.parse_args(sys.argv[1:])
+
+    if args.symbols:
+      symbols = args.symbols
+    else:
+      # symbols that already have base klines on disk
+      klines_dir = os.path.dirname(os.path.dirname(get_save_path(get_path(args.type, "klines", "daily", "x"), 'x', None, args.folder)))
+      symbols = sorted(os.listdir(klines_dir)) if os.path.isdir(klines_dir) else []
+    print("resampling {} symbols".format(len(symbols)))
+
+    dates = args.dates
+    if not dates and (args.startDate or args.endDate):
+      start_date = convert_to_date_object(args.startDate) if args.startDate else START_DATE
+      end_date = convert_to_date_object(args.endDate) if args.endDate else END_DATE
+      dates = [(start_date + timedelta(days=n)).strftime("%Y-%m-%d") for n in range((end_date - start_date).days + 1)]
+
+    resample_klines(args.type, symbols, args.base, args.intervals, args.folder, dates, args.workers)
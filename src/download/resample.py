@@ -0,0 +1,218 @@
+"""
+  Build higher kline intervals from downloaded 1s or 1m klines.
+
+  Every base-interval archive is read once with the csv module and fed to one
+  aggregator per target interval, and the results are written as archives with
+  the same names and directory layout download-kline.py would produce. Daily
+  archives are derived per day; monthly archives only for finished months, from
+  the monthly base archive or from a complete set of daily base archives.
+"""
+
+import os
+import io
+import csv
+import zipfile
+import calendar
+import multiprocessing
+from decimal import Decimal
+from datetime import date, datetime, timezone
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from enums import *
+from utility import get_path, get_save_path, DEFAULT_WORKERS, PART_SUFFIX
+
+RESAMPLE_BASE_INTERVALS = ['1s', '1m']
+KLINE_HEADER = ['open_time', 'open', 'high', 'low', 'close', 'volume', 'close_time', 'quote_volume',
+                'count', 'taker_buy_volume', 'taker_buy_quote_volume', 'ignore']
+
+# intervals with a fixed length that divides a UTC day, so daily archives can be derived from one day of data
+INTERVAL_MS = {
+  '1s': 1000, '1m': 60000, '3m': 180000, '5m': 300000, '15m': 900000, '30m': 1800000,
+  '1h': 3600000, '2h': 7200000, '4h': 14400000, '6h': 21600000, '8h': 28800000,
+  '12h': 43200000, '1d': 86400000,
+}
+# 3d and 1w bars straddle month boundaries, so they are still downloaded
+MONTHLY_ONLY_INTERVALS = ['1mo']
+
+
+def derivable_intervals(base, intervals):
+  """The requested intervals that can be built from base klines"""
+  return [interval for interval in intervals
+          if interval in MONTHLY_ONLY_INTERVALS or
+          interval in INTERVAL_MS and INTERVAL_MS[interval] > INTERVAL_MS[base]]
+
+def _month_start_ms(open_time):
+  moment = datetime.fromtimestamp(open_time / 1000, tz=timezone.utc)
+  return int(datetime(moment.year, moment.month, 1, tzinfo=timezone.utc).timestamp() * 1000)
+
+def _next_month_start_ms(open_time):
+  moment = datetime.fromtimestamp(open_time / 1000, tz=timezone.utc)
+  year, month = (moment.year + 1, 1) if moment.month == 12 else (moment.year, moment.month + 1)
+  return int(datetime(year, month, 1, tzinfo=timezone.utc).timestamp() * 1000)
+
+
+class KlineAggregator:
+  """Rolls base klines up into bars of one target interval; rows must arrive in open_time order"""
+
+  def __init__(self, interval):
+    self.interval = interval
+    self.rows = []
+    self._bar = None
+    self._bar_end = None
+
+  def _bucket(self, open_time):
+    if self.interval == '1mo':
+      return _month_start_ms(open_time), _next_month_start_ms(open_time)
+    length = INTERVAL_MS[self.interval]
+    start = open_time - open_time % length
+    return start, start + length
+
+  def add(self, row):
+    open_time = int(row[0])
+    if self._bar is None or open_time >= self._bar_end:
+      self.flush()
+      start, self._bar_end = self._bucket(open_time)
+      self._bar = [start, row[1], Decimal(row[2]), Decimal(row[3]), row[4], Decimal(row[5]),
+                   Decimal(row[7]), int(row[8]), Decimal(row[9]), Decimal(row[10])]
+      return
+    bar = self._bar
+    bar[2] = max(bar[2], Decimal(row[2]))
+    bar[3] = min(bar[3], Decimal(row[3]))
+    bar[4] = row[4]
+    bar[5] += Decimal(row[5])
+    bar[6] += Decimal(row[7])
+    bar[7] += int(row[8])
+    bar[8] += Decimal(row[9])
+    bar[9] += Decimal(row[10])
+
+  def flush(self):
+    if self._bar is not None:
+      start, open_, high, low, close, volume, quote_volume, count, taker_buy_volume, taker_buy_quote_volume = self._bar
+      self.rows.append([start, open_, high, low, close, volume, self._bar_end - 1, quote_volume,
+                        count, taker_buy_volume, taker_buy_quote_volume, 0])
+      self._bar = None
+
+
+def iter_kline_rows(archive_path):
+  """Stream the kline rows of an archive as lists of strings, skipping blank and header lines"""
+  with zipfile.ZipFile(archive_path) as z:
+    csv_files = [name for name in z.namelist() if name.endswith('.csv')]
+    if not csv_files:
+      return
+    with z.open(csv_files[0]) as f:
+      for row in csv.reader(io.TextIOWrapper(f, encoding='utf-8', newline='')):
+        if row and row[0][:1].isdigit():
+          yield row
+
+def write_kline_archive(save_path, rows):
+  """Write rows as a zipped CSV with a header, named like the archive, replacing it atomically"""
+  os.makedirs(os.path.dirname(save_path), exist_ok=True)
+  buffer = io.StringIO()
+  writer = csv.writer(buffer, lineterminator='\n')
+  writer.writerow(KLINE_HEADER)
+  writer.writerows(rows)
+  tmp_path = save_path + PART_SUFFIX
+  with zipfile.ZipFile(tmp_path, 'w', compression=zipfile.ZIP_DEFLATED) as z:
+    z.writestr(os.path.basename(save_path)[:-len('.zip')] + '.csv', buffer.getvalue())
+  os.replace(tmp_path, save_path)
+
+def resample_archives(source_paths, intervals):
+  """One pass over the source archives (in time order), returning {interval: rows}"""
+  aggregators = [KlineAggregator(interval) for interval in intervals]
+  for source_path in source_paths:
+    for row in iter_kline_rows(source_path):
+      for aggregator in aggregators:
+        aggregator.add(row)
+  for aggregator in aggregators:
+    aggregator.flush()
+  return {aggregator.interval: aggregator.rows for aggregator in aggregators}
+
+def resample_day(trading_type, symbol, day, base, intervals, folder=None):
+  """Derive the daily archives of `intervals` for one day; returns the number of archives written"""
+  source = get_save_path(get_path(trading_type, 'klines', 'daily', symbol, base),
+                         '{}-{}-{}.zip'.format(symbol.upper(), base, day), None, folder)
+  targets = {}
+  for interval in intervals:
+    if interval in INTERVAL_MS:
+      target = get_save_path(get_path(trading_type, 'klines', 'daily', symbol, interval),
+                             '{}-{}-{}.zip'.format(symbol.upper(), interval, day), None, folder)
+      if not os.path.exists(target):
+        targets[interval] = target
+  if not targets or not os.path.exists(source):
+    return 0
+
+  for interval, rows in resample_archives([source], list(targets)).items():
+    write_kline_archive(targets[interval], rows)
+  return len(targets)
+
+def resample_month(trading_type, symbol, year, month, base, intervals, folder=None):
+  """
+  Derive the monthly archives of `intervals` for a finished month from its monthly base archive,
+  or from its daily base archives if there is none.
+  Returns the number of archives written (0 if any day of the month is missing).
+  """
+  month_str = '{}-{:02d}'.format(year, month)
+  monthly_source = get_save_path(get_path(trading_type, 'klines', 'monthly', symbol, base),
+                                 '{}-{}-{}.zip'.format(symbol.upper(), base, month_str), None, folder)
+  if os.path.exists(monthly_source):
+    sources = [monthly_source]
+  else:
+    base_path = get_path(trading_type, 'klines', 'daily', symbol, base)
+    sources = [get_save_path(base_path, '{}-{}-{}-{:02d}.zip'.format(symbol.upper(), base, month_str, day), None, folder)
+               for day in range(1, calendar.monthrange(year, month)[1] + 1)]
+  targets = {}
+  for interval in intervals:
+    target = get_save_path(get_path(trading_type, 'klines', 'monthly', symbol, interval),
+                           '{}-{}-{}.zip'.format(symbol.upper(), interval, month_str), None, folder)
+    if not os.path.exists(target):
+      targets[interval] = target
+  if not targets or not all(os.path.exists(source) for source in sources):
+    return 0
+
+  for interval, rows in resample_archives(sources, list(targets)).items():
+    write_kline_archive(targets[interval], rows)
+  return len(targets)
+
+def resample_klines(trading_type, symbols, base, intervals, folder=None, dates=None, workers=DEFAULT_WORKERS):
+  """
+  Derive `intervals` from the `base` archives already on disk for each symbol, in a process pool.
+  Only dates in `dates` are resampled when given; finished months are also written as monthly archives.
+  Returns the number of archives written.
+  """
+  intervals = derivable_intervals(base, intervals)
+  if not intervals:
+    print("\nNo intervals to derive from {} klines".format(base))
+    return 0
+
+  wanted = set(dates) if dates else None
+  current_month = date.today().strftime('%Y-%m')
+  tasks = []
+  for symbol in symbols:
+    base_dir = os.path.dirname(get_save_path(get_path(trading_type, 'klines', 'daily', symbol, base), 'x', None, folder))
+    days = []
+    if os.path.isdir(base_dir):
+      days = sorted(name[-len('YYYY-MM-DD.zip'):-len('.zip')] for name in os.listdir(base_dir)
+                    if name.endswith('.zip') and name.startswith('{}-{}-'.format(symbol.upper(), base)))
+    days = [day for day in days if wanted is None or day in wanted]
+    for day in days:
+      tasks.append((resample_day, (trading_type, symbol, day, base, intervals, folder)))
+    monthly_dir = os.path.dirname(get_save_path(get_path(trading_type, 'klines', 'monthly', symbol, base), 'x', None, folder))
+    months = {day[:7] for day in days}
+    if os.path.isdir(monthly_dir):
+      months.update(name[-len('YYYY-MM.zip'):-len('.zip')] for name in os.listdir(monthly_dir)
+                    if name.endswith('.zip') and name.startswith('{}-{}-'.format(symbol.upper(), base)))
+    for month_str in sorted(month for month in months if month < current_month and
+                            (wanted is None or any(day.startswith(month) for day in wanted))):
+      tasks.append((resample_month, (trading_type, symbol, int(month_str[:4]), int(month_str[5:]), base, intervals, folder)))
+
+  print("\nDeriving {} from {} klines: {} tasks with {} workers".format(', '.join(intervals), base, len(tasks), workers))
+  written = 0
+  # utility may have loaded polars, whose thread pool can deadlock after fork, so workers are spawned
+  with ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context("spawn")) as executor:
+    futures = {executor.submit(function, *args): args for function, args in tasks}
+    for future in as_completed(futures):
+      try:
+        written += future.result()
+      except Exception as e:
+        print("Resample error {}: {}".format(futures[future][2:4], str(e)))
+  print("Wrote {} derived archives".format(written))
+  return written
@@ -1,12 +1,44 @@
 import os, sys, re, shutil
+import io
+import zipfile
 import json
 import hashlib
+import threading
+import http.client
 from pathlib import Path
 from datetime import *
 import time as time_module
+import urllib.error
 import urllib.request
+from urllib.parse import urlsplit, urljoin
+from concurrent.futures import ThreadPoolExecutor, as_completed
 from argparse import ArgumentParser, RawTextHelpFormatter, ArgumentTypeError
 from enums import *
+from ledger import VerifiedLedger, LEDGER_FILE_NAME
+from registry import SymbolRegistry, SYMBOL_CACHE_FILE_NAME, SYMBOL_CACHE_TTL_SECONDS
+
+try:
+  import polars as pl
+  from polars.io.plugins import register_io_source
+except ImportError:
+  # only needed for -convert
+  pl = None
+
+DOWNLOAD_CHUNK_SIZE = 1024 * 1024
+DOWNLOAD_TIMEOUT = 60
+MAX_RETRIES = 3
+RETRY_BACKOFF_SECONDS = 2
+DEFAULT_WORKERS = 8
+PART_SUFFIX = '.part'
+HASH_BUFFER_SIZE = 4 * 1024 * 1024
+
+COLUMNAR_SUFFIX = '.parquet'
+COLUMNAR_COMPRESSION_LEVEL = 3
+# bytes of inflated CSV parsed per chunk while converting an archive
+CONVERT_CHUNK_SIZE = 64 * 1024 * 1024
+
+# keep-alive connections, one set per worker thread
+_thread_local = threading.local()
 
 def get_destination_dir(file_url, folder=None):
   store_directory = os.environ.get('STORE_DIRECTORY')
@@ -19,18 +51,25 @@ def get_destination_dir(file_url, folder=None):
 def get_download_url(file_url):
   return "{}{}".format(BASE_URL, file_url)
 
-def calculate_sha256(file_path):
-  """Calculate SHA256 hash of a file"""
-  sha256_hash = hashlib.sha256()
+def update_sha256(sha256_hash, file_path):
+  """Feed a file into an existing SHA256 object using large reads"""
   with open(file_path, "rb") as f:
-    for byte_block in iter(lambda: f.read(4096), b""):
+    for byte_block in iter(lambda: f.read(HASH_BUFFER_SIZE), b""):
       sha256_hash.update(byte_block)
-  return sha256_hash.hexdigest()
+  return sha256_hash
 
-def verify_checksum(file_path, checksum_file_path):
-  """Verify file integrity using checksum file"""
+def calculate_sha256(file_path):
+  """Calculate SHA256 hash of a file"""
+  return update_sha256(hashlib.sha256(), file_path).hexdigest()
+
+def verify_checksum(file_path, checksum_file_path, progress=None, actual_checksum=None, ledger=None):
+  """
+  Verify file integrity using checksum file.
+  Pass actual_checksum when the hash was already computed while downloading, so the file is not read again.
+  With a ledger, an unchanged file that was verified before is not rehashed, and new results are recorded.
+  """
   if not os.path.exists(checksum_file_path):
-    print("\nChecksum file not found: {}".format(checksum_file_path))
+    report("Checksum file not found: {}".format(checksum_file_path), progress)
     return False
 
   try:
@@ -38,135 +77,611 @@ def verify_checksum(file_path, checksum_file_path):
     with open(checksum_file_path, 'r') as f:
       expected_checksum = f.read().strip().split()[0]  # Get first token (hash value)
 
+    # Skip hashing files the ledger already vouches for
+    if actual_checksum is None and ledger is not None:
+      if ledger.lookup(file_path) == expected_checksum.lower():
+        report("Checksum verification passed (ledger): {}".format(file_path), progress, detail=True)
+        return True
+
     # Calculate actual checksum
-    actual_checksum = calculate_sha256(file_path)
+    if actual_checksum is None:
+      actual_checksum = calculate_sha256(file_path)
 
     if actual_checksum.lower() == expected_checksum.lower():
-      print("\nChecksum verification passed: {}".format(file_path))
+      report("Checksum verification passed: {}".format(file_path), progress, detail=True)
+      if ledger is not None:
+        ledger.record(file_path, actual_checksum)
       return True
     else:
-      print("\nChecksum verification FAILED: {}".format(file_path))
-      print("Expected: {}".format(expected_checksum))
-      print("Actual: {}".format(actual_checksum))
+      report("Checksum verification FAILED: {}\nExpected: {}\nActual: {}".format(
+        file_path, expected_checksum, actual_checksum), progress)
+      if ledger is not None:
+        ledger.forget(file_path)
       return False
   except Exception as e:
-    print("\nChecksum verification error: {}".format(str(e)))
+    report("Checksum verification error: {}".format(str(e)), progress)
     return False
 
-def get_all_symbols(type):
-  if type == 'um':
-    response = urllib.request.urlopen("https://fapi.binance.com/fapi/v1/exchangeInfo").read()
-  elif type == 'cm':
-    response = urllib.request.urlopen("https://dapi.binance.com/dapi/v1/exchangeInfo").read()
-  else:
-    response = urllib.request.urlopen("https://api.binance.com/api/v3/exchangeInfo").read()
-  return list(map(lambda symbol: symbol['symbol'], json.loads(response)['symbols']))
-
-def download_file(base_path, file_name, date_range=None, folder=None, checksum_file_path=None):
-  download_path = "{}{}".format(base_path, file_name)
+def report(message, progress=None, detail=False):
+  """Print a status message; with a shared progress display only non-detail messages are shown"""
+  if progress is None:
+    print("\n{}".format(message))
+  elif not detail:
+    progress.write(message)
+
+class DownloadProgress:
+  """One aggregated progress line shared by all download workers"""
+
+  def __init__(self, total_files):
+    self.total_files = total_files
+    self.done_files = 0
+    self.failed_files = 0
+    self.bytes = 0
+    self.start_time = time_module.time()
+    self._last_render = 0
+    self._lock = threading.Lock()
+
+  def add_bytes(self, n):
+    with self._lock:
+      self.bytes += n
+      self._render()
+
+  def file_done(self, success):
+    with self._lock:
+      if success:
+        self.done_files += 1
+      else:
+        self.failed_files += 1
+      self._render(force=True)
+
+  def write(self, message):
+    with self._lock:
+      sys.stdout.write("\r\033[K{}\n".format(message))
+      self._render(force=True)
+
+  def close(self):
+    with self._lock:
+      self._render(force=True)
+      sys.stdout.write("\n")
+      sys.stdout.flush()
+
+  def _render(self, force=False):
+    now = time_module.time()
+    if not force and now - self._last_render < 0.2:
+      return
+    self._last_render = now
+    elapsed = max(now - self.start_time, 1e-6)
+    finished = self.done_files + self.failed_files
+    done = int(50 * finished / self.total_files) if self.total_files else 50
+    sys.stdout.write("\r\033[K[{}{}] {}/{} files, {} failed, {:.1f} MB, {:.2f} MB/s".format(
+      '#' * done, '.' * (50 - done), finished, self.total_files, self.failed_files,
+      self.bytes / 1e6, self.bytes / 1e6 / elapsed))
+    sys.stdout.flush()
+
+def _new_connection(scheme, host):
+  """Open a connection to host, tunnelling through HTTP(S)_PROXY when configured"""
+  proxy = urllib.request.getproxies().get(scheme)
+  if proxy and urllib.request.proxy_bypass(host.split(':')[0]):
+    proxy = None
+
+  if proxy:
+    proxy_parts = urlsplit(proxy if '://' in proxy else 'http://' + proxy)
+    if scheme == 'https':
+      conn = http.client.HTTPSConnection(proxy_parts.hostname, proxy_parts.port or 80, timeout=DOWNLOAD_TIMEOUT)
+      conn.set_tunnel(host)
+      return conn, False
+    return http.client.HTTPConnection(proxy_parts.hostname, proxy_parts.port or 80, timeout=DOWNLOAD_TIMEOUT), True
+
+  if scheme == 'https':
+    return http.client.HTTPSConnection(host, timeout=DOWNLOAD_TIMEOUT), False
+  return http.client.HTTPConnection(host, timeout=DOWNLOAD_TIMEOUT), False
+
+def _get_connection(scheme, host):
+  """Return this thread's keep-alive connection for (scheme, host) and whether it was reused"""
+  pool = getattr(_thread_local, 'connections', None)
+  if pool is None:
+    pool = _thread_local.connections = {}
+  key = (scheme, host)
+  if key in pool:
+    return pool[key], True
+  pool[key] = _new_connection(scheme, host)
+  return pool[key], False
+
+def _drop_connection(scheme, host):
+  pool = getattr(_thread_local, 'connections', {})
+  entry = pool.pop((scheme, host), None)
+  if entry:
+    entry[0].close()
+
+def close_connection(url):
+  """Discard this thread's pooled connection to url's host, e.g. after a failed transfer"""
+  parts = urlsplit(url)
+  _drop_connection(parts.scheme, parts.netloc)
+
+def open_url(url, headers=None, max_redirects=3):
+  """
+  GET url over a pooled keep-alive connection.
+  The caller must read the response to the end so the connection can be reused.
+  Raises urllib.error.HTTPError for 4xx/5xx responses, like urllib.request.urlopen.
+  """
+  for _ in range(max_redirects + 1):
+    parts = urlsplit(url)
+    target = parts.path + ('?' + parts.query if parts.query else '')
+
+    for fresh_attempt in range(2):
+      (conn, absolute_target), reused = _get_connection(parts.scheme, parts.netloc)
+      try:
+        conn.request('GET', url if absolute_target else target, headers=headers or {})
+        response = conn.getresponse()
+        break
+      except (http.client.HTTPException, OSError):
+        _drop_connection(parts.scheme, parts.netloc)
+        # an idle keep-alive socket closed by the server is expected; retry once on a new one
+        if not reused or fresh_attempt:
+          raise
+
+    if response.status in (301, 302, 303, 307, 308) and response.getheader('location'):
+      response.read()
+      url = urljoin(url, response.getheader('location'))
+      continue
+
+    if response.status >= 400:
+      response.read()
+      raise urllib.error.HTTPError(url, response.status, response.reason, response.headers, None)
+
+    return response
+
+  raise urllib.error.HTTPError(url, 310, 'Too many redirects', None, None)
+
+def open_symbol_registry(type, folder=None, refresh=0, ttl=SYMBOL_CACHE_TTL_SECONDS):
+  """
+  Symbol registry of a market type, cached at the root of the download directory.
+  Refetched from exchangeInfo when older than ttl (or with refresh=1); None if there is
+  no cached copy and the exchange cannot be reached.
+  """
+  registry = SymbolRegistry(get_destination_dir(SYMBOL_CACHE_FILE_NAME.format(type), folder), type, ttl)
+  try:
+    registry.ensure_fresh(force=refresh == 1)
+  except Exception as e:
+    print("Could not fetch symbols from exchange and no cached list exists: {}".format(str(e)))
+    return None
+  return registry
+
+def get_all_symbols(type, folder=None, registry=None):
+  if registry is None:
+    registry = open_symbol_registry(type, folder)
+  if registry is None:
+    raise_arg_error("symbol list unavailable offline, pass symbols with -s")
+  return registry.symbols()
+
+def _content_range_start(headers):
+  """First byte position from a 'Content-Range: bytes start-end/total' header"""
+  match = re.match(r'bytes (\d+)-', (headers or {}).get('content-range', '') or '')
+  return int(match.group(1)) if match else None
+
+def _content_range_total(headers):
+  """Total size from a 'Content-Range: bytes .../total' header"""
+  match = re.search(r'/(\d+)$', (headers or {}).get('content-range', '') or '')
+  return int(match.group(1)) if match else None
+
+def get_save_path(base_path, file_name, date_range=None, folder=None):
+  """Local path that download_file stores base_path/file_name under"""
   if folder:
     base_path = os.path.join(folder, base_path)
   if date_range:
     date_range = date_range.replace(" ","_")
     base_path = os.path.join(base_path, date_range)
-  save_path = get_destination_dir(os.path.join(base_path, file_name), folder)
+  return get_destination_dir(os.path.join(base_path, file_name), folder)
 
+def open_verified_ledger(folder=None, reverify=0):
+  """Open the verified-archive ledger stored at the root of the download directory"""
+  ledger_path = get_destination_dir(LEDGER_FILE_NAME, folder)
+  Path(os.path.dirname(ledger_path)).mkdir(parents=True, exist_ok=True)
+  return VerifiedLedger(ledger_path, reverify=reverify == 1)
+
+def download_file(base_path, file_name, date_range=None, folder=None, checksum_file_path=None, progress=None, ledger=None):
+  download_path = "{}{}".format(base_path, file_name)
+  save_path = get_save_path(base_path, file_name, date_range, folder)
+
+  # the archive may have been converted and dropped by an earlier -convert run
+  columnar_path = get_columnar_path(save_path)
+  if not os.path.exists(save_path) and columnar_path and os.path.exists(columnar_path):
+    report("file already converted! {}".format(columnar_path), progress, detail=True)
+    return True
 
   if os.path.exists(save_path):
     # If checksum verification is enabled, verify existing file
     if checksum_file_path and os.path.exists(checksum_file_path):
-      if verify_checksum(save_path, checksum_file_path):
-        print("\nfile already exists and verified! {}".format(save_path))
+      if verify_checksum(save_path, checksum_file_path, progress, ledger=ledger):
+        report("file already exists and verified! {}".format(save_path), progress, detail=True)
         return True
       else:
-        print("\nExisting file failed checksum verification, re-downloading...")
+        report("Existing file failed checksum verification, re-downloading... {}".format(save_path), progress)
         os.remove(save_path)
     else:
-      print("\nfile already exists! {}".format(save_path))
+      report("file already exists! {}".format(save_path), progress, detail=True)
       return True
 
   # make the directory
-  if not os.path.exists(base_path):
-    Path(get_destination_dir(base_path)).mkdir(parents=True, exist_ok=True)
+  Path(os.path.dirname(save_path)).mkdir(parents=True, exist_ok=True)
 
   download_url = get_download_url(download_path)
-  max_retries = 3
+  part_path = save_path + PART_SUFFIX
 
-  for attempt in range(max_retries):
+  for attempt in range(MAX_RETRIES):
     try:
-      print(download_url)
-      dl_file = urllib.request.urlopen(download_url)
-      length = dl_file.getheader('content-length')
-      if length:
-        length = int(length)
-        blocksize = max(4096,length//100)
-
-      with open(save_path, 'wb') as out_file:
-        dl_progress = 0
-        print("\nStart File Download: {}".format(save_path))
-        while True:
-          buf = dl_file.read(blocksize)
-          if not buf:
-            break
-          dl_progress += len(buf)
-          out_file.write(buf)
-          done = int(50 * dl_progress / length)
-          sys.stdout.write("\r[%s%s]" % ('#' * done, '.' * (50-done)) )
-          sys.stdout.flush()
-        print("\nFile Download: {} complete!".format(save_path))
+      # Hash the bytes as they arrive so the archive is not read back just to verify it
+      sha256_hash = hashlib.sha256() if checksum_file_path else None
+
+      # Resume an interrupted transfer (from an earlier attempt or an earlier run)
+      offset = os.path.getsize(part_path) if os.path.exists(part_path) else 0
+      headers = {'Range': 'bytes={}-'.format(offset)} if offset else None
+
+      report(download_url, progress, detail=True)
+      try:
+        dl_file = open_url(download_url, headers)
+      except urllib.error.HTTPError as e:
+        if e.code != 416 or not offset:
+          raise
+        # Range not satisfiable: the part file already holds the whole archive, or is stale
+        total = _content_range_total(e.headers)
+        if total != offset:
+          os.remove(part_path)
+          raise
+        dl_file = None
+        if sha256_hash is not None:
+          update_sha256(sha256_hash, part_path)
+
+      if dl_file is not None:
+        if dl_file.status == 206:
+          start = _content_range_start(dl_file.headers)
+          if start != offset:
+            dl_file.read()
+            raise IOError("server resumed at byte {} instead of {}".format(start, offset))
+          mode = 'ab'
+          if sha256_hash is not None:
+            update_sha256(sha256_hash, part_path)
+          report("Resuming File Download at {} bytes: {}".format(offset, save_path), progress, detail=True)
+        else:
+          # Server ignored the Range header, start over
+          offset = 0
+          mode = 'wb'
+          report("Start File Download: {}".format(save_path), progress, detail=True)
+
+        length = dl_file.getheader('content-length')
+        length = offset + int(length) if length else None
+
+        with open(part_path, mode) as out_file:
+          dl_progress = offset
+          while True:
+            buf = dl_file.read(DOWNLOAD_CHUNK_SIZE)
+            if not buf:
+              break
+            dl_progress += len(buf)
+            out_file.write(buf)
+            if sha256_hash is not None:
+              sha256_hash.update(buf)
+            if progress is not None:
+              progress.add_bytes(len(buf))
+            elif length:
+              done = int(50 * dl_progress / length)
+              sys.stdout.write("\r[%s%s]" % ('#' * done, '.' * (50-done)) )
+              sys.stdout.flush()
+
+        if length is not None and dl_progress != length:
+          raise IOError("incomplete download: got {} of {} bytes".format(dl_progress, length))
 
       # Verify checksum if provided
       if checksum_file_path and os.path.exists(checksum_file_path):
-        if not verify_checksum(save_path, checksum_file_path):
-          # Checksum verification failed
-          if os.path.exists(save_path):
-            os.remove(save_path)
-          if attempt < max_retries - 1:
-            print("Retrying download due to checksum mismatch...")
-            time_module.sleep(2)
+        if not verify_checksum(part_path, checksum_file_path, progress, sha256_hash.hexdigest()):
+          # Checksum verification failed, the part file cannot be resumed
+          os.remove(part_path)
+          if attempt < MAX_RETRIES - 1:
+            report("Retrying download due to checksum mismatch... {}".format(save_path), progress)
+            time_module.sleep(RETRY_BACKOFF_SECONDS * 2 ** attempt)
             continue
           else:
-            print("\nFile download failed after {} attempts due to checksum mismatch".format(max_retries))
+            report("File download failed after {} attempts due to checksum mismatch".format(MAX_RETRIES), progress)
             return False
 
-      # Download successful, break out of retry loop
+      # Publish the finished file atomically
+      os.replace(part_path, save_path)
+      if ledger is not None and sha256_hash is not None:
+        ledger.record(save_path, sha256_hash.hexdigest())
+      report("File Download: {} complete!".format(save_path), progress, detail=True)
       return True
 
     except urllib.error.HTTPError as e:
       # Don't retry if file not found (404 error)
       if e.code == 404:
-        print("\nFile not found: {}".format(download_url))
-        # Clean up partial download if exists
-        if os.path.exists(save_path):
-          os.remove(save_path)
+        report("File not found: {}".format(download_url), progress, detail=True)
+        if os.path.exists(part_path):
+          os.remove(part_path)
         return False
 
       # Retry for other HTTP errors (5xx server errors, etc.)
-      if attempt < max_retries - 1:
-        print("\nDownload failed with HTTP error {} (attempt {}/{}): {}".format(e.code, attempt + 1, max_retries, download_url))
-        print("Retrying in 2 seconds...")
-        time_module.sleep(2)
+      if attempt < MAX_RETRIES - 1:
+        delay = RETRY_BACKOFF_SECONDS * 2 ** attempt
+        report("Download failed with HTTP error {} (attempt {}/{}): {}, retrying in {} seconds...".format(
+          e.code, attempt + 1, MAX_RETRIES, download_url, delay), progress)
+        time_module.sleep(delay)
       else:
-        print("\nFile download failed after {} attempts: {}".format(max_retries, download_url))
-
-      # Clean up partial download if exists
-      if os.path.exists(save_path):
-        os.remove(save_path)
+        report("File download failed after {} attempts: {}".format(MAX_RETRIES, download_url), progress)
 
     except Exception as e:
-      if attempt < max_retries - 1:
-        print("\nDownload error (attempt {}/{}): {}".format(attempt + 1, max_retries, str(e)))
-        print("Retrying in 2 seconds...")
-        time_module.sleep(2)
+      # Keep the part file: the next attempt (or the next run) resumes from it
+      close_connection(download_url)
+      if attempt < MAX_RETRIES - 1:
+        delay = RETRY_BACKOFF_SECONDS * 2 ** attempt
+        report("Download error (attempt {}/{}): {}, retrying in {} seconds...".format(
+          attempt + 1, MAX_RETRIES, str(e), delay), progress)
+        time_module.sleep(delay)
       else:
-        print("\nFile download failed after {} attempts: {}".format(max_retries, str(e)))
-
-      # Clean up partial download if exists
-      if os.path.exists(save_path):
-        os.remove(save_path)
+        report("File download failed after {} attempts: {}".format(MAX_RETRIES, str(e)), progress)
 
   return False
 
+def download_with_checksum(base_path, file_name, date_range=None, folder=None, checksum=0, progress=None, ledger=None):
+  """Download file_name, first fetching and sanity-checking its .CHECKSUM when checksum == 1"""
+  checksum_file_path = None
+
+  if checksum == 1:
+    checksum_file_name = "{}.CHECKSUM".format(file_name)
+    if download_file(base_path, checksum_file_name, date_range, folder, progress=progress):
+      checksum_file_path = get_save_path(base_path, checksum_file_name, date_range, folder)
+
+      # Verify checksum file is valid (should contain SHA256 hash)
+      try:
+        with open(checksum_file_path, 'r') as f:
+          hash_value = f.read().strip().split()[0]
+        if len(hash_value) != 64 or not all(c in '0123456789abcdefABCDEF' for c in hash_value):
+          report("Warning: Checksum file appears to be invalid: {}".format(checksum_file_path), progress)
+          checksum_file_path = None
+      except Exception as e:
+        report("Warning: Failed to validate checksum file: {}".format(str(e)), progress)
+        checksum_file_path = None
+
+  return download_file(base_path, file_name, date_range, folder, checksum_file_path, progress, ledger)
+
+def download_files_concurrently(jobs, date_range=None, folder=None, checksum=0, workers=DEFAULT_WORKERS, ledger=None):
+  """
+  Download (base_path, file_name) jobs with at most `workers` transfers in flight.
+  Each worker thread keeps its own keep-alive connection, and all of them report to one progress line.
+  Returns the number of files that were downloaded or already present.
+  """
+  if not jobs:
+    print("\nNothing to download")
+    return 0
+
+  print("\nDownloading {} files with {} workers".format(len(jobs), workers))
+  progress = DownloadProgress(len(jobs))
+  succeeded = 0
+
+  with ThreadPoolExecutor(max_workers=workers) as executor:
+    futures = {
+      executor.submit(download_with_checksum, base_path, file_name, date_range, folder, checksum, progress, ledger): file_name
+      for base_path, file_name in jobs
+    }
+    for future in as_completed(futures):
+      try:
+        success = future.result()
+      except Exception as e:
+        progress.write("Unexpected error downloading {}: {}".format(futures[future], str(e)))
+        success = False
+      progress.file_done(success)
+      succeeded += int(success)
+
+  progress.close()
+  return succeeded
+
+def audit_archives(base_paths, folder=None, workers=DEFAULT_WORKERS, ledger=None):
+  """
+  Rehash every archive under base_paths that has a .CHECKSUM next to it, ignoring cached ledger entries.
+  Files are verified in parallel and the ledger is refreshed with the results.
+  Returns the list of archives that failed verification.
+  """
+  archives = []
+  for base_path in base_paths:
+    root = get_save_path(base_path, '', None, folder)
+    for dirpath, _, filenames in os.walk(root):
+      names = set(filenames)
+      for name in filenames:
+        if name.endswith('.zip') and name + '.CHECKSUM' in names:
+          archives.append(os.path.join(dirpath, name))
+
+  if not archives:
+    print("\nNo archives with checksum files found to audit")
+    return []
+
+  print("\nAuditing {} archives with {} workers".format(len(archives), workers))
+  progress = DownloadProgress(len(archives))
+  failed = []
+
+  def audit_one(archive_path):
+    return verify_checksum(archive_path, archive_path + '.CHECKSUM', progress,
+                           actual_checksum=calculate_sha256(archive_path), ledger=ledger)
+
+  with ThreadPoolExecutor(max_workers=workers) as executor:
+    futures = {executor.submit(audit_one, archive_path): archive_path for archive_path in archives}
+    for future in as_completed(futures):
+      try:
+        success = future.result()
+      except Exception as e:
+        progress.write("Audit error {}: {}".format(futures[future], str(e)))
+        success = False
+      if not success:
+        failed.append(futures[future])
+      progress.file_done(success)
+
+  progress.close()
+  print("Audit finished: {} verified, {} failed".format(len(archives) - len(failed), len(failed)))
+  for archive_path in sorted(failed):
+    print("  FAILED: {}".format(archive_path))
+  return failed
+
+def get_columnar_path(archive_path):
+  """Path of the Parquet file converted from a .zip archive, or None for other files"""
+  if not archive_path.endswith('.zip'):
+    return None
+  return archive_path[:-len('.zip')] + COLUMNAR_SUFFIX
+
+def get_archive_schema(file_name):
+  """
+  Column names and polars types of the CSV inside an archive, matching what the feature
+  loader expects. Returns None for datasets without a known schema.
+  """
+  parts = file_name.split('-')
+  if len(parts) < 2:
+    return None
+  kind = parts[1]
+  if kind == 'bookDepth':
+    return {'timestamp': pl.Utf8, 'percentage': pl.Int64, 'depth': pl.Float64, 'notional': pl.Float64}
+  if kind == 'aggTrades':
+    return {'agg_trade_id': pl.Int64, 'price': pl.Float64, 'quantity': pl.Float64, 'first_trade_id': pl.Int64,
+            'last_trade_id': pl.Int64, 'transact_time': pl.Int64, 'is_buyer_maker': pl.Boolean}
+  if kind == 'trades':
+    return {'id': pl.Int64, 'price': pl.Float64, 'qty': pl.Float64, 'quote_qty': pl.Float64,
+            'time': pl.Int64, 'is_buyer_maker': pl.Boolean}
+  if kind in INTERVALS:
+    return {'open_time': pl.Int64, 'open': pl.Float64, 'high': pl.Float64, 'low': pl.Float64, 'close': pl.Float64,
+            'volume': pl.Float64, 'close_time': pl.Int64, 'quote_volume': pl.Float64, 'count': pl.Int64,
+            'taker_buy_volume': pl.Float64, 'taker_buy_quote_volume': pl.Float64, 'ignore': pl.Int64}
+  return None
+
+def _strip_leading_rows(data):
+  """Drop leading blank lines plus the header line, if the CSV has one, from the first chunk of a CSV"""
+  offset = 0
+  while offset < len(data):
+    line_end = data.find(b'\n', offset)
+    line_end = len(data) if line_end < 0 else line_end + 1
+    line = data[offset:line_end].strip()
+    if line:
+      # data rows start with a number, header rows with a column name
+      return data[offset:] if line[:1].isdigit() or line[:1] == b'-' else data[line_end:]
+    offset = line_end
+  return b''
+
+def _iter_csv_chunks(archive_path, member, schema):
+  """
+  Parse the CSV member of a .zip archive in line-aligned chunks of about CONVERT_CHUNK_SIZE bytes,
+  reading straight from the compressed stream so the inflated CSV never touches the disk.
+  """
+  with zipfile.ZipFile(archive_path) as z, z.open(member) as src:
+    tail = b''
+    first = True
+    while True:
+      block = src.read(CONVERT_CHUNK_SIZE)
+      data = tail + block
+      if block:
+        # hold back the partial last line until the next block completes it
+        cut = data.rfind(b'\n') + 1
+        data, tail = data[:cut], data[cut:]
+      if first and data:
+        data = _strip_leading_rows(data)
+        first = False
+      if data.strip():
+        yield pl.read_csv(io.BytesIO(data), has_header=False, schema=schema)
+      if not block:
+        return
+
+def convert_archive(archive_path, keep_zip=1):
+  """
+  Convert the CSV inside a .zip archive into a typed, zstd-compressed Parquet file next to it.
+  The CSV is parsed in chunks straight out of the archive and streamed into the Parquet writer, so
+  monthly archives neither have to fit in memory nor be inflated on disk: besides the archive, only the
+  partially written Parquet file (<name>.parquet.part) is on disk while converting.
+  Returns True when the Parquet file exists afterwards.
+  """
+  columnar_path = get_columnar_path(archive_path)
+  schema = get_archive_schema(os.path.basename(archive_path))
+  if schema is None:
+    return False
+
+  if not os.path.exists(columnar_path):
+    with zipfile.ZipFile(archive_path) as z:
+      csv_files = [name for name in z.namelist() if name.endswith('.csv')]
+    if not csv_files:
+      return False
+
+    def read_chunks(with_columns, predicate, n_rows, batch_size):
+      remaining = n_rows
+      for chunk in _iter_csv_chunks(archive_path, csv_files[0], schema):
+        if predicate is not None:
+          chunk = chunk.filter(predicate)
+        if with_columns is not None:
+          chunk = chunk.select(with_columns)
+        if remaining is not None:
+          chunk = chunk.head(remaining)
+          remaining -= chunk.height
+        yield chunk
+        if remaining == 0:
+          return
+
+    columnar_tmp_path = columnar_path + PART_SUFFIX
+    try:
+      frame = register_io_source(read_chunks, schema=schema)
+      if 'timestamp' in schema:
+        frame = frame.with_columns(pl.col('timestamp').str.strptime(pl.Datetime('ms'), '%Y-%m-%d %H:%M:%S'))
+      frame.sink_parquet(columnar_tmp_path, compression='zstd', compression_level=COLUMNAR_COMPRESSION_LEVEL)
+      os.replace(columnar_tmp_path, columnar_path)
+    finally:
+      if os.path.exists(columnar_tmp_path):
+        os.remove(columnar_tmp_path)
+
+  if keep_zip == 0:
+    os.remove(archive_path)
+  return True
+
+def convert_archives(base_paths, folder=None, workers=DEFAULT_WORKERS, keep_zip=1, checksum=0, ledger=None):
+  """
+  Convert every archive under base_paths that has no Parquet file yet, in a worker pool.
+  With checksum == 1 only archives that pass verification against their .CHECKSUM are converted.
+  Returns the number of archives converted.
+  """
+  if pl is None:
+    print("\npolars is not installed, skipping conversion to Parquet")
+    return 0
+
+  archives = []
+  for base_path in base_paths:
+    root = get_save_path(base_path, '', None, folder)
+    for dirpath, _, filenames in os.walk(root):
+      names = set(filenames)
+      for name in filenames:
+        if name.endswith('.zip') and get_archive_schema(name) is not None and \
+            (keep_zip == 0 or os.path.basename(get_columnar_path(name)) not in names):
+          archives.append(os.path.join(dirpath, name))
+
+  if not archives:
+    print("\nNo archives to convert")
+    return 0
+
+  print("\nConverting {} archives to Parquet with {} workers".format(len(archives), workers))
+  progress = DownloadProgress(len(archives))
+  converted = 0
+
+  def convert_one(archive_path):
+    checksum_file_path = archive_path + '.CHECKSUM'
+    if checksum == 1 and not (os.path.exists(checksum_file_path) and
+                              verify_checksum(archive_path, checksum_file_path, progress, ledger=ledger)):
+      report("Not converting unverified archive: {}".format(archive_path), progress)
+      return False
+    return convert_archive(archive_path, keep_zip)
+
+  with ThreadPoolExecutor(max_workers=workers) as executor:
+    futures = {executor.submit(convert_one, archive_path): archive_path for archive_path in archives}
+    for future in as_completed(futures):
+      try:
+        success = future.result()
+      except Exception as e:
+        progress.write("Conversion error {}: {}".format(futures[future], str(e)))
+        success = False
+      progress.file_done(success)
+      converted += int(success)
+
+  progress.close()
+  return converted
+
 def convert_to_date_object(d):
   year, month, day = [int(x) for x in d.split('-')]
   date_obj = date(year, month, day)
@@ -245,11 +760,43 @@ def get_parser(parser_type):
   parser.add_argument(
       '-t', dest='type', required=True, choices=TRADING_TYPE,
       help='Valid trading types: {}'.format(TRADING_TYPE))
+  parser.add_argument(
+      '-reverify', dest='reverify', default=0, type=int, choices=[0, 1],
+      help='1 to rehash existing archives even if the verified-archive ledger says they are unchanged, default 0')
+  parser.add_argument(
+      '-audit', dest='audit', default=0, type=int, choices=[0, 1],
+      help='1 to rehash every downloaded archive against its checksum file in parallel and exit, default 0')
+  parser.add_argument(
+      '-plan', dest='plan', default=1, type=int, choices=[0, 1],
+      help='1 to list the remote and local trees first and only request missing archives, default 1')
+  parser.add_argument(
+      '-dry-run', dest='dry_run', default=0, type=int, choices=[0, 1],
+      help='1 to print the files and bytes that would be fetched without downloading, default 0')
+  parser.add_argument(
+      '-convert', dest='convert', default=0, type=int, choices=[0, 1],
+      help='1 to convert downloaded archives into zstd-compressed Parquet files, default 0.\n'
+           'The CSV is streamed out of each archive, so the only temporary disk use is the\n'
+           'partially written .parquet.part file, one per worker converting at a time')
+  parser.add_argument(
+      '-keep-zip', dest='keep_zip', default=1, type=int, choices=[0, 1],
+      help='0 to delete each archive after converting it with -convert 1, default 1')
+  parser.add_argument(
+      '-workers', dest='workers', default=DEFAULT_WORKERS, type=int,
+      help='Number of concurrent downloads, default {}'.format(DEFAULT_WORKERS))
+  parser.add_argument(
+      '-refresh-symbols', dest='refresh_symbols', default=0, type=int, choices=[0, 1],
+      help='1 to refetch the cached exchangeInfo symbol list even if it is younger than {} hours, default 0'.format(SYMBOL_CACHE_TTL_SECONDS // 3600))
 
   if parser_type == 'klines':
     parser.add_argument(
       '-i', dest='intervals', default=INTERVALS, nargs='+', choices=INTERVALS,
       help='single kline interval or multiple intervals separated by space\n-i 1m 1w means to download klines interval of 1minute and 1week')
+    parser.add_argument(
+      '-derive', dest='derive', default=0, type=int, choices=[0, 1],
+      help='1 to download only the base interval (plus intervals that cannot be derived)\nand build the other intervals locally, default 0')
+    parser.add_argument(
+      '-base', dest='base', default='1m', choices=['1s', '1m'],
+      help='base interval used by -derive, default 1m')
 
 
   return parser
@@ -23,7 +23,11 @@ from .data_loader import (
     pivot_bookdepth,
     preprocess_kline,
     merge_data,
-    validate_data
+    validate_data,
+    aggregate_aggtrades_file,
+    load_klines_from_aggtrades,
+    iter_tardis_trades,
+    load_tardis_trade_klines
 )
 
 from .feature_calculator import (
@@ -55,6 +59,10 @@ __all__ = [
     "preprocess_kline",
     "merge_data",
     "validate_data",
+    "aggregate_aggtrades_file",
+    "load_klines_from_aggtrades",
+    "iter_tardis_trades",
+    "load_tardis_trade_klines",
 
     # 因子计算
     "calculate_kline_features",
@@ -3,6 +3,7 @@
 包含所有数据路径、参数和常量配置
 """
 
+import json
 from pathlib import Path
 from datetime import datetime
 
@@ -18,6 +19,12 @@ BOOKDEPTH_BASE_PATH = DATA_ROOT / "futures" / "um" / "daily" / "bookDepth" / "ET
 # K线数据路径
 KLINE_BASE_PATH = DATA_ROOT / "futures" / "um" / "daily" / "klines" / "ETHUSDT" / "1m"
 
+# 月度K线数据路径（整月归档，存在时优先于日K线文件）
+KLINE_MONTHLY_BASE_PATH = DATA_ROOT / "futures" / "um" / "monthly" / "klines" / "ETHUSDT" / "1m"
+
+# 聚合成交数据路径（月度归档，用于补齐缺失的K线）
+AGGTRADES_MONTHLY_BASE_PATH = DATA_ROOT / "futures" / "um" / "monthly" / "aggTrades" / "ETHUSDT"
+
 # 示例数据路径（用于测试）
 EXAMPLE_DATA_PATH = PROJECT_ROOT / "biance_example"
 
@@ -36,6 +43,15 @@ BOOKDEPTH_FILENAME_TEMPLATE = "{symbol}-bookDepth-{date}.zip"
 # K线文件名模板：ETHUSDT-1m-2023-06-30.zip
 KLINE_FILENAME_TEMPLATE = "{symbol}-{timeframe}-{date}.zip"
 
+# 月度K线文件名模板：ETHUSDT-1m-2023-06.zip
+KLINE_MONTHLY_FILENAME_TEMPLATE = "{symbol}-{timeframe}-{month}.zip"
+
+# 月度聚合成交文件名模板：ETHUSDT-aggTrades-2023-06.zip
+AGGTRADES_MONTHLY_FILENAME_TEMPLATE = "{symbol}-aggTrades-{month}.zip"
+
+# 下载时转换得到的列式文件后缀（与 ZIP 同名同目录，存在时优先读取）
+COLUMNAR_SUFFIX = ".parquet"
+
 # ==================== 输出配置 ====================
 # 输出目录
 FEATURES_OUTPUT_DIR = OUTPUT_ROOT / "features"
@@ -44,7 +60,45 @@ FEATURES_OUTPUT_DIR = OUTPUT_ROOT / "features"
 OUTPUT_FORMAT = "feather"  # 可选: "parquet", "feather" 或 "csv"
 
 # 输出文件命名策略
-OUTPUT_STRATEGY = "single"  # 可选: "single" (单文件) 或 "monthly" (按月分割)
+OUTPUT_STRATEGY = "single"  # 可选: "single" (单文件)、"monthly" (按月分割) 或 "partitioned" (Hive 分区)
+
+# Hive 分区输出：FEATURES_OUTPUT_DIR/symbol=ETHUSDT/year=2024/month=06/part-00000.parquet
+# 行组大小（行数）：一周的分钟数据，按天/周范围读取时可按行组统计信息跳过
+FEATURES_ROW_GROUP_SIZE = 7 * 1440
+# 每个 part 文件的最大行数
+FEATURES_PART_MAX_ROWS = 1_000_000
+FEATURES_PARTITION_COMPRESSION = "zstd"
+
+# 因子输出的时间列（split_features 的旧输出使用 candle_begin_time，读取时统一为该列名）
+FEATURES_TIME_COLUMN = "timestamp"
+FEATURES_TIME_COLUMN_ALIASES = ["candle_begin_time"]
+
+# 因子输出目录下的清单文件：记录每个输出文件的时间范围和交易对，读取时据此跳过无关文件
+FEATURES_MANIFEST_FILENAME = "_manifest.json"
+
+# IPC / CSV 输出没有文件级键值元数据，滞后需求等元数据写入同名旁路文件 <文件名去掉后缀>_meta.json
+OUTPUT_METADATA_SUFFIX = "_meta.json"
+
+# 因子统计量（归一化参数）：每个批次的按日 Welford 累加器写入 _stats/<批次名>.json，合并后写出 feature_stats.json
+FEATURE_STATS_FILENAME = "feature_stats.json"
+FEATURE_STATS_FRAGMENT_DIR = "_stats"
+
+# 时间缺口索引：每个批次的合并输入和因子输出的缺口写入 _gaps/<批次名>.json，合并后写出 gap_index.json
+GAP_INDEX_FILENAME = "gap_index.json"
+GAP_INDEX_FRAGMENT_DIR = "_gaps"
+
+# ==================== 训练矩阵导出配置 ====================
+# 计算因子后导出行优先 float32 矩阵（.npy）、时间戳和 JSON 列索引，训练进程可 np.load(mmap_mode='r') 零拷贝读取
+EXPORT_MATRIX = False
+
+# 导出目录
+MATRIX_EXPORT_DIR = OUTPUT_ROOT / "matrix"
+
+# 导出的因子列（None 表示全部因子，即 ALL_FEATURES）
+MATRIX_FEATURES = None
+
+# 分块写入矩阵的行数（限制导出时的额外内存）
+MATRIX_EXPORT_CHUNK_ROWS = 100_000
 
 # ==================== 处理参数配置 ====================
 # 批处理大小（天数）
@@ -56,6 +110,22 @@ USE_LAZY_LOADING = True
 # 并行处理线程数（0 表示自动）
 N_THREADS = 0
 
+# ==================== 流水线配置 ====================
+# 下载与因子计算流水线（pipeline.py）：下载目录根（其下为 data/futures/um/daily/...）
+PIPELINE_DOWNLOAD_FOLDER = PROJECT_ROOT
+
+# 交易类型（um / cm / spot）
+PIPELINE_TRADING_TYPE = "um"
+
+# 并发下载数
+PIPELINE_DOWNLOAD_WORKERS = 8
+
+# 因子计算进程数
+PIPELINE_COMPUTE_WORKERS = 2
+
+# 已下载但尚未计算的天数上限（下载领先计算的最大天数）
+PIPELINE_QUEUE_SIZE = 4
+
 # ==================== 订单簿配置 ====================
 # 订单簿档位映射
 BID_LEVELS = [-1, -2, -3, -4, -5]  # 买方五档
@@ -84,6 +154,34 @@ KLINE_RENAME_MAP = {
     "volume": "traded_volume"
 }
 
+# ==================== 成交数据配置 ====================
+# 聚合成交 CSV 列（部分归档没有表头，按固定列名读取）
+AGGTRADES_COLUMNS = [
+    "agg_trade_id", "price", "quantity", "first_trade_id",
+    "last_trade_id", "transact_time", "is_buyer_maker"
+]
+
+# Tardis 成交 CSV 列（tardis_example/BTCUSDT.csv，时间戳单位为微秒）
+TARDIS_TRADE_COLUMNS = [
+    "exchange", "symbol", "timestamp", "local_timestamp",
+    "id", "side", "price", "amount"
+]
+
+# K线周期对应的毫秒数（用于由成交数据重建K线）
+TIMEFRAME_MS = {
+    "1s": 1_000,
+    "1m": 60_000
+}
+
+# 是否优先读取月度K线归档（每月解码一次再按日切片，尚未结束的月份用日K线文件）
+PREFER_MONTHLY_KLINES = True
+
+# 日K线文件缺失时，是否用月度聚合成交数据重建该日K线
+FILL_KLINE_GAPS_FROM_AGGTRADES = True
+
+# 流式读取成交数据时每批的行数
+TRADES_BATCH_ROWS = 1_000_000
+
 # ==================== 因子配置 ====================
 # K线特征因子列表
 KLINE_FEATURES = [
@@ -139,6 +237,17 @@ ALL_FEATURES = (
     TREND_FEATURES
 )
 
+# 滞后需求：因子列 -> 最大滞后阶数 k（需要 t-1..t-k）
+# 默认只记录在输出元数据中，读取时由 FeatureMatrix.lag_view 以跨步视图生成，不增加输出列
+LAG_SPEC = {
+    "wap_1": 5,
+    "volume_imbalance": 5,
+    "log_return_wap_1": 5
+}
+
+# 是否把滞后列（<因子>_lag_<i>）实际写入输出文件
+MATERIALIZE_LAGS = False
+
 # ==================== 数据验证配置 ====================
 # 数据质量检查开关
 ENABLE_DATA_VALIDATION = True
@@ -156,6 +265,16 @@ VALIDATION_RULES = {
 # 异常值处理策略
 OUTLIER_STRATEGY = "remove"  # 可选: "remove", "cap", "interpolate"
 
+# 输出验证（test_results.py）按批流式读取的行数，内存占用与文件大小无关
+VALIDATION_BATCH_ROWS = 500_000
+
+# 验证报告中的分位点
+VALIDATION_QUANTILES = [0.01, 0.5, 0.99]
+
+# 分位数草图的相对误差和每个符号的最大桶数（feature_sketch.py）；价格类因子远离 0，相对误差需足够小
+SKETCH_RELATIVE_ACCURACY = 0.002
+SKETCH_MAX_BUCKETS = 4096
+
 # ==================== 日志配置 ====================
 LOG_LEVEL = "INFO"  # 可选: "DEBUG", "INFO", "WARNING", "ERROR"
 LOG_DIR = PROJECT_ROOT / "logs"
@@ -207,6 +326,54 @@ def get_kline_filepath(date_str: str) -> Path:
     return KLINE_BASE_PATH / filename
 
 
+def get_kline_monthly_filepath(month_str: str) -> Path:
+    """
+    获取月度K线数据文件路径
+
+    Args:
+        month_str: 月份字符串，格式 'YYYY-MM'
+
+    Returns:
+        Path: 完整文件路径
+    """
+    filename = KLINE_MONTHLY_FILENAME_TEMPLATE.format(
+        symbol=SYMBOL,
+        timeframe=TIMEFRAME,
+        month=month_str
+    )
+    return KLINE_MONTHLY_BASE_PATH / filename
+
+
+def get_aggtrades_monthly_filepath(month_str: str) -> Path:
+    """
+    获取月度聚合成交数据文件路径
+
+    Args:
+        month_str: 月份字符串，格式 'YYYY-MM'
+
+    Returns:
+        Path: 完整文件路径
+    """
+    filename = AGGTRADES_MONTHLY_FILENAME_TEMPLATE.format(
+        symbol=SYMBOL,
+        month=month_str
+    )
+    return AGGTRADES_MONTHLY_BASE_PATH / filename
+
+
+def get_columnar_path(archive_path: Path) -> Path:
+    """
+    获取 ZIP 归档对应的列式文件路径（download 的 -convert 生成）
+
+    Args:
+        archive_path: ZIP 文件路径
+
+    Returns:
+        Path: 同目录下的 .parquet 文件路径
+    """
+    return archive_path.with_suffix(COLUMNAR_SUFFIX)
+
+
 def get_output_filepath(date_str: str = None, month_str: str = None,
                             start_date: str = None,
                         end_date: str = None,
@@ -233,6 +400,16 @@ def get_output_filepath(date_str: str = None, month_str: str = None,
     return FEATURES_OUTPUT_DIR / filename
 
 
+def get_output_metadata() -> dict:
+    """
+    获取因子输出文件的键值元数据（Parquet 写入文件，IPC / CSV 写入旁路文件）
+
+    Returns:
+        dict: 目前只记录滞后需求 lag_spec（JSON 字符串）
+    """
+    return {"lag_spec": json.dumps(LAG_SPEC)}
+
+
 def get_feature_columns():
     """
     获取所有因子列名
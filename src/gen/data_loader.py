@@ -4,21 +4,34 @@
 """
 
 import polars as pl
+import gzip
+import io
 import zipfile
+from itertools import islice
 from pathlib import Path
-from datetime import datetime, timedelta
-from typing import List, Tuple, Optional
+from datetime import datetime, timedelta, timezone
+from typing import Dict, IO, Iterator, List, Tuple, Optional
 import logging
 
 from config import (
     get_bookdepth_filepath,
     get_kline_filepath,
+    get_kline_monthly_filepath,
+    get_aggtrades_monthly_filepath,
+    get_columnar_path,
     SYMBOL,
     TIMEFRAME,
+    TIMEFRAME_MS,
     LEVEL_NAMES,
     BID_LEVELS,
     ASK_LEVELS,
+    KLINE_COLUMNS,
     KLINE_RENAME_MAP,
+    AGGTRADES_COLUMNS,
+    TARDIS_TRADE_COLUMNS,
+    PREFER_MONTHLY_KLINES,
+    FILL_KLINE_GAPS_FROM_AGGTRADES,
+    TRADES_BATCH_ROWS,
     SHOW_PROGRESS
 )
 
@@ -66,23 +79,28 @@ def load_daily_bookdepth(date_str: str) -> Optional[pl.DataFrame]:
         - notional: 名义价值
     """
     zip_path = get_bookdepth_filepath(date_str)
+    columnar_path = get_columnar_path(zip_path)
 
-    if not zip_path.exists():
+    if not zip_path.exists() and not columnar_path.exists():
         logger.warning(f"订单簿文件不存在: {zip_path}")
         return None
 
     try:
-        # 从 ZIP 文件中读取 CSV
-        with zipfile.ZipFile(zip_path, 'r') as z:
-            # ZIP 文件中应该只有一个 CSV 文件
-            csv_files = [f for f in z.namelist() if f.endswith('.csv')]
-            if not csv_files:
-                logger.error(f"ZIP 文件中没有 CSV 文件: {zip_path}")
-                return None
-
-            # 读取第一个 CSV 文件
-            with z.open(csv_files[0]) as f:
-                df = pl.read_csv(f)
+        if columnar_path.exists():
+            # 优先读取下载时已转换好的列式文件，省去解压和 CSV 解析
+            df = pl.read_parquet(columnar_path)
+        else:
+            # 从 ZIP 文件中读取 CSV
+            with zipfile.ZipFile(zip_path, 'r') as z:
+                # ZIP 文件中应该只有一个 CSV 文件
+                csv_files = [f for f in z.namelist() if f.endswith('.csv')]
+                if not csv_files:
+                    logger.error(f"ZIP 文件中没有 CSV 文件: {zip_path}")
+                    return None
+
+                # 读取第一个 CSV 文件
+                with z.open(csv_files[0]) as f:
+                    df = pl.read_csv(f)
 
         # 添加日期列用于调试
         df = df.with_columns(pl.lit(date_str).alias("date"))
@@ -110,23 +128,28 @@ def load_daily_kline(date_str: str) -> Optional[pl.DataFrame]:
           quote_volume, count, taker_buy_volume, taker_buy_quote_volume, ignore
     """
     zip_path = get_kline_filepath(date_str)
+    columnar_path = get_columnar_path(zip_path)
 
-    if not zip_path.exists():
+    if not zip_path.exists() and not columnar_path.exists():
         logger.warning(f"K线文件不存在: {zip_path}")
         return None
 
     try:
-        # 从 ZIP 文件中读取 CSV
-        with zipfile.ZipFile(zip_path, 'r') as z:
-            # ZIP 文件中应该只有一个 CSV 文件
-            csv_files = [f for f in z.namelist() if f.endswith('.csv')]
-            if not csv_files:
-                logger.error(f"ZIP 文件中没有 CSV 文件: {zip_path}")
-                return None
-
-            # 读取第一个 CSV 文件
-            with z.open(csv_files[0]) as f:
-                df = pl.read_csv(f)
+        if columnar_path.exists():
+            # 优先读取下载时已转换好的列式文件，省去解压和 CSV 解析
+            df = pl.read_parquet(columnar_path)
+        else:
+            # 从 ZIP 文件中读取 CSV
+            with zipfile.ZipFile(zip_path, 'r') as z:
+                # ZIP 文件中应该只有一个 CSV 文件
+                csv_files = [f for f in z.namelist() if f.endswith('.csv')]
+                if not csv_files:
+                    logger.error(f"ZIP 文件中没有 CSV 文件: {zip_path}")
+                    return None
+
+                # 读取第一个 CSV 文件
+                with z.open(csv_files[0]) as f:
+                    df = pl.read_csv(f)
 
         # 添加日期列用于调试
         df = df.with_columns(pl.lit(date_str).alias("date"))
@@ -139,6 +162,484 @@ def load_daily_kline(date_str: str) -> Optional[pl.DataFrame]:
         return None
 
 
+def load_monthly_kline(month_str: str) -> Optional[pl.DataFrame]:
+    """
+    读取整月K线归档
+
+    月度文件有的带表头、有的不带，按 KLINE_COLUMNS 固定列名分批解析；
+    同名 .parquet 存在时优先读取。
+
+    Args:
+        month_str: 月份字符串，格式 'YYYY-MM'
+
+    Returns:
+        按 open_time 排序的 DataFrame（KLINE_COLUMNS 列），或 None（如果文件不存在）
+    """
+    zip_path = get_kline_monthly_filepath(month_str)
+    columnar_path = get_columnar_path(zip_path)
+
+    if not zip_path.exists() and not columnar_path.exists():
+        logger.debug(f"月度K线文件不存在: {zip_path}")
+        return None
+
+    schema = {
+        "open_time": pl.Int64, "open": pl.Float64, "high": pl.Float64,
+        "low": pl.Float64, "close": pl.Float64, "volume": pl.Float64,
+        "close_time": pl.Int64, "quote_volume": pl.Float64, "count": pl.Int64,
+        "taker_buy_volume": pl.Float64, "taker_buy_quote_volume": pl.Float64, "ignore": pl.Int64
+    }
+
+    try:
+        if columnar_path.exists():
+            # 与 CSV 使用同一 schema（较早转换的文件中 ignore 为 Float64）
+            df = pl.read_parquet(columnar_path).cast(schema)
+        else:
+            with zipfile.ZipFile(zip_path, 'r') as z:
+                csv_files = [f for f in z.namelist() if f.endswith('.csv')]
+                if not csv_files:
+                    logger.error(f"ZIP 文件中没有 CSV 文件: {zip_path}")
+                    return None
+
+                with z.open(csv_files[0]) as f:
+                    batches = list(iter_csv_batches(f, KLINE_COLUMNS, schema, TRADES_BATCH_ROWS))
+
+            if not batches:
+                logger.warning(f"月度K线文件为空: {zip_path}")
+                return None
+            df = pl.concat(batches)
+
+        logger.debug(f"成功加载月度K线数据: {month_str}, 行数: {len(df)}")
+        return df.sort("open_time")
+
+    except Exception as e:
+        logger.error(f"读取月度K线数据失败 {month_str}: {str(e)}")
+        return None
+
+
+def load_klines_from_monthly(date_list: List[str]) -> Dict[str, pl.DataFrame]:
+    """
+    用月度K线归档加载指定日期的K线
+
+    每个月份的归档只解码一次，再按 UTC 日边界切片（有序数组上二分查找，切片不复制数据）。
+    没有月度归档的月份（例如当月尚未结束）不在返回结果中，由日K线文件补充。
+
+    Args:
+        date_list: 日期列表 'YYYY-MM-DD'
+
+    Returns:
+        日期 -> 原始K线格式 DataFrame（与 load_daily_kline 的输出相同）
+    """
+    months: Dict[str, List[str]] = {}
+    for date_str in date_list:
+        months.setdefault(date_str[:7], []).append(date_str)
+
+    result = {}
+    for month_str, dates in months.items():
+        month_df = load_monthly_kline(month_str)
+        if month_df is None:
+            continue
+
+        open_times = month_df["open_time"]
+        for date_str in dates:
+            day_start = _utc_day_start_ms(date_str)
+            lo = open_times.search_sorted(day_start, side="left")
+            hi = open_times.search_sorted(day_start + 86_400_000, side="left")
+            if hi <= lo:
+                continue
+            result[date_str] = month_df.slice(lo, hi - lo).with_columns(pl.lit(date_str).alias("date"))
+
+        logger.info(f"月度K线 {month_str}: 提供 {sum(d in result for d in dates)}/{len(dates)} 天")
+
+    return result
+
+
+# ==================== 成交数据 -> K线 ====================
+def iter_csv_batches(
+    f: IO[bytes],
+    columns: List[str],
+    schema: Dict[str, pl.DataType],
+    batch_rows: int = TRADES_BATCH_ROWS
+) -> Iterator[pl.DataFrame]:
+    """
+    按固定行数分批读取 CSV 字节流
+
+    兼容有表头和无表头两种归档：开头的空行和以首列名开头的表头行会被跳过。
+    每批都按固定 schema 解析，内存占用只与 batch_rows 相关。
+
+    Args:
+        f: 二进制文件对象（ZIP 成员、gzip 文件等）
+        columns: 列名列表
+        schema: 列名 -> Polars 类型
+        batch_rows: 每批行数
+
+    Yields:
+        每批的 DataFrame
+    """
+    header = columns[0].encode()
+    first_batch = True
+
+    while True:
+        lines = list(islice(f, batch_rows))
+        if not lines:
+            break
+
+        if first_batch:
+            # 跳过开头的空行和表头
+            skip = 0
+            while skip < len(lines) and (not lines[skip].strip() or lines[skip].lstrip().startswith(header)):
+                skip += 1
+            lines = lines[skip:]
+            if not lines:
+                continue
+            first_batch = False
+
+        yield pl.read_csv(
+            io.BytesIO(b"".join(lines)),
+            has_header=False,
+            new_columns=columns,
+            schema=schema
+        )
+
+
+def _utc_day_start_ms(date_str: str) -> int:
+    """日期 'YYYY-MM-DD' 当天 UTC 零点的毫秒时间戳（Binance 归档按 UTC 切日）"""
+    day = datetime.strptime(date_str, "%Y-%m-%d").replace(tzinfo=timezone.utc)
+    return int(day.timestamp() * 1000)
+
+
+def _aggregate_trades_to_bars(trades: pl.DataFrame, interval_ms: int) -> pl.DataFrame:
+    """
+    将一批逐笔成交聚合为K线（部分聚合，可再次合并）
+
+    输入列: time (毫秒), price, qty, is_buyer_maker, trade_count
+    """
+    return (
+        trades
+        .with_columns((pl.col("time") // interval_ms * interval_ms).alias("open_time"))
+        .group_by("open_time", maintain_order=True)
+        .agg([
+            pl.col("price").first().alias("open"),
+            pl.col("price").max().alias("high"),
+            pl.col("price").min().alias("low"),
+            pl.col("price").last().alias("close"),
+            pl.col("qty").sum().alias("volume"),
+            (pl.col("price") * pl.col("qty")).sum().alias("quote_volume"),
+            pl.col("trade_count").sum().alias("count"),
+            pl.col("qty").filter(~pl.col("is_buyer_maker")).sum().alias("taker_buy_volume"),
+            (pl.col("price") * pl.col("qty")).filter(~pl.col("is_buyer_maker")).sum()
+              .alias("taker_buy_quote_volume")
+        ])
+    )
+
+
+def _merge_partial_bars(partials: List[pl.DataFrame]) -> pl.DataFrame:
+    """
+    合并分批聚合得到的K线
+
+    批次边界会把同一根K线切成两段，这里按 open_time 再合并一次。
+    """
+    return (
+        pl.concat(partials)
+        .group_by("open_time", maintain_order=True)
+        .agg([
+            pl.col("open").first(),
+            pl.col("high").max(),
+            pl.col("low").min(),
+            pl.col("close").last(),
+            pl.col("volume").sum(),
+            pl.col("quote_volume").sum(),
+            pl.col("count").sum(),
+            pl.col("taker_buy_volume").sum(),
+            pl.col("taker_buy_quote_volume").sum()
+        ])
+        .sort("open_time")
+    )
+
+
+def _aggregate_trade_batches(batches: Iterator[pl.DataFrame], interval_ms: int) -> Optional[pl.DataFrame]:
+    """
+    逐批聚合标准化后的成交数据并合并为K线
+
+    Args:
+        batches: 成交批次（列: time, price, qty, is_buyer_maker, trade_count）
+        interval_ms: K线周期（毫秒）
+
+    Returns:
+        只包含有成交K线的 DataFrame，或 None（没有任何成交）
+    """
+    partials = [_aggregate_trades_to_bars(batch, interval_ms) for batch in batches]
+    if not partials:
+        return None
+    return _merge_partial_bars(partials)
+
+
+def fill_empty_bars(
+    bars: pl.DataFrame,
+    start_ms: int,
+    end_ms: int,
+    interval_ms: int
+) -> pl.DataFrame:
+    """
+    补齐没有成交的K线，并整理为与K线归档相同的列和类型
+
+    无成交的K线与交易所一致：OHLC 取上一根收盘价，成交量为 0。
+    """
+    grid = pl.DataFrame({
+        "open_time": pl.int_range(start_ms, end_ms, interval_ms, dtype=pl.Int64, eager=True)
+    })
+    bars = grid.join(bars.with_columns(pl.col("open_time").cast(pl.Int64)), on="open_time", how="left")
+
+    prev_close = pl.col("close").forward_fill().fill_null(pl.col("open").backward_fill())
+    bars = bars.with_columns(prev_close.alias("_prev_close")).with_columns([
+        pl.col(c).fill_null(pl.col("_prev_close")) for c in ["open", "high", "low", "close"]
+    ] + [
+        pl.col(c).fill_null(0) for c in
+        ["volume", "quote_volume", "count", "taker_buy_volume", "taker_buy_quote_volume"]
+    ])
+
+    return bars.with_columns([
+        (pl.col("open_time") + interval_ms - 1).alias("close_time"),
+        pl.col("count").cast(pl.Int64),
+        pl.lit(0, dtype=pl.Int64).alias("ignore")
+    ]).select(KLINE_COLUMNS)
+
+
+def aggregate_aggtrades_file(
+    zip_path: Path,
+    interval: str = TIMEFRAME,
+    batch_rows: int = TRADES_BATCH_ROWS,
+    time_ranges: Optional[List[Tuple[int, int]]] = None
+) -> Optional[pl.DataFrame]:
+    """
+    流式读取聚合成交归档并重建K线
+
+    成交数据按批读取、按批聚合，只在内存中保留已聚合的K线，
+    因此月度文件（数 GB 解压后）也不需要整体载入。
+    只需要其中几天时传入 time_ranges：每批成交先按时间范围过滤再聚合，内存中只保留这几天的K线，
+    读过最后一个范围后不再读取文件剩余部分（归档中的成交按时间排序）。
+
+    Args:
+        zip_path: aggTrades ZIP 文件路径（biance_example/aggtrades.csv 格式，同名 .parquet 存在时优先读取）
+        interval: K线周期 ("1s" 或 "1m")
+        batch_rows: 每批读取的成交行数
+        time_ranges: 需要的时间范围 [(起始毫秒, 结束毫秒), ...]（左闭右开），None 表示整个文件
+
+    Returns:
+        只包含有成交K线的 DataFrame（open_time, OHLC, 成交量等，未补齐空K线，
+        可用 fill_empty_bars 整理为 KLINE_COLUMNS 格式），或 None（如果文件不存在）
+    """
+    columnar_path = get_columnar_path(zip_path)
+    if not zip_path.exists() and not columnar_path.exists():
+        logger.warning(f"聚合成交文件不存在: {zip_path}")
+        return None
+
+    interval_ms = TIMEFRAME_MS[interval]
+    schema = {
+        "agg_trade_id": pl.Int64,
+        "price": pl.Float64,
+        "quantity": pl.Float64,
+        "first_trade_id": pl.Int64,
+        "last_trade_id": pl.Int64,
+        "transact_time": pl.Int64,
+        "is_buyer_maker": pl.Boolean
+    }
+
+    if time_ranges:
+        in_ranges = pl.any_horizontal([
+            (pl.col("transact_time") >= start) & (pl.col("transact_time") < end) for start, end in time_ranges
+        ])
+        last_end = max(end for _, end in time_ranges)
+
+    def to_trades(batches: Iterator[pl.DataFrame]) -> Iterator[pl.DataFrame]:
+        for batch in batches:
+            if time_ranges:
+                if len(batch) and batch["transact_time"].min() >= last_end:
+                    break
+                batch = batch.filter(in_ranges)
+                if len(batch) == 0:
+                    continue
+            yield batch.select([
+                pl.col("transact_time").alias("time"),
+                "price",
+                pl.col("quantity").alias("qty"),
+                "is_buyer_maker",
+                (pl.col("last_trade_id") - pl.col("first_trade_id") + 1).alias("trade_count")
+            ])
+
+    try:
+        if columnar_path.exists():
+            # 已转换的列式文件按行组切片读取，同样只保留聚合后的K线
+            frame = pl.scan_parquet(columnar_path)
+            total_rows = frame.select(pl.len()).collect().item()
+            batches = (frame.slice(offset, batch_rows).collect() for offset in range(0, total_rows, batch_rows))
+            bars = _aggregate_trade_batches(to_trades(batches), interval_ms)
+        else:
+            with zipfile.ZipFile(zip_path, 'r') as z:
+                csv_files = [f for f in z.namelist() if f.endswith('.csv')]
+                if not csv_files:
+                    logger.error(f"ZIP 文件中没有 CSV 文件: {zip_path}")
+                    return None
+
+                with z.open(csv_files[0]) as f:
+                    batches = iter_csv_batches(f, AGGTRADES_COLUMNS, schema, batch_rows)
+                    bars = _aggregate_trade_batches(to_trades(batches), interval_ms)
+
+        if bars is None:
+            logger.warning(f"聚合成交文件为空: {zip_path}")
+            return None
+
+        logger.debug(f"由聚合成交重建K线: {zip_path.name}, K线数: {len(bars)}")
+        return bars
+
+    except Exception as e:
+        logger.error(f"读取聚合成交数据失败 {zip_path}: {str(e)}")
+        return None
+
+
+def iter_tardis_trades(
+    file_path: Path,
+    batch_rows: int = TRADES_BATCH_ROWS
+) -> Iterator[pl.DataFrame]:
+    """
+    分批读取 Tardis 格式的逐笔成交文件（.csv 或 .csv.gz）
+
+    文件格式见 tardis_example/BTCUSDT.csv:
+        exchange, symbol, timestamp, local_timestamp, id, side, price, amount
+    其中 timestamp / local_timestamp 为微秒时间戳，side 为 "buy" / "sell"（主动方）。
+
+    Args:
+        file_path: 文件路径，以 .gz 结尾时按 gzip 流式解压
+        batch_rows: 每批行数
+
+    Yields:
+        每批成交 DataFrame，列:
+        - timestamp: 成交时间 (Datetime[us])
+        - local_timestamp: 本地接收时间 (Datetime[us])
+        - id: 成交ID
+        - price, amount: 成交价和成交量
+        - is_buyer_maker: 买方是否为挂单方（side == "sell" 时为 True，与 Binance 成交字段含义一致）
+    """
+    schema = {
+        "exchange": pl.Utf8,
+        "symbol": pl.Utf8,
+        "timestamp": pl.Int64,
+        "local_timestamp": pl.Int64,
+        "id": pl.Utf8,
+        "side": pl.Utf8,
+        "price": pl.Float64,
+        "amount": pl.Float64
+    }
+
+    opener = gzip.open if file_path.suffix == ".gz" else open
+    with opener(file_path, 'rb') as f:
+        for batch in iter_csv_batches(f, TARDIS_TRADE_COLUMNS, schema, batch_rows):
+            yield batch.select([
+                pl.from_epoch(pl.col("timestamp"), time_unit="us").alias("timestamp"),
+                pl.from_epoch(pl.col("local_timestamp"), time_unit="us").alias("local_timestamp"),
+                "id",
+                "price",
+                "amount",
+                (pl.col("side") == "sell").alias("is_buyer_maker")
+            ])
+
+
+def load_tardis_trade_klines(
+    file_path: Path,
+    interval: str = TIMEFRAME,
+    batch_rows: int = TRADES_BATCH_ROWS
+) -> Optional[pl.DataFrame]:
+    """
+    将 Tardis 逐笔成交聚合为K线
+
+    聚合口径与 aggregate_aggtrades_file 完全相同（每行计一笔成交），
+    输出同样可交给 preprocess_kline。按批处理，单月数 GB 的文件也只占用批大小的内存。
+
+    Args:
+        file_path: Tardis 成交文件路径（.csv 或 .csv.gz）
+        interval: K线周期 ("1s" 或 "1m")
+        batch_rows: 每批读取的成交行数
+
+    Returns:
+        只包含有成交K线的 DataFrame（与 aggregate_aggtrades_file 的输出相同），
+        或 None（如果文件不存在或为空）
+    """
+    if not file_path.exists():
+        logger.warning(f"Tardis 成交文件不存在: {file_path}")
+        return None
+
+    interval_ms = TIMEFRAME_MS[interval]
+
+    try:
+        trades = (
+            batch.select([
+                (pl.col("timestamp").dt.epoch(time_unit="us") // 1000).alias("time"),
+                "price",
+                pl.col("amount").alias("qty"),
+                "is_buyer_maker",
+                pl.lit(1, dtype=pl.Int64).alias("trade_count")
+            ])
+            for batch in iter_tardis_trades(file_path, batch_rows)
+        )
+        bars = _aggregate_trade_batches(trades, interval_ms)
+
+        if bars is None:
+            logger.warning(f"Tardis 成交文件为空: {file_path}")
+            return None
+
+        logger.debug(f"由 Tardis 成交重建K线: {file_path.name}, K线数: {len(bars)}")
+        return bars
+
+    except Exception as e:
+        logger.error(f"读取 Tardis 成交数据失败 {file_path}: {str(e)}")
+        return None
+
+
+def load_klines_from_aggtrades(
+    date_list: List[str],
+    interval: str = TIMEFRAME
+) -> Dict[str, pl.DataFrame]:
+    """
+    用月度聚合成交归档重建指定日期的K线
+
+    同一个月的多个缺失日期只解码一次月度文件。
+
+    Args:
+        date_list: 需要重建的日期列表 'YYYY-MM-DD'
+        interval: K线周期 ("1s" 或 "1m")
+
+    Returns:
+        日期 -> 原始K线格式 DataFrame（与 load_daily_kline 的输出相同，可直接交给 preprocess_kline）
+    """
+    interval_ms = TIMEFRAME_MS[interval]
+
+    # 按月份分组
+    months: Dict[str, List[str]] = {}
+    for date_str in date_list:
+        months.setdefault(date_str[:7], []).append(date_str)
+
+    result = {}
+    for month_str, dates in months.items():
+        # 只聚合缺失日期的成交，不在内存中保留整月的K线
+        day_ranges = [(_utc_day_start_ms(date_str), _utc_day_start_ms(date_str) + 86_400_000) for date_str in dates]
+        bars = aggregate_aggtrades_file(get_aggtrades_monthly_filepath(month_str), interval, time_ranges=day_ranges)
+        if bars is None:
+            continue
+
+        for date_str, (day_start, day_end) in zip(dates, day_ranges):
+            day_bars = bars.filter(
+                (pl.col("open_time") >= day_start) & (pl.col("open_time") < day_end)
+            )
+            if len(day_bars) == 0:
+                logger.warning(f"聚合成交中没有 {date_str} 的数据")
+                continue
+
+            day_df = fill_empty_bars(day_bars, day_start, day_end, interval_ms)
+            result[date_str] = day_df.with_columns(pl.lit(date_str).alias("date"))
+            logger.info(f"已用聚合成交补齐 {date_str} 的K线: {len(day_df)} 根")
+
+    return result
+
+
 def load_date_range_data(
     start_date: str,
     end_date: str,
@@ -159,7 +660,11 @@ def load_date_range_data(
     logger.info(f"准备加载 {len(date_list)} 天的数据，从 {start_date} 到 {end_date}")
 
     bookdepth_dfs = []
-    kline_dfs = []
+    kline_dfs = {}
+
+    # 整月归档优先：每个月只解码一次，尚未结束的月份再读日K线文件
+    if data_type in ["both", "kline"] and PREFER_MONTHLY_KLINES:
+        kline_dfs.update(load_klines_from_monthly(date_list))
 
     for i, date_str in enumerate(date_list):
         if SHOW_PROGRESS and (i + 1) % 10 == 0:
@@ -172,10 +677,20 @@ def load_date_range_data(
                 bookdepth_dfs.append(bd_df)
 
         # 加载K线数据
-        if data_type in ["both", "kline"]:
+        if data_type in ["both", "kline"] and date_str not in kline_dfs:
             kl_df = load_daily_kline(date_str)
             if kl_df is not None:
-                kline_dfs.append(kl_df)
+                kline_dfs[date_str] = kl_df
+
+    # 用聚合成交数据补齐缺失的K线日期，避免 merge_data 的内连接丢掉整天的订单簿数据
+    if data_type in ["both", "kline"] and FILL_KLINE_GAPS_FROM_AGGTRADES:
+        missing_dates = [d for d in date_list if d not in kline_dfs]
+        if missing_dates:
+            logger.info(f"{len(missing_dates)} 天缺少K线文件，尝试用聚合成交数据重建")
+            kline_dfs.update(load_klines_from_aggtrades(missing_dates))
+
+    # 按日期顺序排列K线
+    kline_dfs = [kline_dfs[d] for d in date_list if d in kline_dfs]
 
     # 合并所有日期的数据
     bookdepth_df = None
@@ -183,12 +698,19 @@ def load_date_range_data(
 
     if bookdepth_dfs:
         logger.info(f"合并 {len(bookdepth_dfs)} 天的订单簿数据")
+        if len({df.schema["timestamp"] for df in bookdepth_dfs}) > 1:
+            # 列式文件中的时间戳已解析为 Datetime，ZIP 中的仍是字符串，统一后再合并
+            bookdepth_dfs = [
+                df.with_columns(pl.col("timestamp").str.strptime(pl.Datetime("ms"), "%Y-%m-%d %H:%M:%S"))
+                if df.schema["timestamp"] == pl.Utf8 else df.with_columns(pl.col("timestamp").cast(pl.Datetime("ms")))
+                for df in bookdepth_dfs
+            ]
         bookdepth_df = pl.concat(bookdepth_dfs)
         logger.info(f"订单簿总行数: {len(bookdepth_df)}")
 
     if kline_dfs:
         logger.info(f"合并 {len(kline_dfs)} 天的K线数据")
-        kline_df = pl.concat(kline_dfs)
+        kline_df = pl.concat(kline_dfs, how="vertical_relaxed")
         logger.info(f"K线总行数: {len(kline_df)}")
 
     return bookdepth_df, kline_df
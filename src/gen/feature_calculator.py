@@ -6,7 +6,7 @@
 import polars as pl
 import numpy as np
 import logging
-from typing import List
+from typing import Dict, List
 
 logger = logging.getLogger(__name__)
 
@@ -458,6 +458,41 @@ def calculate_all_features(df: pl.DataFrame) -> pl.DataFrame:
     return df
 
 
+# ==================== 滞后因子 ====================
+def get_lag_column_name(column: str, lag: int) -> str:
+    """滞后列名，例如 wap_1_lag_3"""
+    return f"{column}_lag_{lag}"
+
+
+def calculate_lag_features(df: pl.DataFrame, lag_spec: Dict[str, int]) -> pl.DataFrame:
+    """
+    把滞后需求物化为实际的列
+
+    所有滞后列在同一次 with_columns 中计算，Polars 一次并行求值，不逐列重建数据框。
+    滞后按行计算（与 shift 一致），跨越缺失分钟时取到的是缺口前的行。
+
+    Args:
+        df: 因子数据框（按时间排序）
+        lag_spec: 因子列 -> 最大滞后阶数 k，生成 <因子>_lag_1 .. <因子>_lag_k
+
+    Returns:
+        添加了滞后列的数据框，前 k 行的滞后列为 null
+    """
+    missing = [col for col in lag_spec if col not in df.columns]
+    if missing:
+        raise ValueError(f"滞后需求中的列不存在: {missing}")
+
+    lag_exprs = [
+        pl.col(col).shift(lag).alias(get_lag_column_name(col, lag))
+        for col, max_lag in lag_spec.items()
+        for lag in range(1, max_lag + 1)
+    ]
+    df = df.with_columns(lag_exprs)
+
+    logger.info(f"滞后因子计算完成，新增 {len(lag_exprs)} 列")
+    return df
+
+
 def get_feature_columns() -> List[str]:
     """
     获取所有因子列名（按类别排序）
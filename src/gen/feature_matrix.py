@@ -0,0 +1,428 @@
+"""
+训练矩阵导出模块
+把因子数据导出为行优先的 float32 矩阵，供训练进程以内存映射方式零拷贝读取
+
+每次导出生成四个文件（同一前缀）：
+- <stem>.npy            因子矩阵，形状 (行数, 因子数)，float32，C 连续
+- <stem>.timestamps.npy 每行的时间戳（UTC 毫秒，int64）
+- <stem>.gaps.json      时间缺口索引（见 gap_index）
+- <stem>.json           列索引：列名顺序、行数、时间范围、滞后需求
+
+多个训练进程对同一文件 np.load(mmap_mode='r') 时共享操作系统页缓存，不会各自复制一份矩阵。
+iter_windows 在内存映射矩阵上按滑动窗口取样，窗口是跨步视图，按缺口索引跳过缺失的分钟。
+"""
+
+import os
+import json
+import queue
+import logging
+import argparse
+import threading
+from pathlib import Path
+from typing import Dict, Iterator, List, Optional
+
+import numpy as np
+import polars as pl
+from numpy.lib.stride_tricks import sliding_window_view
+
+from gap_index import GapIndex, save_gap_index, load_gap_index
+from feature_store import scan_feature_file, read_lag_spec
+from config import (
+    ALL_FEATURES,
+    FEATURES_TIME_COLUMN,
+    LAG_SPEC,
+    MATRIX_EXPORT_DIR,
+    MATRIX_FEATURES,
+    MATRIX_EXPORT_CHUNK_ROWS
+)
+
+logger = logging.getLogger(__name__)
+
+MATRIX_DTYPE = np.float32
+
+# 相邻两行的时间间隔（毫秒），与因子数据的 1 分钟粒度一致
+ROW_INTERVAL_MS = 60_000
+
+# 缺口索引文件中矩阵时间戳对应的键
+MATRIX_GAPS_KEY = "matrix"
+
+
+def get_matrix_paths(stem: Path) -> Dict[str, Path]:
+    """导出文件路径：matrix / timestamps / gaps / index"""
+    stem = Path(stem)
+    return {
+        "matrix": stem.with_name(stem.name + ".npy"),
+        "timestamps": stem.with_name(stem.name + ".timestamps.npy"),
+        "gaps": stem.with_name(stem.name + ".gaps.json"),
+        "index": stem.with_name(stem.name + ".json"),
+    }
+
+
+def export_feature_matrix(
+    df: pl.DataFrame,
+    stem: Path,
+    columns: Optional[List[str]] = None,
+    chunk_rows: int = MATRIX_EXPORT_CHUNK_ROWS,
+    lag_spec: Optional[Dict[str, int]] = None
+) -> Path:
+    """
+    导出因子矩阵、时间戳、缺口索引和列索引
+
+    矩阵通过 np.lib.format.open_memmap 分块写入，每块单独转为 float32，导出时的额外内存约为 chunk_rows 行
+    （加上时间戳一列；输入未按时间排序时还要排序复制一份）。
+    所有文件先写临时文件再替换，列索引最后写出，读者看到索引时矩阵已完整。
+
+    Args:
+        df: 因子数据，包含时间列
+        stem: 输出路径前缀（不含后缀）
+        columns: 导出的因子列，默认 MATRIX_FEATURES 或全部因子
+        chunk_rows: 分块写入的行数
+        lag_spec: 记录到列索引的滞后需求，默认 LAG_SPEC（只保留导出的列）
+
+    Returns:
+        列索引文件路径
+    """
+    columns = list(columns or MATRIX_FEATURES or ALL_FEATURES)
+    missing = [c for c in columns if c not in df.columns]
+    if missing:
+        raise ValueError(f"因子数据缺少列: {missing}")
+
+    lag_spec = LAG_SPEC if lag_spec is None else lag_spec
+    skipped = [c for c in lag_spec if c not in columns]
+    if skipped:
+        logger.warning(f"滞后需求中的列未导出，忽略: {skipped}")
+    lags = {c: k for c, k in lag_spec.items() if c in columns}
+
+    paths = get_matrix_paths(stem)
+    paths["matrix"].parent.mkdir(parents=True, exist_ok=True)
+    # 因子输出本身按时间排序，只在必要时排序
+    if not df[FEATURES_TIME_COLUMN].is_sorted():
+        df = df.sort(FEATURES_TIME_COLUMN)
+    rows = len(df)
+
+    tmp_matrix = paths["matrix"].with_name(paths["matrix"].name + ".tmp")
+    matrix = np.lib.format.open_memmap(tmp_matrix, mode="w+", dtype=MATRIX_DTYPE, shape=(rows, len(columns)))
+    for offset in range(0, rows, chunk_rows):
+        chunk = df.slice(offset, chunk_rows).select(pl.col(columns).cast(pl.Float32))
+        matrix[offset:offset + chunk_rows] = chunk.to_numpy(order="c")
+    matrix.flush()
+    del matrix
+    os.replace(tmp_matrix, paths["matrix"])
+
+    timestamps = df[FEATURES_TIME_COLUMN].dt.epoch(time_unit="ms").to_numpy()
+    tmp_timestamps = paths["timestamps"].with_name(paths["timestamps"].name + ".tmp")
+    with open(tmp_timestamps, "wb") as f:
+        np.save(f, timestamps.astype(np.int64))
+    os.replace(tmp_timestamps, paths["timestamps"])
+    save_gap_index(paths["gaps"], {MATRIX_GAPS_KEY: GapIndex.from_timestamps(timestamps, ROW_INTERVAL_MS)})
+
+    index = {
+        "columns": columns,
+        "rows": rows,
+        "dtype": np.dtype(MATRIX_DTYPE).name,
+        "matrix": paths["matrix"].name,
+        "timestamps": paths["timestamps"].name,
+        "gaps": paths["gaps"].name,
+        "start": df[FEATURES_TIME_COLUMN][0].isoformat() if rows else None,
+        "end": df[FEATURES_TIME_COLUMN][-1].isoformat() if rows else None,
+        "lags": lags,
+    }
+    tmp_index = paths["index"].with_name(paths["index"].name + ".tmp")
+    with open(tmp_index, "w") as f:
+        json.dump(index, f, indent=2, ensure_ascii=False)
+    os.replace(tmp_index, paths["index"])
+
+    logger.info(f"导出训练矩阵: {paths['matrix']} ({rows} 行 x {len(columns)} 列, "
+                f"{paths['matrix'].stat().st_size / 1e6:.1f} MB)")
+    return paths["index"]
+
+
+class FeatureMatrix:
+    """
+    以内存映射方式打开的导出矩阵
+
+    Attributes:
+        matrix: (行数, 因子数) 只读 float32 内存映射
+        timestamps: 每行的 UTC 毫秒时间戳（只读内存映射）
+        columns: 列名列表，与 matrix 的列一一对应
+        lags: 导出时记录的滞后需求（因子列 -> 最大滞后阶数）
+        gaps: 时间缺口索引，旧的导出没有缺口索引时为 None
+        index: 列索引文件内容
+    """
+
+    def __init__(self, stem: Path):
+        paths = get_matrix_paths(stem)
+        with open(paths["index"]) as f:
+            self.index = json.load(f)
+        self.columns = self.index["columns"]
+        self.lags = self.index.get("lags", {})
+        self.matrix = np.load(paths["matrix"], mmap_mode="r")
+        self.timestamps = np.load(paths["timestamps"], mmap_mode="r")
+        self.gaps: Optional[GapIndex] = load_gap_index(paths["gaps"]).get(MATRIX_GAPS_KEY)
+        self._positions = {name: i for i, name in enumerate(self.columns)}
+
+    def __len__(self) -> int:
+        return self.matrix.shape[0]
+
+    def column_positions(self, names: List[str]) -> List[int]:
+        """列名对应的矩阵列号"""
+        return [self._positions[name] for name in names]
+
+    def column(self, name: str) -> np.ndarray:
+        """单列视图（跨步访问，不复制）"""
+        return self.matrix[:, self._positions[name]]
+
+    def lag_view(self, name: str, max_lag: Optional[int] = None) -> np.ndarray:
+        """
+        单列的滞后视图（跨步访问，不复制）
+
+        第 j 行对应矩阵第 j + max_lag 行，第 i 列为滞后 i 阶的值（第 0 列为当期值）。
+        滞后按行计算，需要排除缺口时用 valid_window_starts(timestamps, max_lag + 1, gaps=gaps) 选行。
+
+        Args:
+            name: 因子列名
+            max_lag: 最大滞后阶数，默认取列索引中记录的滞后需求
+
+        Returns:
+            (行数 - max_lag, max_lag + 1) 的只读视图
+        """
+        if max_lag is None:
+            if name not in self.lags:
+                raise ValueError(f"列索引中没有 {name} 的滞后需求")
+            max_lag = self.lags[name]
+        return lag_view(self.column(name), max_lag)
+
+    def lag_views(self) -> Dict[str, np.ndarray]:
+        """
+        按列索引中的滞后需求生成所有滞后视图
+
+        各视图截去相同的起始行（最大的滞后阶数），行与行之间一一对齐，
+        第 j 行对应矩阵第 j + max(lags) 行。
+
+        Returns:
+            因子列名 -> (行数 - max(lags), 该列滞后阶数 + 1) 的视图
+        """
+        return aligned_lag_views({name: self.column(name) for name in self.lags}, self.lags)
+
+
+def load_feature_matrix(stem: Path) -> FeatureMatrix:
+    """
+    打开导出的训练矩阵
+
+    Args:
+        stem: 导出时的路径前缀（不含后缀）
+
+    Returns:
+        FeatureMatrix
+    """
+    return FeatureMatrix(stem)
+
+
+def lag_view(values: np.ndarray, max_lag: int) -> np.ndarray:
+    """
+    一维序列的滞后视图（跨步访问，不复制）
+
+    Returns:
+        (长度 - max_lag, max_lag + 1) 的只读视图，第 j 行对应 values[j + max_lag]，第 i 列为滞后 i 阶的值
+    """
+    return sliding_window_view(values, max_lag + 1)[:, ::-1]
+
+
+def aligned_lag_views(columns: Dict[str, np.ndarray], lags: Dict[str, int]) -> Dict[str, np.ndarray]:
+    """
+    按滞后需求生成各列的滞后视图，截去相同的起始行（最大的滞后阶数）使行与行对齐
+
+    Args:
+        columns: 因子列名 -> 一维数组
+        lags: 因子列名 -> 最大滞后阶数
+
+    Returns:
+        因子列名 -> (长度 - max(lags), 该列滞后阶数 + 1) 的视图
+    """
+    if not lags:
+        return {}
+    offset = max(lags.values())
+    return {name: lag_view(columns[name], max_lag)[offset - max_lag:] for name, max_lag in lags.items()}
+
+
+def load_lag_views(path: Path) -> Dict[str, np.ndarray]:
+    """
+    由因子输出文件和其中记录的滞后需求生成滞后视图（不需要导出训练矩阵）
+
+    只读取滞后需求涉及的列；没有空值的数值列转为 numpy 时不复制，视图建立在该数组上。
+    输出文件按时间排序，滞后按行计算，与 FeatureMatrix.lag_views 一致。
+
+    Args:
+        path: 因子输出文件（Parquet 读取文件元数据，IPC / CSV 读取 <stem>_meta.json）
+
+    Returns:
+        因子列名 -> 对齐的滞后视图，文件没有记录滞后需求时为空
+    """
+    lags = read_lag_spec(path)
+    if not lags:
+        return {}
+    df = scan_feature_file(Path(path)).select(list(lags)).collect()
+    return aligned_lag_views({name: df[name].to_numpy() for name in lags}, lags)
+
+
+def window_view(matrix: np.ndarray, window: int) -> np.ndarray:
+    """
+    所有长度为 window 的滑动窗口
+
+    Args:
+        matrix: (行数, 因子数) 矩阵
+        window: 窗口长度（行数）
+
+    Returns:
+        (行数 - window + 1, window, 因子数) 的只读跨步视图，第 i 个窗口为 matrix[i:i + window]
+    """
+    return sliding_window_view(matrix, window, axis=0).transpose(0, 2, 1)
+
+
+def valid_window_starts(
+    timestamps: np.ndarray,
+    window: int,
+    interval_ms: int = ROW_INTERVAL_MS,
+    gaps: Optional[GapIndex] = None
+) -> np.ndarray:
+    """
+    不跨越缺失分钟的窗口起点
+
+    给出缺口索引时，每个缺口在时间戳上 searchsorted 一次得到断点行号，合法起点是各连续段内的行，
+    不需要比较每个窗口的首尾；否则比较窗口首尾的时间差。
+    时间戳升序且不重复时，两种方式等价：窗口首尾相差恰好 (window - 1) 个间隔即窗口内没有缺口。
+
+    Args:
+        timestamps: 每行的毫秒时间戳
+        window: 窗口长度（行数）
+        interval_ms: 相邻行的时间间隔
+        gaps: 时间戳的缺口索引（例如 FeatureMatrix.gaps），间隔与 interval_ms 不同时忽略
+
+    Returns:
+        合法窗口起点的行号数组
+    """
+    timestamps = np.asarray(timestamps)
+    if len(timestamps) < window:
+        return np.empty(0, dtype=np.int64)
+    if gaps is not None and gaps.interval_ms == interval_ms:
+        # 断点：每个缺口后第一行的行号
+        breaks = np.searchsorted(timestamps, gaps.ends)
+        seg_starts = np.concatenate([[0], breaks])
+        seg_ends = np.concatenate([breaks, [len(timestamps)]]) - window + 1
+        return np.concatenate([np.arange(s, e, dtype=np.int64) for s, e in zip(seg_starts, seg_ends)])
+    span = timestamps[window - 1:] - timestamps[:len(timestamps) - window + 1]
+    return np.flatnonzero(span == (window - 1) * interval_ms)
+
+
+def iter_windows(
+    fm: FeatureMatrix,
+    window: int,
+    columns: Optional[List[str]] = None,
+    batch_size: Optional[int] = None,
+    shuffle: bool = False,
+    seed: Optional[int] = None,
+    prefetch: int = 0,
+    interval_ms: int = ROW_INTERVAL_MS
+) -> Iterator[np.ndarray]:
+    """
+    遍历最近 window 分钟的因子窗口
+
+    batch_size 为 None 时逐个产出窗口，每个窗口是内存映射矩阵上的零拷贝视图；
+    否则产出 (batch_size, window, 因子数) 的批次（批内窗口各复制一次）。
+    prefetch > 0 时由后台线程提前准备最多 prefetch 个批次。
+
+    Args:
+        fm: 打开的训练矩阵
+        window: 窗口长度（行数）
+        columns: 只取这些因子列，默认全部列（选列时每个窗口会复制）
+        batch_size: 每批窗口数
+        shuffle: 是否打乱窗口顺序
+        seed: 打乱顺序的随机种子
+        prefetch: 后台预取的批次数，0 表示不预取
+        interval_ms: 相邻行的时间间隔
+
+    Yields:
+        窗口 (window, 因子数) 或批次 (batch_size, window, 因子数)
+    """
+    windows = window_view(fm.matrix, window)
+    positions = fm.column_positions(columns) if columns is not None else None
+    starts = valid_window_starts(fm.timestamps, window, interval_ms, fm.gaps)
+    if shuffle:
+        starts = np.random.default_rng(seed).permutation(starts)
+
+    def produce() -> Iterator[np.ndarray]:
+        if batch_size is None:
+            for start in starts:
+                yield windows[start] if positions is None else windows[start][:, positions]
+            return
+        for offset in range(0, len(starts), batch_size):
+            batch = windows[starts[offset:offset + batch_size]]
+            yield batch if positions is None else batch[:, :, positions]
+
+    if prefetch <= 0:
+        yield from produce()
+        return
+
+    buffer = queue.Queue(maxsize=prefetch)
+    stop = threading.Event()
+    done = object()
+
+    def fill() -> None:
+        try:
+            for item in produce():
+                while not stop.is_set():
+                    try:
+                        buffer.put(item, timeout=0.1)
+                        break
+                    except queue.Full:
+                        continue
+                if stop.is_set():
+                    return
+            buffer.put(done)
+        except Exception as e:
+            buffer.put(e)
+
+    worker = threading.Thread(target=fill, name="window-prefetch", daemon=True)
+    worker.start()
+    try:
+        while True:
+            item = buffer.get()
+            if item is done:
+                return
+            if isinstance(item, Exception):
+                raise item
+            yield item
+    finally:
+        # 消费者提前退出时通知后台线程结束
+        stop.set()
+
+
+def main():
+    """从已有的因子输出导出训练矩阵"""
+    from feature_store import read_features
+
+    parser = argparse.ArgumentParser(description='把因子输出导出为 float32 训练矩阵 (.npy + JSON 列索引)')
+    parser.add_argument('--start-date', type=str, required=True, help='起始日期 (含)')
+    parser.add_argument('--end-date', type=str, required=True, help='结束日期 (不含)')
+    parser.add_argument('--columns', type=str, nargs='+', default=None,
+                        help='导出的因子列 (默认: 全部因子)')
+    parser.add_argument('--output', type=str, default=None,
+                        help=f'输出路径前缀 (默认: {MATRIX_EXPORT_DIR}/features_<起始>_<结束>)')
+
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+
+    columns = list(args.columns or MATRIX_FEATURES or ALL_FEATURES)
+    df = read_features(args.start_date, args.end_date, columns=columns).collect()
+    if df.is_empty():
+        logger.error("指定范围内没有因子数据")
+        return 1
+
+    stem = Path(args.output) if args.output else MATRIX_EXPORT_DIR / (
+        f"features_{args.start_date.replace('-', '')}_{args.end_date.replace('-', '')}")
+    export_feature_matrix(df, stem, columns)
+    return 0
+
+
+if __name__ == "__main__":
+    exit(main())
@@ -0,0 +1,317 @@
+"""
+因子分布草图模块
+对数分桶的分位数草图（DDSketch 思路）：内存有界、可合并，给出相对误差不超过 relative_accuracy 的分位数
+
+- 同一 relative_accuracy 的草图分桶完全一致，按桶相加即可合并（多批次、多文件、多进程）
+- 直方图和分布漂移（PSI，按基准分位点粗分区间）直接由分桶计数得到，不需要重新读取数据
+- 草图保存为 JSON，月度之间比较分布只需读取草图文件
+"""
+
+import json
+import math
+import logging
+from pathlib import Path
+from typing import Dict, List, Optional, Sequence
+
+import numpy as np
+import polars as pl
+
+from config import (
+    SKETCH_RELATIVE_ACCURACY,
+    SKETCH_MAX_BUCKETS
+)
+
+logger = logging.getLogger(__name__)
+
+# 绝对值小于该值的数计入零桶
+SKETCH_MIN_INDEXABLE = 1e-12
+
+# 计算 PSI 时按基准分位点划分的区间数
+PSI_BINS = 10
+
+
+class QuantileSketch:
+    """
+    单列的对数分桶分位数草图
+
+    正数 x 落入桶 ceil(log_gamma(x))，负数按绝对值落入负数桶，gamma = (1 + a) / (1 - a)。
+    桶数超过 max_buckets 时合并绝对值最小的桶，只影响接近 0 的分位数。
+    """
+
+    def __init__(self, relative_accuracy: float = SKETCH_RELATIVE_ACCURACY,
+                 max_buckets: int = SKETCH_MAX_BUCKETS):
+        self.relative_accuracy = relative_accuracy
+        self.max_buckets = max_buckets
+        self.gamma = (1 + relative_accuracy) / (1 - relative_accuracy)
+        self._log_gamma = math.log(self.gamma)
+        self.positive: Dict[int, int] = {}
+        self.negative: Dict[int, int] = {}
+        self.zero_count = 0
+        self.count = 0
+        self.min: Optional[float] = None
+        self.max: Optional[float] = None
+
+    def _add(self, store: Dict[int, int], keys: np.ndarray) -> None:
+        if keys.size == 0:
+            return
+        # 桶号范围很小（数千以内），bincount 比排序去重快
+        low = int(keys.min())
+        counts = np.bincount(keys - low)
+        present = np.flatnonzero(counts)
+        for key, count in zip((present + low).tolist(), counts[present].tolist()):
+            store[key] = store.get(key, 0) + count
+        self._collapse(store)
+
+    def _collapse(self, store: Dict[int, int]) -> None:
+        if len(store) <= self.max_buckets:
+            return
+        keys = sorted(store)
+        excess = keys[:len(keys) - self.max_buckets + 1]
+        store[excess[-1]] = sum(store.pop(key) for key in excess[:-1]) + store[excess[-1]]
+
+    def update(self, values: np.ndarray) -> "QuantileSketch":
+        """加入一批数值（只统计有限值）"""
+        values = np.asarray(values, dtype=np.float64)
+        finite = np.isfinite(values)
+        if not finite.all():
+            values = values[finite]
+        if values.size == 0:
+            return self
+
+        self.count += values.size
+        vmin, vmax = float(values.min()), float(values.max())
+        self.min = vmin if self.min is None else min(self.min, vmin)
+        self.max = vmax if self.max is None else max(self.max, vmax)
+
+        magnitude = np.abs(values)
+        indexable = magnitude >= SKETCH_MIN_INDEXABLE
+        self.zero_count += int(values.size - np.count_nonzero(indexable))
+        if not indexable.all():
+            values, magnitude = values[indexable], magnitude[indexable]
+        negative = values < 0
+
+        # 原地计算桶号，避免每一步都分配新数组
+        np.log(magnitude, out=magnitude)
+        magnitude *= 1 / self._log_gamma
+        np.ceil(magnitude, out=magnitude)
+        keys = magnitude.astype(np.int64)
+        if negative.any():
+            self._add(self.positive, keys[~negative])
+            self._add(self.negative, keys[negative])
+        else:
+            self._add(self.positive, keys)
+        return self
+
+    def merge(self, other: "QuantileSketch") -> "QuantileSketch":
+        """把 other 合并进当前草图（要求 relative_accuracy 相同）"""
+        if other.gamma != self.gamma:
+            raise ValueError("草图精度不同，无法合并")
+        if other.count == 0:
+            return self
+        for store, other_store in ((self.positive, other.positive), (self.negative, other.negative)):
+            for key, count in other_store.items():
+                store[key] = store.get(key, 0) + count
+            self._collapse(store)
+        self.zero_count += other.zero_count
+        self.count += other.count
+        self.min = other.min if self.min is None else min(self.min, other.min)
+        self.max = other.max if self.max is None else max(self.max, other.max)
+        return self
+
+    def buckets(self) -> tuple:
+        """
+        按数值升序的分桶
+
+        Returns:
+            (代表值数组, 计数数组)
+        """
+        neg_keys = sorted(self.negative, reverse=True)
+        pos_keys = sorted(self.positive)
+        values = (
+            [-self._bucket_value(k) for k in neg_keys]
+            + ([0.0] if self.zero_count else [])
+            + [self._bucket_value(k) for k in pos_keys]
+        )
+        counts = (
+            [self.negative[k] for k in neg_keys]
+            + ([self.zero_count] if self.zero_count else [])
+            + [self.positive[k] for k in pos_keys]
+        )
+        return np.array(values, dtype=np.float64), np.array(counts, dtype=np.int64)
+
+    def _bucket_value(self, key: int) -> float:
+        # 桶 (gamma^(k-1), gamma^k] 内相对误差最小的代表值
+        return 2 * self.gamma ** key / (self.gamma + 1)
+
+    def quantiles(self, qs: Sequence[float]) -> List[Optional[float]]:
+        """
+        分位数（结果限制在 [min, max] 内）
+
+        Args:
+            qs: 分位点列表，取值 [0, 1]
+
+        Returns:
+            分位数列表，草图为空时为 None
+        """
+        if self.count == 0:
+            return [None for _ in qs]
+        values, counts = self.buckets()
+        cumulative = np.cumsum(counts)
+        ranks = np.asarray(qs, dtype=np.float64) * (self.count - 1)
+        positions = np.searchsorted(cumulative, ranks, side="right")
+        result = values[np.minimum(positions, len(values) - 1)]
+        return np.clip(result, self.min, self.max).tolist()
+
+    def quantile(self, q: float) -> Optional[float]:
+        return self.quantiles([q])[0]
+
+    def histogram(self, edges: Sequence[float]) -> np.ndarray:
+        """
+        按给定边界统计直方图（每个桶的计数归入其代表值所在的区间）
+
+        Args:
+            edges: 单调递增的区间边界
+
+        Returns:
+            各区间计数
+        """
+        values, counts = self.buckets()
+        hist, _ = np.histogram(values, bins=np.asarray(edges, dtype=np.float64), weights=counts)
+        return hist.astype(np.int64)
+
+    def to_dict(self) -> Dict:
+        return {
+            "relative_accuracy": self.relative_accuracy,
+            "max_buckets": self.max_buckets,
+            "count": self.count,
+            "zero_count": self.zero_count,
+            "min": self.min,
+            "max": self.max,
+            "positive": {str(k): v for k, v in self.positive.items()},
+            "negative": {str(k): v for k, v in self.negative.items()},
+        }
+
+    @classmethod
+    def from_dict(cls, data: Dict) -> "QuantileSketch":
+        sketch = cls(data["relative_accuracy"], data["max_buckets"])
+        sketch.count = data["count"]
+        sketch.zero_count = data["zero_count"]
+        sketch.min = data["min"]
+        sketch.max = data["max"]
+        sketch.positive = {int(k): v for k, v in data["positive"].items()}
+        sketch.negative = {int(k): v for k, v in data["negative"].items()}
+        return sketch
+
+
+def update_sketches(
+    sketches: Dict[str, QuantileSketch],
+    df: pl.DataFrame,
+    columns: List[str]
+) -> Dict[str, QuantileSketch]:
+    """用一批数据更新各列草图（缺少的草图自动创建）"""
+    for col in columns:
+        # 空值转为 NaN，由 update 过滤
+        values = df[col].to_numpy()
+        sketches.setdefault(col, QuantileSketch()).update(values)
+    return sketches
+
+
+def merge_sketches(
+    target: Dict[str, QuantileSketch],
+    other: Dict[str, QuantileSketch]
+) -> Dict[str, QuantileSketch]:
+    """按列合并草图"""
+    for col, sketch in other.items():
+        if col in target:
+            target[col].merge(sketch)
+        else:
+            target[col] = QuantileSketch.from_dict(sketch.to_dict())
+    return target
+
+
+def save_sketches(path: Path, sketches: Dict[str, QuantileSketch], source: Optional[str] = None) -> Path:
+    """
+    保存草图（JSON）
+
+    Args:
+        path: 输出路径
+        sketches: 列名 -> 草图
+        source: 数据来源（文件名），仅记录
+
+    Returns:
+        输出路径
+    """
+    path = Path(path)
+    tmp_path = path.with_name(path.name + ".tmp")
+    with open(tmp_path, "w") as f:
+        json.dump({"source": source, "columns": {col: s.to_dict() for col, s in sketches.items()}}, f)
+    tmp_path.replace(path)
+    return path
+
+
+def load_sketches(path: Path) -> Dict[str, QuantileSketch]:
+    """读取 save_sketches 保存的草图"""
+    with open(path) as f:
+        data = json.load(f)
+    return {col: QuantileSketch.from_dict(s) for col, s in data["columns"].items()}
+
+
+def population_stability_index(
+    baseline: QuantileSketch,
+    current: QuantileSketch,
+    bins: int = PSI_BINS
+) -> Optional[float]:
+    """
+    两个草图之间的 PSI
+
+    原始分桶有数千个，逐桶比较主要反映抽样噪声；这里按基准的 bins 等分位点划分区间，
+    两边用 histogram 统计各区间计数（空区间用 0.5 个计数平滑）。
+
+    一般认为 < 0.1 稳定，0.1-0.25 轻微漂移，> 0.25 明显漂移。
+
+    Args:
+        baseline: 基准草图
+        current: 当前草图
+        bins: 区间数（基准分位点重合时区间会更少）
+
+    Returns:
+        PSI，任一草图为空时为 None
+    """
+    if baseline.count == 0 or current.count == 0:
+        return None
+    if baseline.gamma != current.gamma:
+        raise ValueError("草图精度不同，无法比较")
+
+    inner = np.unique(baseline.quantiles(np.linspace(0, 1, bins + 1)[1:-1]))
+    edges = np.concatenate([[-np.inf], inner, [np.inf]])
+    p = baseline.histogram(edges).astype(np.float64) + 0.5
+    q = current.histogram(edges).astype(np.float64) + 0.5
+    p /= p.sum()
+    q /= q.sum()
+    return float(np.sum((q - p) * np.log(q / p)))
+
+
+def compare_sketches(
+    baseline: Dict[str, QuantileSketch],
+    current: Dict[str, QuantileSketch],
+    qs: Sequence[float] = (0.01, 0.5, 0.99)
+) -> Dict[str, Dict]:
+    """
+    比较两组草图的分布漂移
+
+    Args:
+        baseline: 基准草图（例如上个月）
+        current: 当前草图
+        qs: 比较的分位点
+
+    Returns:
+        {列名: {"psi": PSI, "baseline": 基准分位数, "current": 当前分位数}}，只包含两边都有的列
+    """
+    return {
+        col: {
+            "psi": population_stability_index(baseline[col], current[col]),
+            "baseline": baseline[col].quantiles(qs),
+            "current": current[col].quantiles(qs),
+        }
+        for col in current if col in baseline
+    }
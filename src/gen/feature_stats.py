@@ -0,0 +1,311 @@
+"""
+因子统计量模块
+计算因子时顺带维护可合并的 Welford 累加器（count / mean / M2 / min / max），训练归一化不需要再次全量读取输出
+
+累加器按自然日记录：
+- 每个批次把统计量写入 FEATURES_OUTPUT_DIR/_stats/<批次名>.json（各进程写各自的文件，无需加锁）
+- write_feature_stats 合并所有批次文件，写出 FEATURES_OUTPUT_DIR/feature_stats.json；
+  批次按自然日对齐，同一天出现在多个批次文件中时（换了批次边界或输出策略后重跑）只取最新写出的文件，不重复计数；
+  新旧以批次文件内记录的写出时间为准（复制、恢复文件不影响），被覆盖的天从旧文件中删除
+- 任意日期范围（例如 split_features 的训练/验证/测试段）合并对应日期的累加器即得到归一化参数
+"""
+
+import json
+import math
+import time
+import logging
+from datetime import date, datetime
+from pathlib import Path
+from typing import Dict, Iterable, List, Optional, Tuple, Union
+
+import polars as pl
+
+from config import (
+    ALL_FEATURES,
+    FEATURES_OUTPUT_DIR,
+    FEATURES_TIME_COLUMN,
+    FEATURE_STATS_FILENAME,
+    FEATURE_STATS_FRAGMENT_DIR
+)
+
+logger = logging.getLogger(__name__)
+
+
+class RunningStats:
+    """
+    单列的 Welford 累加器
+
+    两个累加器按 Chan 等人的并行公式合并，合并顺序不影响结果（浮点误差除外）。
+    只统计有限值，NaN 和 inf 不计入。
+    """
+
+    __slots__ = ("count", "mean", "m2", "min", "max")
+
+    def __init__(self, count: int = 0, mean: float = 0.0, m2: float = 0.0,
+                 min: Optional[float] = None, max: Optional[float] = None):
+        self.count = count
+        self.mean = mean
+        self.m2 = m2
+        self.min = min
+        self.max = max
+
+    def merge(self, other: "RunningStats") -> "RunningStats":
+        """把 other 合并进当前累加器"""
+        if other.count == 0:
+            return self
+        if self.count == 0:
+            self.count, self.mean, self.m2 = other.count, other.mean, other.m2
+            self.min, self.max = other.min, other.max
+            return self
+
+        count = self.count + other.count
+        delta = other.mean - self.mean
+        self.mean += delta * other.count / count
+        self.m2 += other.m2 + delta * delta * self.count * other.count / count
+        self.count = count
+        self.min = min(self.min, other.min)
+        self.max = max(self.max, other.max)
+        return self
+
+    @property
+    def std(self) -> Optional[float]:
+        """样本标准差（ddof=1，与 polars 的 std 一致）"""
+        if self.count < 2:
+            return None
+        return math.sqrt(self.m2 / (self.count - 1))
+
+    def to_dict(self) -> Dict:
+        return {"count": self.count, "mean": self.mean, "m2": self.m2, "min": self.min, "max": self.max}
+
+    @classmethod
+    def from_dict(cls, data: Dict) -> "RunningStats":
+        return cls(data["count"], data["mean"], data["m2"], data["min"], data["max"])
+
+
+def finite_values(column: str) -> pl.Expr:
+    """列的有限值，NaN 和 inf 置为 null（聚合时被忽略）"""
+    values = pl.col(column).cast(pl.Float64)
+    return pl.when(values.is_finite()).then(values)
+
+
+def running_stats_exprs(column: str, prefix: str, finite: bool = False) -> List[pl.Expr]:
+    """
+    计算单列累加器的聚合表达式（只统计有限值），可放进 select 或 group_by().agg
+
+    Args:
+        column: 列名
+        prefix: 输出列名前缀，结果列为 <prefix>_count / _mean / _m2 / _min / _max
+        finite: 列已经只含有限值和 null（例如由 finite_values 生成）时为 True，省去逐个聚合的过滤
+
+    Returns:
+        聚合表达式列表
+    """
+    finite = pl.col(column) if finite else finite_values(column)
+    return [
+        finite.count().alias(f"{prefix}_count"),
+        finite.mean().alias(f"{prefix}_mean"),
+        (finite.var(ddof=0) * finite.count()).alias(f"{prefix}_m2"),
+        finite.min().alias(f"{prefix}_min"),
+        finite.max().alias(f"{prefix}_max"),
+    ]
+
+
+def running_stats_from_row(row: Dict, prefix: str) -> RunningStats:
+    """由 running_stats_exprs 的聚合结果构造累加器"""
+    return RunningStats(row[f"{prefix}_count"], row[f"{prefix}_mean"] or 0.0, row[f"{prefix}_m2"] or 0.0,
+                        row[f"{prefix}_min"], row[f"{prefix}_max"])
+
+
+def compute_daily_stats(
+    df: pl.DataFrame,
+    columns: Optional[List[str]] = None,
+    time_column: str = FEATURES_TIME_COLUMN
+) -> Dict[str, Dict[str, RunningStats]]:
+    """
+    按自然日计算每个因子的累加器（一次 group_by 聚合）
+
+    Args:
+        df: 因子数据
+        columns: 统计的列，默认 ALL_FEATURES 中存在的列
+        time_column: 时间列
+
+    Returns:
+        {日期 'YYYY-MM-DD': {列名: RunningStats}}
+    """
+    columns = [c for c in (columns or ALL_FEATURES) if c in df.columns]
+    if df.is_empty() or not columns:
+        return {}
+
+    aggs = [expr for i, col in enumerate(columns) for expr in running_stats_exprs(col, str(i))]
+    daily = df.group_by(pl.col(time_column).dt.date().alias("_date")).agg(aggs).sort("_date")
+
+    stats = {}
+    for row in daily.iter_rows(named=True):
+        stats[row["_date"].isoformat()] = {
+            col: running_stats_from_row(row, str(i)) for i, col in enumerate(columns)
+        }
+    return stats
+
+
+def merge_daily_stats(
+    daily_stats: Iterable[Dict[str, Dict[str, RunningStats]]]
+) -> Dict[str, Dict[str, RunningStats]]:
+    """合并多个按日累加器（同一天出现多次时累加，用于同一次运行中互不重叠的数据）"""
+    merged = {}
+    for stats in daily_stats:
+        for day, columns in stats.items():
+            target = merged.setdefault(day, {})
+            for col, acc in columns.items():
+                target.setdefault(col, RunningStats()).merge(acc)
+    return merged
+
+
+def summarize_stats(
+    daily_stats: Dict[str, Dict[str, RunningStats]],
+    start: Optional[Union[str, date]] = None,
+    end: Optional[Union[str, date]] = None
+) -> Dict[str, Dict]:
+    """
+    合并 [start, end] 内各日的累加器，得到归一化参数
+
+    Args:
+        daily_stats: 按日累加器
+        start: 起始日期（含），默认不限
+        end: 结束日期（含），默认不限
+
+    Returns:
+        {列名: {count, mean, std, min, max}}
+    """
+    start = start.isoformat() if isinstance(start, date) else start
+    end = end.isoformat() if isinstance(end, date) else end
+
+    totals = {}
+    for day, columns in daily_stats.items():
+        if (start and day < start) or (end and day > end):
+            continue
+        for col, acc in columns.items():
+            totals.setdefault(col, RunningStats()).merge(acc)
+
+    return {
+        col: {"count": acc.count, "mean": acc.mean if acc.count else None, "std": acc.std,
+              "min": acc.min, "max": acc.max}
+        for col, acc in totals.items()
+    }
+
+
+def _dump(daily_stats: Dict[str, Dict[str, RunningStats]]) -> Dict:
+    return {day: {col: acc.to_dict() for col, acc in columns.items()} for day, columns in daily_stats.items()}
+
+
+def _load(data: Dict) -> Dict[str, Dict[str, RunningStats]]:
+    return {day: {col: RunningStats.from_dict(acc) for col, acc in columns.items()} for day, columns in data.items()}
+
+
+def _write_json(path: Path, data: Dict) -> None:
+    """原子写出 JSON"""
+    path.parent.mkdir(parents=True, exist_ok=True)
+    tmp_path = path.with_name(path.name + ".tmp")
+    with open(tmp_path, "w") as f:
+        json.dump(data, f, indent=2, sort_keys=True)
+    tmp_path.replace(path)
+
+
+def save_batch_stats(
+    daily_stats: Dict[str, Dict[str, RunningStats]],
+    name: str,
+    root: Path = FEATURES_OUTPUT_DIR
+) -> Path:
+    """
+    保存一个批次的累加器（重跑同一批次时覆盖）
+
+    Args:
+        daily_stats: 按日累加器
+        name: 批次名（通常为输出文件名去掉后缀）
+        root: 输出目录
+
+    Returns:
+        批次统计文件路径
+    """
+    path = Path(root) / FEATURE_STATS_FRAGMENT_DIR / f"{name}.json"
+    _write_json(path, {"written": time.time_ns(), "days": _dump(daily_stats)})
+    return path
+
+
+def _read_fragment(path: Path) -> Tuple[int, Dict]:
+    """
+    读取批次统计文件
+
+    Returns:
+        (写出时间（纳秒）, 按日累加器 JSON)；旧格式的文件没有记录写出时间，用修改时间代替
+    """
+    with open(path) as f:
+        data = json.load(f)
+    if "days" in data:
+        return data["written"], data["days"]
+    return path.stat().st_mtime_ns, data
+
+
+def load_daily_stats(root: Path = FEATURES_OUTPUT_DIR) -> Dict[str, Dict[str, RunningStats]]:
+    """
+    读取 feature_stats.json 中的按日累加器
+
+    Args:
+        root: 输出目录，或 feature_stats.json 文件路径
+
+    Returns:
+        按日累加器，文件不存在时为空
+    """
+    path = Path(root)
+    if path.is_dir():
+        path = path / FEATURE_STATS_FILENAME
+    if not path.exists():
+        return {}
+    with open(path) as f:
+        return _load(json.load(f)["days"])
+
+
+def write_feature_stats(root: Path = FEATURES_OUTPUT_DIR) -> Optional[Path]:
+    """
+    合并所有批次统计文件，写出 feature_stats.json
+
+    每一天的累加器只取自覆盖该天的最新（文件内记录的写出时间最晚）的批次文件：旧批次与新批次覆盖同一天时是同一份数据，
+    累加会重复计数。被覆盖的天从旧文件中删除，全部被覆盖的旧文件直接删除，之后的合并不再读取。
+    文件包含按日累加器 days（供任意日期范围合并）和全部数据的归一化参数 total。
+
+    Args:
+        root: 输出目录
+
+    Returns:
+        feature_stats.json 路径，没有批次统计时为 None
+    """
+    root = Path(root)
+    fragments = [(path, *_read_fragment(path)) for path in (root / FEATURE_STATS_FRAGMENT_DIR).glob("*.json")]
+    if not fragments:
+        return None
+
+    # 从新到旧读取，每一天只取第一次出现（最新）的累加器
+    fragments.sort(key=lambda item: (item[1], item[0].name), reverse=True)
+    daily_stats = {}
+    replaced = set()
+    removed = 0
+    for path, written, days in fragments:
+        current = {day: columns for day, columns in days.items() if day not in daily_stats}
+        replaced.update(days.keys() - current.keys())
+        if not current:
+            path.unlink()
+            removed += 1
+            continue
+        if len(current) < len(days):
+            _write_json(path, {"written": written, "days": current})
+        daily_stats.update(_load(current))
+    daily_stats = dict(sorted(daily_stats.items()))
+    if replaced:
+        logger.info(f"{len(replaced)} 天出现在多个批次统计文件中，使用最新的文件，删除 {removed} 个被完全覆盖的旧文件")
+    path = root / FEATURE_STATS_FILENAME
+    _write_json(path, {
+        "updated": datetime.now().isoformat(timespec="seconds"),
+        "days": _dump(daily_stats),
+        "total": summarize_stats(daily_stats),
+    })
+    logger.info(f"合并 {len(fragments) - removed} 个批次的因子统计量 ({len(daily_stats)} 天): {path}")
+    return path
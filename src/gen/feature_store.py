@@ -0,0 +1,442 @@
+"""
+因子输出读写模块
+把单文件、按月文件、Hive 分区和 split_features 的分段输出当作同一个数据集按时间范围读取
+
+每个输出目录下维护一个清单文件（config.FEATURES_MANIFEST_FILENAME），记录每个文件的
+最早/最晚时间、行数和交易对。读取时只打开与查询范围重叠的文件，只投影需要的列，
+返回按文件拼接的 LazyFrame。清单按文件大小和修改时间增量刷新，新文件只扫描一次时间列。
+
+分区输出按 symbol=XXX/year=YYYY/month=MM 组织，每个分区目录整体替换：
+新数据先写到同级临时目录，再与旧目录交换，重跑不会留下半写的分区。
+"""
+
+import json
+import shutil
+import uuid
+import logging
+from datetime import datetime
+from pathlib import Path
+from typing import Dict, List, Optional, Union
+
+import polars as pl
+
+from config import (
+    SYMBOL,
+    FEATURES_OUTPUT_DIR,
+    FEATURES_ROW_GROUP_SIZE,
+    FEATURES_PART_MAX_ROWS,
+    FEATURES_PARTITION_COMPRESSION,
+    FEATURES_TIME_COLUMN,
+    FEATURES_TIME_COLUMN_ALIASES,
+    FEATURES_MANIFEST_FILENAME,
+    OUTPUT_METADATA_SUFFIX,
+    get_output_metadata
+)
+
+logger = logging.getLogger(__name__)
+
+# 可读取的输出文件后缀
+FEATURE_FILE_SUFFIXES = {".feather", ".ipc", ".arrow", ".parquet"}
+
+
+def scan_feature_file(path: Path) -> pl.LazyFrame:
+    """按后缀懒加载一个输出文件"""
+    if path.suffix == ".parquet":
+        return pl.scan_parquet(path)
+    if path.suffix == ".csv":
+        return pl.scan_csv(path, try_parse_dates=True)
+    return pl.scan_ipc(path)
+
+
+def _time_column(schema: pl.Schema) -> Optional[str]:
+    for name in [FEATURES_TIME_COLUMN] + FEATURES_TIME_COLUMN_ALIASES:
+        if name in schema:
+            return name
+    return None
+
+
+def _path_symbol(path: Path) -> Optional[str]:
+    """Hive 分区路径中的 symbol=XXX"""
+    for part in path.parts:
+        if part.startswith("symbol="):
+            return part[len("symbol="):]
+    return None
+
+
+def _to_datetime(value: Union[str, datetime]) -> datetime:
+    if isinstance(value, datetime):
+        return value
+    for fmt in ("%Y-%m-%d %H:%M:%S", "%Y-%m-%d", "%Y%m%d"):
+        try:
+            return datetime.strptime(value, fmt)
+        except ValueError:
+            continue
+    raise ValueError(f"无法解析时间: {value}")
+
+
+def describe_feature_file(path: Path) -> Optional[Dict]:
+    """
+    扫描一个输出文件的时间列，得到清单条目
+
+    Args:
+        path: 输出文件路径
+
+    Returns:
+        清单条目；没有时间列的文件返回 None
+    """
+    lf = scan_feature_file(path)
+    schema = lf.collect_schema()
+    time_column = _time_column(schema)
+    if time_column is None:
+        logger.warning(f"跳过没有时间列的文件: {path}")
+        return None
+
+    time_expr = pl.col(time_column)
+    if schema[time_column] == pl.Utf8:
+        time_expr = time_expr.str.strptime(pl.Datetime, "%Y-%m-%d %H:%M:%S")
+    stats = lf.select(
+        time_expr.min().alias("min"),
+        time_expr.max().alias("max"),
+        pl.len().alias("rows")
+    ).collect().row(0, named=True)
+
+    symbol = _path_symbol(path)
+    if symbol is not None:
+        symbols = [symbol]
+    elif "symbol" in schema:
+        symbols = lf.select(pl.col("symbol").unique()).collect().to_series().to_list()
+    else:
+        symbols = [SYMBOL]
+
+    stat = path.stat()
+    return {
+        "size": stat.st_size,
+        "mtime_ns": stat.st_mtime_ns,
+        "time_column": time_column,
+        "min": stats["min"].isoformat() if stats["min"] is not None else None,
+        "max": stats["max"].isoformat() if stats["max"] is not None else None,
+        "rows": stats["rows"],
+        "symbols": symbols
+    }
+
+
+def get_metadata_path(path: Path) -> Path:
+    """IPC / CSV 输出的元数据旁路文件路径"""
+    path = Path(path)
+    return path.with_name(path.stem + OUTPUT_METADATA_SUFFIX)
+
+
+def write_feature_file(df: pl.DataFrame, path: Path, metadata: Optional[Dict[str, str]] = None) -> None:
+    """
+    按后缀写出因子输出文件，并记录键值元数据
+
+    Parquet 的元数据写入文件本身；polars 的 IPC / CSV 写出不支持元数据，写入旁路文件 <stem>_meta.json。
+
+    Args:
+        df: 因子数据
+        path: 输出路径（.parquet / .csv，其余按 IPC 写出）
+        metadata: 键值元数据，默认 get_output_metadata()
+    """
+    path = Path(path)
+    metadata = get_output_metadata() if metadata is None else metadata
+    if path.suffix == ".parquet":
+        df.write_parquet(path, metadata=metadata)
+        return
+    if path.suffix == ".csv":
+        df.write_csv(path)
+    else:
+        df.write_ipc(path)
+    save_output_metadata(path, metadata)
+
+
+def save_output_metadata(path: Path, metadata: Dict[str, str]) -> Optional[Path]:
+    """
+    原子写出 IPC / CSV 输出的元数据旁路文件
+
+    Args:
+        path: 输出文件路径
+        metadata: 键值元数据，为空时不写
+
+    Returns:
+        旁路文件路径，没有元数据时为 None
+    """
+    if not metadata:
+        return None
+    meta_path = get_metadata_path(path)
+    tmp_path = meta_path.with_name(meta_path.name + ".tmp")
+    with open(tmp_path, "w") as f:
+        json.dump(metadata, f, indent=2, sort_keys=True)
+    tmp_path.replace(meta_path)
+    return meta_path
+
+
+def read_output_metadata(path: Path) -> Dict[str, str]:
+    """
+    读取输出文件记录的键值元数据
+
+    Args:
+        path: 输出文件，或 Hive 分区目录（读取其中第一个 Parquet 文件）
+
+    Returns:
+        键值元数据（不含 Arrow 内部的 schema 条目），没有记录时为空
+    """
+    path = Path(path)
+    if path.is_dir():
+        parts = sorted(path.rglob("*.parquet"))
+        if not parts:
+            return {}
+        path = parts[0]
+    if path.suffix == ".parquet":
+        return {k: v for k, v in pl.read_parquet_metadata(path).items() if not k.startswith("ARROW:")}
+    meta_path = get_metadata_path(path)
+    if not meta_path.exists():
+        return {}
+    with open(meta_path) as f:
+        return json.load(f)
+
+
+def read_lag_spec(path: Path) -> Dict[str, int]:
+    """输出文件记录的滞后需求（因子列 -> 最大滞后阶数），没有记录时为空"""
+    return json.loads(read_output_metadata(path).get("lag_spec", "{}"))
+
+
+def load_manifest(root: Path) -> Dict[str, Dict]:
+    """读取输出目录的清单，键为相对路径"""
+    try:
+        with open(root / FEATURES_MANIFEST_FILENAME) as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+
+def save_manifest(root: Path, manifest: Dict[str, Dict]) -> None:
+    """原子写出清单"""
+    manifest_path = root / FEATURES_MANIFEST_FILENAME
+    tmp_path = manifest_path.with_name(manifest_path.name + ".tmp")
+    with open(tmp_path, "w") as f:
+        json.dump(manifest, f, indent=2, sort_keys=True)
+    tmp_path.replace(manifest_path)
+
+
+def refresh_manifest(root: Path) -> Dict[str, Dict]:
+    """
+    增量刷新输出目录的清单
+
+    大小和修改时间都未变的文件沿用已有条目，新文件和变化的文件重新扫描时间列，
+    已删除的文件从清单移除。
+
+    Args:
+        root: 输出目录
+
+    Returns:
+        刷新后的清单
+    """
+    root = Path(root)
+    if not root.is_dir():
+        return {}
+
+    manifest = load_manifest(root)
+    refreshed = {}
+    changed = False
+    for path in sorted(root.rglob("*")):
+        if (path.suffix not in FEATURE_FILE_SUFFIXES or not path.is_file()
+                or any(part.startswith((".", "_")) for part in path.relative_to(root).parts)):
+            continue
+        key = path.relative_to(root).as_posix()
+        entry = manifest.get(key)
+        stat = path.stat()
+        if entry is None or entry["size"] != stat.st_size or entry["mtime_ns"] != stat.st_mtime_ns:
+            try:
+                entry = describe_feature_file(path)
+            except Exception as e:
+                logger.warning(f"无法读取输出文件 {path}: {str(e)}")
+                entry = None
+            changed = True
+        if entry is not None:
+            refreshed[key] = entry
+
+    if changed or refreshed.keys() != manifest.keys():
+        save_manifest(root, refreshed)
+    return refreshed
+
+
+def read_features(
+    start: Optional[Union[str, datetime]] = None,
+    end: Optional[Union[str, datetime]] = None,
+    columns: Optional[List[str]] = None,
+    symbols: Optional[List[str]] = None,
+    roots: Optional[List[Path]] = None
+) -> pl.LazyFrame:
+    """
+    按时间范围读取因子输出
+
+    文件按最早时间排序后依次拼接；与已拼接部分重叠的行（同一时间段有多个输出文件时）
+    只保留先出现的一份，完全被覆盖的文件不会被打开。
+
+    Args:
+        start: 起始时间（含），'YYYY-MM-DD' 或 datetime，默认不限
+        end: 结束时间（不含），默认不限
+        columns: 需要的因子列，时间列总会包含，默认全部列
+        symbols: 交易对列表，默认全部；指定时结果包含 symbol 列
+        roots: 输出目录列表，默认 [FEATURES_OUTPUT_DIR]
+
+    Returns:
+        按交易对、时间排序的 LazyFrame，时间列统一为 FEATURES_TIME_COLUMN
+    """
+    start_dt = _to_datetime(start) if start is not None else None
+    end_dt = _to_datetime(end) if end is not None else None
+    wanted_symbols = set(symbols) if symbols is not None else None
+
+    candidates = []
+    for root in roots or [FEATURES_OUTPUT_DIR]:
+        root = Path(root)
+        for key, entry in refresh_manifest(root).items():
+            if entry["min"] is None:
+                continue
+            file_min = datetime.fromisoformat(entry["min"])
+            file_max = datetime.fromisoformat(entry["max"])
+            if start_dt is not None and file_max < start_dt or end_dt is not None and file_min >= end_dt:
+                continue
+            for symbol in entry["symbols"]:
+                if wanted_symbols is None or symbol in wanted_symbols:
+                    candidates.append((symbol, file_min, file_max, root / key, entry))
+
+    # 同一交易对内按最早时间排序，跳过已被覆盖的部分
+    candidates.sort(key=lambda c: (c[0], c[1], -c[2].timestamp()))
+    frames = []
+    covered = {}
+    for symbol, file_min, file_max, path, entry in candidates:
+        covered_until = covered.get(symbol)
+        if covered_until is not None and file_max <= covered_until:
+            continue
+
+        time_column = entry["time_column"]
+        lf = scan_feature_file(path)
+        schema = lf.collect_schema()
+        if schema[time_column] == pl.Utf8:
+            lf = lf.with_columns(pl.col(time_column).str.strptime(pl.Datetime, "%Y-%m-%d %H:%M:%S"))
+
+        predicates = []
+        if start_dt is not None:
+            predicates.append(pl.col(time_column) >= start_dt)
+        if end_dt is not None:
+            predicates.append(pl.col(time_column) < end_dt)
+        if covered_until is not None and file_min <= covered_until:
+            predicates.append(pl.col(time_column) > covered_until)
+        if "symbol" in schema and len(entry["symbols"]) > 1:
+            predicates.append(pl.col("symbol") == symbol)
+        if predicates:
+            lf = lf.filter(pl.all_horizontal(predicates))
+
+        if time_column != FEATURES_TIME_COLUMN:
+            lf = lf.rename({time_column: FEATURES_TIME_COLUMN})
+        if "symbol" not in schema and (wanted_symbols is not None or columns is not None and "symbol" in columns):
+            lf = lf.with_columns(pl.lit(symbol).alias("symbol"))
+        if columns is not None:
+            selected = [FEATURES_TIME_COLUMN] + [c for c in columns if c != FEATURES_TIME_COLUMN]
+            if wanted_symbols is not None and "symbol" not in selected:
+                selected.append("symbol")
+            lf = lf.select(selected)
+
+        frames.append(lf)
+        covered[symbol] = max(file_max, covered_until) if covered_until is not None else file_max
+
+    logger.info(f"读取 {len(frames)} 个输出文件（共 {len(candidates)} 个与查询范围重叠）")
+    if not frames:
+        return pl.LazyFrame()
+    return pl.concat(frames, how="diagonal_relaxed")
+
+
+def get_partition_dir(root: Path, symbol: str, year: int, month: int) -> Path:
+    """分区目录 root/symbol=XXX/year=YYYY/month=MM"""
+    return Path(root) / f"symbol={symbol}" / f"year={year}" / f"month={month:02d}"
+
+
+def replace_partition(partition_dir: Path, df: pl.DataFrame) -> int:
+    """
+    用 df 替换分区中同一时间范围的数据
+
+    分区中早于或晚于 df 时间范围的已有行会保留（分批写入同一个月时不会互相覆盖），
+    合并排序后写入临时目录，再整体替换原分区目录。
+
+    Args:
+        partition_dir: 分区目录
+        df: 属于该分区的因子数据，按时间排序
+
+    Returns:
+        分区写入后的行数
+    """
+    first, last = df[FEATURES_TIME_COLUMN][0], df[FEATURES_TIME_COLUMN][-1]
+    if partition_dir.is_dir() and any(partition_dir.glob("*.parquet")):
+        kept = pl.scan_parquet(partition_dir / "*.parquet", hive_partitioning=False).filter(
+            (pl.col(FEATURES_TIME_COLUMN) < first) | (pl.col(FEATURES_TIME_COLUMN) > last)
+        ).collect()
+        if not kept.is_empty():
+            df = pl.concat([kept, df], how="diagonal_relaxed").sort(FEATURES_TIME_COLUMN)
+
+    token = uuid.uuid4().hex[:8]
+    tmp_dir = partition_dir.parent / f".{partition_dir.name}.tmp-{token}"
+    tmp_dir.mkdir(parents=True)
+    try:
+        for part, offset in enumerate(range(0, len(df), FEATURES_PART_MAX_ROWS)):
+            df.slice(offset, FEATURES_PART_MAX_ROWS).write_parquet(
+                tmp_dir / f"part-{part:05d}.parquet",
+                compression=FEATURES_PARTITION_COMPRESSION,
+                row_group_size=FEATURES_ROW_GROUP_SIZE,
+                statistics=True,
+                metadata=get_output_metadata()
+            )
+
+        # 目录不能原子覆盖：先移走旧分区再换入新分区，读者最多看到分区短暂缺失，不会看到半写数据
+        old_dir = None
+        if partition_dir.exists():
+            old_dir = partition_dir.parent / f".{partition_dir.name}.old-{token}"
+            partition_dir.rename(old_dir)
+        tmp_dir.rename(partition_dir)
+        if old_dir is not None:
+            shutil.rmtree(old_dir)
+    except Exception:
+        shutil.rmtree(tmp_dir, ignore_errors=True)
+        raise
+
+    return len(df)
+
+
+def write_partitioned(
+    df: pl.DataFrame,
+    root: Path = FEATURES_OUTPUT_DIR,
+    symbol: str = SYMBOL
+) -> List[Path]:
+    """
+    按月写出 Hive 分区，数据按时间排序，带列统计信息
+
+    Args:
+        df: 因子数据，包含 FEATURES_TIME_COLUMN 列
+        root: 分区数据集根目录
+        symbol: 交易对
+
+    Returns:
+        写入的分区目录列表
+    """
+    if df.is_empty():
+        return []
+
+    df = df.sort(FEATURES_TIME_COLUMN)
+    times = df[FEATURES_TIME_COLUMN]
+    first, last = times[0], times[-1]
+
+    # 月份边界由二分查找得到，每个月一个零拷贝切片
+    written = []
+    year, month = first.year, first.month
+    while (year, month) <= (last.year, last.month):
+        next_year, next_month = (year + 1, 1) if month == 12 else (year, month + 1)
+        offset = times.search_sorted(datetime(year, month, 1), side="left")
+        end = times.search_sorted(datetime(next_year, next_month, 1), side="left")
+        if end > offset:
+            partition_dir = get_partition_dir(root, symbol, year, month)
+            rows = replace_partition(partition_dir, df.slice(offset, end - offset))
+            logger.info(f"写入分区 {partition_dir.relative_to(root)}: {rows} 行")
+            written.append(partition_dir)
+        year, month = next_year, next_month
+
+    return written
@@ -0,0 +1,343 @@
+"""
+时间缺口索引模块
+按相邻时间点的间隔向量化检测缺失的分钟，得到紧凑的缺口索引（缺口前最后一个时间点、缺口后第一个时间点、缺失点数）
+
+- 缺口索引只随缺口数增长，与行数无关；判断一个时间窗口是否跨越缺口只需一次 searchsorted（O(log 缺口数)）
+- 多个索引按覆盖的时间段取并集合并，批次之间重叠（例如预热数据）或相接处的缺口都能正确处理
+- 每个批次把合并输入和因子输出的索引写入 FEATURES_OUTPUT_DIR/_gaps/<批次名>.json，write_gap_index 合并为 gap_index.json；
+  覆盖范围完全落在更新的批次文件内的旧文件（换了批次边界后重跑）按文件内记录的写出时间判断，合并时删除
+"""
+
+import json
+import time
+import logging
+from datetime import datetime, timedelta
+from pathlib import Path
+from typing import Dict, Iterable, List, Optional, Tuple, Union
+
+import numpy as np
+import polars as pl
+
+from config import (
+    FEATURES_OUTPUT_DIR,
+    FEATURES_TIME_COLUMN,
+    GAP_INDEX_FILENAME,
+    GAP_INDEX_FRAGMENT_DIR,
+    TIMEFRAME,
+    TIMEFRAME_MS
+)
+
+logger = logging.getLogger(__name__)
+
+# 毫秒时间戳的起点（因子数据的时间列为不带时区的 UTC 时间）
+EPOCH = datetime(1970, 1, 1)
+
+
+def to_epoch_ms(timestamps: Union[pl.Series, np.ndarray]) -> np.ndarray:
+    """时间列或毫秒时间戳数组转为 int64 毫秒数组（忽略空值）"""
+    if isinstance(timestamps, pl.Series):
+        timestamps = timestamps.drop_nulls()
+        if timestamps.dtype.is_temporal():
+            timestamps = timestamps.dt.epoch(time_unit="ms")
+        return timestamps.to_numpy().astype(np.int64, copy=False)
+    return np.asarray(timestamps, dtype=np.int64)
+
+
+def from_epoch_ms(ms: int) -> datetime:
+    return EPOCH + timedelta(milliseconds=int(ms))
+
+
+class GapIndex:
+    """
+    一段时间序列的缺口索引
+
+    Attributes:
+        interval_ms: 相邻时间点的预期间隔
+        first / last: 覆盖的第一个和最后一个时间点（毫秒），空序列为 None
+        starts: 每个缺口前最后一个存在的时间点（毫秒，升序）
+        ends: 每个缺口后第一个存在的时间点（毫秒）
+    """
+
+    def __init__(self, interval_ms: int = TIMEFRAME_MS[TIMEFRAME], first: Optional[int] = None,
+                 last: Optional[int] = None, starts: Optional[np.ndarray] = None, ends: Optional[np.ndarray] = None):
+        self.interval_ms = int(interval_ms)
+        self.first = first
+        self.last = last
+        self.starts = np.asarray(starts if starts is not None else [], dtype=np.int64)
+        self.ends = np.asarray(ends if ends is not None else [], dtype=np.int64)
+
+    @classmethod
+    def from_timestamps(cls, timestamps: Union[pl.Series, np.ndarray],
+                        interval_ms: int = TIMEFRAME_MS[TIMEFRAME]) -> "GapIndex":
+        """
+        由时间戳检测缺口（一次 diff，无序时先排序）
+
+        Args:
+            timestamps: 时间列（Datetime）或毫秒时间戳数组，允许重复
+            interval_ms: 相邻时间点的预期间隔
+
+        Returns:
+            缺口索引
+        """
+        ms = to_epoch_ms(timestamps)
+        if ms.size == 0:
+            return cls(interval_ms)
+        diffs = np.diff(ms)
+        if (diffs < 0).any():
+            ms = np.sort(ms)
+            diffs = np.diff(ms)
+        positions = np.flatnonzero(diffs > interval_ms)
+        return cls(interval_ms, int(ms[0]), int(ms[-1]), ms[positions], ms[positions + 1])
+
+    @classmethod
+    def from_frame(cls, df: pl.DataFrame, time_column: str = FEATURES_TIME_COLUMN,
+                   interval_ms: int = TIMEFRAME_MS[TIMEFRAME]) -> "GapIndex":
+        """由数据表的时间列检测缺口"""
+        return cls.from_timestamps(df[time_column], interval_ms)
+
+    def __len__(self) -> int:
+        return len(self.starts)
+
+    @property
+    def missing(self) -> np.ndarray:
+        """每个缺口缺失的时间点数"""
+        return (self.ends - self.starts) // self.interval_ms - 1
+
+    @property
+    def total_missing(self) -> int:
+        return int(self.missing.sum())
+
+    def gaps(self) -> List[Tuple[datetime, datetime, int]]:
+        """缺口列表 (缺口前最后一个时间点, 缺口后第一个时间点, 缺失点数)"""
+        return [(from_epoch_ms(s), from_epoch_ms(e), int(m))
+                for s, e, m in zip(self.starts.tolist(), self.ends.tolist(), self.missing.tolist())]
+
+    def segments(self) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        连续覆盖的时间段
+
+        Returns:
+            (各段起点, 各段终点) 毫秒数组，含端点
+        """
+        if self.first is None:
+            return np.empty(0, dtype=np.int64), np.empty(0, dtype=np.int64)
+        return np.concatenate([[self.first], self.ends]), np.concatenate([self.starts, [self.last]])
+
+    def contains_gap(self, start_ms: Union[int, np.ndarray], end_ms: Union[int, np.ndarray]) -> np.ndarray:
+        """
+        [start_ms, end_ms] 内是否有缺失的时间点（可向量化，每个区间一次 searchsorted）
+
+        只判断缺口，不判断区间是否超出 [first, last]。
+        """
+        start_ms = np.asarray(start_ms, dtype=np.int64)
+        # 第一个缺口前时间点 >= start 的缺口；缺口前时间点 < start 时需看缺口后时间点是否 > start
+        i = np.searchsorted(self.ends, start_ms, side="right")
+        gap_starts = np.append(self.starts, np.iinfo(np.int64).max)
+        return gap_starts[i] < np.asarray(end_ms, dtype=np.int64)
+
+    def next_window_start(self, start_ms: int, window: int) -> Optional[int]:
+        """
+        start_ms 之后（含）第一个不跨越缺口、长度为 window 个时间点的窗口起点
+
+        Args:
+            start_ms: 期望的窗口起点（毫秒）
+            window: 窗口长度（时间点数）
+
+        Returns:
+            窗口起点，覆盖范围内没有这样的窗口时为 None
+        """
+        if self.first is None:
+            return None
+        span = (window - 1) * self.interval_ms
+        seg_starts, seg_ends = self.segments()
+        start_ms = max(int(start_ms), self.first)
+        # 从 start_ms 所在的段开始，找第一个剩余长度足够的段
+        i = max(int(np.searchsorted(seg_starts, start_ms, side="right")) - 1, 0)
+        for j in range(i, len(seg_starts)):
+            candidate = max(start_ms, int(seg_starts[j]))
+            if candidate + span <= seg_ends[j]:
+                return candidate
+        return None
+
+    def merge(self, other: "GapIndex") -> "GapIndex":
+        """两个索引的并集（任一索引中存在的时间点都视为存在），返回新索引"""
+        return merge_gap_indexes([self, other])
+
+    def to_dict(self) -> Dict:
+        return {
+            "interval_ms": self.interval_ms,
+            "first": self.first,
+            "last": self.last,
+            "gaps": [[s, e, m] for s, e, m in zip(self.starts.tolist(), self.ends.tolist(), self.missing.tolist())],
+        }
+
+    @classmethod
+    def from_dict(cls, data: Dict) -> "GapIndex":
+        gaps = np.asarray(data["gaps"], dtype=np.int64).reshape(-1, 3)
+        return cls(data["interval_ms"], data["first"], data["last"], gaps[:, 0], gaps[:, 1])
+
+
+def merge_gap_indexes(indexes: Iterable[GapIndex]) -> GapIndex:
+    """
+    合并多个缺口索引（按覆盖的时间段取并集，相邻段间隔不超过 interval_ms 时连为一段）
+
+    Args:
+        indexes: 缺口索引，interval_ms 必须相同
+
+    Returns:
+        合并后的索引
+    """
+    indexes = [index for index in indexes if index.first is not None]
+    if not indexes:
+        return GapIndex()
+    interval_ms = indexes[0].interval_ms
+    if any(index.interval_ms != interval_ms for index in indexes):
+        raise ValueError("缺口索引的时间间隔不同，无法合并")
+    if len(indexes) == 1:
+        index = indexes[0]
+        return GapIndex(interval_ms, index.first, index.last, index.starts.copy(), index.ends.copy())
+
+    segments = [index.segments() for index in indexes]
+    seg_starts = np.concatenate([s for s, _ in segments])
+    seg_ends = np.concatenate([e for _, e in segments])
+    order = np.argsort(seg_starts, kind="stable")
+    seg_starts, seg_ends = seg_starts[order], seg_ends[order]
+
+    # 到当前段为止覆盖的最远时间点，下一段起点超出它一个间隔以上即为缺口
+    reach = np.maximum.accumulate(seg_ends)
+    positions = np.flatnonzero(seg_starts[1:] - reach[:-1] > interval_ms)
+    return GapIndex(interval_ms, int(seg_starts[0]), int(reach[-1]), reach[positions], seg_starts[positions + 1])
+
+
+def save_gap_index(path: Path, indexes: Dict[str, GapIndex]) -> Path:
+    """
+    原子写出缺口索引（JSON）
+
+    Args:
+        path: 输出路径
+        indexes: 名称（例如 "input" / "output"）-> 缺口索引
+
+    Returns:
+        输出路径
+    """
+    return _write_json(Path(path), _dump(indexes))
+
+
+def _dump(indexes: Dict[str, GapIndex]) -> Dict:
+    return {name: index.to_dict() for name, index in indexes.items()}
+
+
+def _write_json(path: Path, data: Dict) -> Path:
+    """原子写出 JSON"""
+    path.parent.mkdir(parents=True, exist_ok=True)
+    tmp_path = path.with_name(path.name + ".tmp")
+    with open(tmp_path, "w") as f:
+        json.dump(data, f)
+    tmp_path.replace(path)
+    return path
+
+
+def load_gap_index(path: Path = FEATURES_OUTPUT_DIR) -> Dict[str, GapIndex]:
+    """
+    读取 save_gap_index 写出的缺口索引
+
+    Args:
+        path: 索引文件，或输出目录（读取其中的 gap_index.json）
+
+    Returns:
+        名称 -> 缺口索引，文件不存在时为空
+    """
+    path = Path(path)
+    if path.is_dir():
+        path = path / GAP_INDEX_FILENAME
+    if not path.exists():
+        return {}
+    with open(path) as f:
+        return {name: GapIndex.from_dict(data) for name, data in json.load(f).items()}
+
+
+def save_batch_gaps(indexes: Dict[str, GapIndex], name: str, root: Path = FEATURES_OUTPUT_DIR) -> Path:
+    """
+    保存一个批次的缺口索引（重跑同一批次时覆盖）
+
+    Args:
+        indexes: {"input": 合并输入的索引, "output": 因子输出的索引}
+        name: 批次名（通常为输出文件名去掉后缀）
+        root: 输出目录
+
+    Returns:
+        批次索引文件路径
+    """
+    path = Path(root) / GAP_INDEX_FRAGMENT_DIR / f"{name}.json"
+    return _write_json(path, {"written": time.time_ns(), "indexes": _dump(indexes)})
+
+
+def _read_fragment(path: Path) -> Tuple[int, Dict[str, GapIndex]]:
+    """
+    读取批次索引文件
+
+    Returns:
+        (写出时间（纳秒）, 名称 -> 缺口索引)；旧格式的文件没有记录写出时间，用修改时间代替
+    """
+    with open(path) as f:
+        data = json.load(f)
+    if "indexes" in data:
+        return data["written"], {name: GapIndex.from_dict(index) for name, index in data["indexes"].items()}
+    return path.stat().st_mtime_ns, {name: GapIndex.from_dict(index) for name, index in data.items()}
+
+
+def _covered(spans: List[Tuple[int, int]], first: int, last: int, interval_ms: int) -> bool:
+    """[first, last] 是否完全落在 spans（[起点, 终点] 列表）的并集内，相隔不超过 interval_ms 的区间视为相连"""
+    reach = None
+    for start, end in sorted(spans):
+        if reach is None or start - reach > interval_ms:
+            if reach is not None and start > first:
+                break
+            span_start, reach = start, end
+        else:
+            reach = max(reach, end)
+        if span_start <= first and last <= reach:
+            return True
+    return False
+
+
+def write_gap_index(root: Path = FEATURES_OUTPUT_DIR) -> Optional[Path]:
+    """
+    合并所有批次的缺口索引，写出 gap_index.json
+
+    批次文件按记录的写出时间从新到旧处理：每个名称的覆盖范围都完全落在更新的批次文件内的旧文件是重跑前的
+    结果，不参与合并并被删除；部分重叠（例如相邻批次的预热数据）的文件照常按并集合并。
+
+    Args:
+        root: 输出目录
+
+    Returns:
+        gap_index.json 路径，没有批次索引时为 None
+    """
+    root = Path(root)
+    fragments = [(path, *_read_fragment(path)) for path in (root / GAP_INDEX_FRAGMENT_DIR).glob("*.json")]
+    if not fragments:
+        return None
+
+    fragments.sort(key=lambda item: (item[1], item[0].name), reverse=True)
+    by_name = {}
+    spans = {}
+    removed = 0
+    for path, written, indexes in fragments:
+        indexes = {name: index for name, index in indexes.items() if index.first is not None}
+        if indexes and all(_covered(spans.get(name, []), index.first, index.last, index.interval_ms)
+                           for name, index in indexes.items()):
+            path.unlink()
+            removed += 1
+            continue
+        for name, index in indexes.items():
+            by_name.setdefault(name, []).append(index)
+            spans.setdefault(name, []).append((index.first, index.last))
+    merged = {name: merge_gap_indexes(indexes) for name, indexes in by_name.items()}
+
+    path = save_gap_index(root / GAP_INDEX_FILENAME, merged)
+    if removed:
+        logger.info(f"删除 {removed} 个被更新的批次完全覆盖的旧缺口索引文件")
+    logger.info(f"合并 {len(fragments) - removed} 个批次的缺口索引: " + ", ".join(
+        f"{name} {len(index)} 个缺口 / 缺失 {index.total_missing} 个时间点" for name, index in merged.items()))
+    return path
@@ -21,6 +21,11 @@ from config import (
     LOG_FILE,
     LOG_DIR,
     ENABLE_DATA_VALIDATION,
+    FEATURES_OUTPUT_DIR,
+    EXPORT_MATRIX,
+    MATRIX_EXPORT_DIR,
+    LAG_SPEC,
+    MATERIALIZE_LAGS,
     get_output_filepath,
     ensure_directories
 )
@@ -32,7 +37,11 @@ from data_loader import (
     validate_data,
     generate_date_range
 )
-from feature_calculator import calculate_all_features, get_feature_columns
+from feature_calculator import calculate_all_features, calculate_lag_features, get_feature_columns
+from feature_store import write_partitioned, write_feature_file
+from feature_matrix import export_feature_matrix
+from feature_stats import compute_daily_stats, merge_daily_stats, save_batch_stats, write_feature_stats
+from gap_index import GapIndex, merge_gap_indexes, save_batch_gaps, write_gap_index
 
 
 def setup_logging(log_file: Optional[Path] = None, level: str = "INFO"):
@@ -67,7 +76,9 @@ def setup_logging(log_file: Optional[Path] = None, level: str = "INFO"):
 def process_batch(
     start_date: str,
     end_date: str,
-    output_path: Path
+    output_path: Path,
+    output_start: Optional[str] = None,
+    partitioned: bool = False
 ) -> bool:
     """
     处理一批数据（日期范围内）
@@ -75,7 +86,9 @@ def process_batch(
     Args:
         start_date: 起始日期
         end_date: 结束日期
-        output_path: 输出文件路径
+        output_path: 输出文件路径；partitioned 时为分区数据集根目录
+        output_start: 只保存该日期及之后的行，之前的数据仅用于滚动因子预热
+        partitioned: 按 symbol/year/month 写入 Hive 分区，替换已有分区中同一时间范围的数据
 
     Returns:
         是否成功
@@ -106,6 +119,9 @@ def process_batch(
         # 4. 合并数据
         logger.info("步骤 4/5: 合并订单簿和K线数据")
         merged_df = merge_data(bookdepth_wide, kline_processed)
+        input_gaps = GapIndex.from_frame(merged_df)
+        if len(input_gaps):
+            logger.warning(f"合并数据存在 {len(input_gaps)} 个时间缺口，共缺失 {input_gaps.total_missing} 分钟")
 
         # 数据验证
         if ENABLE_DATA_VALIDATION:
@@ -116,6 +132,8 @@ def process_batch(
         # 5. 计算因子
         logger.info("步骤 5/5: 计算所有因子")
         features_df = calculate_all_features(merged_df)
+        if MATERIALIZE_LAGS:
+            features_df = calculate_lag_features(features_df, LAG_SPEC)
 
         # 删除包含 nan 值的行（由周期性因子导致）
         rows_before = len(features_df)
@@ -124,18 +142,38 @@ def process_batch(
         if rows_before > rows_after:
             logger.info(f"删除了 {rows_before - rows_after} 行包含 NaN 的数据")
 
+        # 去掉预热数据
+        if output_start:
+            features_df = features_df.filter(
+                pl.col("timestamp") >= datetime.strptime(output_start, "%Y-%m-%d")
+            )
+
         # 6. 保存结果
         logger.info(f"保存结果到: {output_path}")
         output_path.parent.mkdir(parents=True, exist_ok=True)
 
-        if OUTPUT_FORMAT == "parquet":
-            features_df.write_parquet(output_path)
-        elif OUTPUT_FORMAT == "feather":
-            features_df.write_ipc(output_path)
+        if partitioned:
+            write_partitioned(features_df, output_path)
         else:
-            features_df.write_csv(output_path)
+            write_feature_file(features_df, output_path)
 
         logger.info(f"成功保存 {len(features_df)} 行数据")
+
+        # 批次名：分区输出没有单独的文件名，用日期范围
+        stem = f"features_{start_date.replace('-', '')}_{end_date.replace('-', '')}" if partitioned else output_path.stem
+
+        # 记录本批次的因子统计量（按日累加器）
+        save_batch_stats(compute_daily_stats(features_df), stem,
+                         output_path if partitioned else output_path.parent)
+
+        # 记录合并输入和因子输出的时间缺口
+        save_batch_gaps({"input": input_gaps, "output": GapIndex.from_frame(features_df)}, stem,
+                        output_path if partitioned else output_path.parent)
+
+        # 导出训练矩阵
+        if EXPORT_MATRIX:
+            export_feature_matrix(features_df, MATRIX_EXPORT_DIR / stem)
+
         logger.info("="*80)
 
         return True
@@ -204,6 +242,45 @@ def generate_features_by_month(
     return success_count
 
 
+def generate_features_partitioned(
+    start_date: str,
+    end_date: str
+) -> int:
+    """
+    按月计算特征并写入 Hive 分区（symbol=XXX/year=YYYY/month=MM）
+
+    已有分区中同一时间范围的数据被整体替换，重跑不需要确认覆盖。
+
+    Args:
+        start_date: 起始日期 'YYYY-MM-DD'
+        end_date: 结束日期 'YYYY-MM-DD'
+
+    Returns:
+        成功处理的月份数
+    """
+    logger = logging.getLogger(__name__)
+    logger.info(f"使用分区策略生成特征: {FEATURES_OUTPUT_DIR}")
+
+    start = datetime.strptime(start_date, "%Y-%m-%d")
+    end = datetime.strptime(end_date, "%Y-%m-%d")
+
+    success_count = 0
+    current = start
+    while current < end:
+        next_month = (current.replace(day=28) + timedelta(days=4)).replace(day=1)
+        batch_end = min(next_month, end)
+        logger.info(f"\n处理月份: {current.strftime('%Y%m')}")
+
+        if process_batch(current.strftime("%Y-%m-%d"), batch_end.strftime("%Y-%m-%d"),
+                         FEATURES_OUTPUT_DIR, partitioned=True):
+            success_count += 1
+        else:
+            logger.error(f"处理月份 {current.strftime('%Y%m')} 失败")
+        current = next_month
+
+    return success_count
+
+
 def generate_features_single_file(
     start_date: str,
     end_date: str,
@@ -231,6 +308,8 @@ def generate_features_single_file(
 
     # 分批处理
     batch_dfs = []
+    batch_stats = []
+    batch_gaps = []
     for i in range(0, total_days, batch_size):
         batch_num = i // batch_size + 1
         total_batches = (total_days + batch_size - 1) // batch_size
@@ -252,7 +331,10 @@ def generate_features_single_file(
             bookdepth_wide = pivot_bookdepth(bookdepth_df)
             kline_processed = preprocess_kline(kline_df)
             merged_df = merge_data(bookdepth_wide, kline_processed)
+            input_gaps = GapIndex.from_frame(merged_df)
             features_df = calculate_all_features(merged_df)
+            if MATERIALIZE_LAGS:
+                features_df = calculate_lag_features(features_df, LAG_SPEC)
 
             # 删除包含 nan 值的行（由周期性因子导致）
             rows_before = len(features_df)
@@ -262,6 +344,8 @@ def generate_features_single_file(
                 logger.info(f"批次 {batch_num} 删除了 {rows_before - rows_after} 行包含 NaN 的数据")
 
             batch_dfs.append(features_df)
+            batch_stats.append(compute_daily_stats(features_df))
+            batch_gaps.append((input_gaps, GapIndex.from_frame(features_df)))
 
             logger.info(f"批次 {batch_num} 处理完成，{len(features_df)} 行")
 
@@ -281,14 +365,21 @@ def generate_features_single_file(
     output_path = get_output_filepath(start_date=start_date, end_date=end_date)
     logger.info(f"保存最终结果到: {output_path}")
 
-    if OUTPUT_FORMAT == "parquet":
-        final_df.write_parquet(output_path)
-    elif OUTPUT_FORMAT == "feather":
-        final_df.write_ipc(output_path)
-    else:
-        final_df.write_csv(output_path)
+    write_feature_file(final_df, output_path)
 
     logger.info(f"成功保存 {len(final_df)} 行数据")
+
+    # 各批次的统计量直接合并，不需要重新扫描合并后的数据
+    save_batch_stats(merge_daily_stats(batch_stats), output_path.stem, output_path.parent)
+    save_batch_gaps({
+        "input": merge_gap_indexes(gaps[0] for gaps in batch_gaps),
+        "output": merge_gap_indexes(gaps[1] for gaps in batch_gaps),
+    }, output_path.stem, output_path.parent)
+
+    # 导出训练矩阵
+    if EXPORT_MATRIX:
+        export_feature_matrix(final_df, MATRIX_EXPORT_DIR / output_path.stem)
+
     return True
 
 
@@ -301,7 +392,7 @@ def main():
     parser.add_argument('--end-date', type=str, default=END_DATE,
                         help=f'结束日期 (默认: {END_DATE})')
     parser.add_argument('--strategy', type=str, default=OUTPUT_STRATEGY,
-                        choices=['single', 'monthly'],
+                        choices=['single', 'monthly', 'partitioned'],
                         help=f'输出策略 (默认: {OUTPUT_STRATEGY})')
     parser.add_argument('--batch-size', type=int, default=BATCH_SIZE_DAYS,
                         help=f'批处理大小（天数） (默认: {BATCH_SIZE_DAYS})')
@@ -340,6 +431,9 @@ def main():
         if args.strategy == "monthly":
             success_count = generate_features_by_month(args.start_date, args.end_date)
             logger.info(f"\n成功处理 {success_count} 个月的数据")
+        elif args.strategy == "partitioned":
+            success_count = generate_features_partitioned(args.start_date, args.end_date)
+            logger.info(f"\n成功处理 {success_count} 个月的数据")
         else:
             success = generate_features_single_file(
                 args.start_date,
@@ -355,6 +449,10 @@ def main():
         logger.error(f"执行过程中发生错误: {str(e)}", exc_info=True)
         return 1
 
+    # 合并各批次的因子统计量和缺口索引
+    write_feature_stats(FEATURES_OUTPUT_DIR)
+    write_gap_index(FEATURES_OUTPUT_DIR)
+
     # 结束计时
     end_time = datetime.now()
     elapsed = end_time - start_time
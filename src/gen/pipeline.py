@@ -0,0 +1,267 @@
+"""
+下载-因子计算流水线
+一边下载原始数据，一边计算已就绪日期的因子
+
+某一天的订单簿和K线归档都下载（并校验）完成后，该日期立即进入队列，
+由计算进程池解码并计算因子，每天输出一个文件。已下载但尚未计算的天数
+受 queue_size 限制，下载不会无限领先于计算。
+"""
+
+import sys
+import queue
+import logging
+import argparse
+import threading
+import multiprocessing
+from datetime import datetime, timedelta
+from pathlib import Path
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor
+from typing import Dict, List
+
+from config import (
+    START_DATE,
+    END_DATE,
+    SYMBOL,
+    TIMEFRAME,
+    LOG_LEVEL,
+    LOG_FILE,
+    PIPELINE_DOWNLOAD_FOLDER,
+    PIPELINE_TRADING_TYPE,
+    PIPELINE_DOWNLOAD_WORKERS,
+    PIPELINE_COMPUTE_WORKERS,
+    PIPELINE_QUEUE_SIZE,
+    FEATURES_OUTPUT_DIR,
+    get_output_filepath,
+    ensure_directories
+)
+from data_loader import generate_date_range
+from main import setup_logging, process_batch
+from feature_stats import write_feature_stats
+from gap_index import write_gap_index
+
+# 下载脚本位于 src/download，不是包，按路径导入
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / "download"))
+from utility import download_with_checksum, get_path, open_verified_ledger, DownloadProgress  # noqa: E402
+
+logger = logging.getLogger(__name__)
+
+
+def _shift_date(date_str: str, days: int) -> str:
+    return (datetime.strptime(date_str, "%Y-%m-%d") + timedelta(days=days)).strftime("%Y-%m-%d")
+
+
+def get_day_jobs(date_str: str) -> List[tuple]:
+    """
+    某一天需要下载的 (base_path, file_name) 列表：订单簿和K线
+
+    Args:
+        date_str: 日期字符串 'YYYY-MM-DD'
+
+    Returns:
+        下载任务列表
+    """
+    return [
+        (get_path(PIPELINE_TRADING_TYPE, "bookDepth", "daily", SYMBOL),
+         f"{SYMBOL}-bookDepth-{date_str}.zip"),
+        (get_path(PIPELINE_TRADING_TYPE, "klines", "daily", SYMBOL, TIMEFRAME),
+         f"{SYMBOL}-{TIMEFRAME}-{date_str}.zip"),
+    ]
+
+
+def compute_day(date_str: str) -> bool:
+    """
+    计算单日因子（在计算进程中运行）
+
+    前一天的数据一并加载，只用于滚动因子预热，不写入输出。
+
+    Args:
+        date_str: 日期字符串 'YYYY-MM-DD'
+
+    Returns:
+        是否成功
+    """
+    return process_batch(
+        _shift_date(date_str, -1),
+        _shift_date(date_str, 1),
+        get_output_filepath(date_str=date_str),
+        output_start=date_str
+    )
+
+
+def run_pipeline(
+    start_date: str,
+    end_date: str,
+    download_workers: int = PIPELINE_DOWNLOAD_WORKERS,
+    compute_workers: int = PIPELINE_COMPUTE_WORKERS,
+    queue_size: int = PIPELINE_QUEUE_SIZE,
+    checksum: int = 1
+) -> Dict[str, int]:
+    """
+    流水线方式下载数据并计算因子
+
+    下载线程按日期顺序放出就绪日期（前一天先于后一天入队，保证预热数据已在本地），
+    主线程把就绪日期提交给计算进程池。
+
+    Args:
+        start_date: 起始日期 'YYYY-MM-DD'
+        end_date: 结束日期 'YYYY-MM-DD'（不含）
+        download_workers: 并发下载数
+        compute_workers: 计算进程数
+        queue_size: 已下载但尚未计算完成的天数上限
+        checksum: 1 表示下载并校验 .CHECKSUM
+
+    Returns:
+        统计信息：computed / failed_download / failed_compute / skipped
+    """
+    folder = str(Path(PIPELINE_DOWNLOAD_FOLDER).resolve())
+    stats = {"computed": 0, "failed_download": 0, "failed_compute": 0, "skipped": 0}
+
+    dates = []
+    for date_str in generate_date_range(start_date, end_date):
+        if get_output_filepath(date_str=date_str).exists():
+            stats["skipped"] += 1
+        else:
+            dates.append(date_str)
+
+    logger.info(f"流水线: {len(dates)} 天待处理，跳过已有输出 {stats['skipped']} 天")
+    if not dates:
+        return stats
+
+    # 第一天之前的一天只下载、不计算，用作滚动因子的预热数据
+    download_dates = [_shift_date(dates[0], -1)] + dates
+    to_compute = set(dates)
+
+    ledger = open_verified_ledger(folder) if checksum == 1 else None
+    progress = DownloadProgress(len(download_dates) * 2)
+    # 每个槽位对应一天：开始下载时占用，计算完成（或下载失败）后释放；
+    # 正在计算的天数另计，因此下载最多领先计算 queue_size 天
+    slots = threading.Semaphore(queue_size + compute_workers)
+    ready = queue.Queue()
+
+    def download_day(date_str: str) -> bool:
+        success = True
+        for base_path, file_name in get_day_jobs(date_str):
+            ok = download_with_checksum(base_path, file_name, None, folder, checksum, progress, ledger)
+            progress.file_done(ok)
+            success = success and ok
+        return success
+
+    pending = []
+    pending_lock = threading.Lock()
+
+    def release_in_order(_future=None) -> None:
+        # 按日期顺序放出已完成的下载，后一天不会先于前一天进入计算
+        with pending_lock:
+            while pending and pending[0][1].done():
+                done_date, future = pending.pop(0)
+                try:
+                    downloaded = future.result()
+                except Exception as e:
+                    logger.error(f"{done_date} 下载出错: {str(e)}")
+                    downloaded = False
+                ready.put((done_date, downloaded))
+
+    def produce():
+        with ThreadPoolExecutor(max_workers=download_workers) as executor:
+            for date_str in download_dates:
+                slots.acquire()
+                future = executor.submit(download_day, date_str)
+                with pending_lock:
+                    pending.append((date_str, future))
+                future.add_done_callback(release_in_order)
+        release_in_order()
+        ready.put(None)
+
+    producer = threading.Thread(target=produce, name="pipeline-download", daemon=True)
+    producer.start()
+
+    def on_computed(date_str: str, future) -> None:
+        try:
+            success = future.result()
+        except Exception as e:
+            logger.error(f"{date_str} 因子计算失败: {str(e)}")
+            success = False
+        stats["computed" if success else "failed_compute"] += 1
+        slots.release()
+
+    # polars 的线程池在 fork 后可能死锁，计算进程用 spawn 启动
+    # spawn 启动的进程需重新配置日志，沿用主进程的日志文件和级别
+    with ProcessPoolExecutor(
+        max_workers=compute_workers,
+        mp_context=multiprocessing.get_context("spawn"),
+        initializer=setup_logging,
+        initargs=(LOG_FILE, logging.getLevelName(logging.getLogger().getEffectiveLevel()))
+    ) as pool:
+        while True:
+            item = ready.get()
+            if item is None:
+                break
+            date_str, downloaded = item
+            if date_str not in to_compute:
+                slots.release()
+                continue
+            if not downloaded:
+                logger.warning(f"{date_str} 数据下载失败，跳过因子计算")
+                stats["failed_download"] += 1
+                slots.release()
+                continue
+            future = pool.submit(compute_day, date_str)
+            future.add_done_callback(lambda f, d=date_str: on_computed(d, f))
+
+    producer.join()
+    progress.close()
+    if ledger is not None:
+        ledger.close()
+
+    # 各计算进程分别写出了每天的统计量和缺口索引，这里合并一次
+    write_feature_stats(FEATURES_OUTPUT_DIR)
+    write_gap_index(FEATURES_OUTPUT_DIR)
+
+    return stats
+
+
+def main():
+    """主函数"""
+    parser = argparse.ArgumentParser(description='边下载边生成高频交易因子（每天一个输出文件）')
+    parser.add_argument('--start-date', type=str, default=START_DATE,
+                        help=f'起始日期 (默认: {START_DATE})')
+    parser.add_argument('--end-date', type=str, default=END_DATE,
+                        help=f'结束日期，不含 (默认: {END_DATE})')
+    parser.add_argument('--download-workers', type=int, default=PIPELINE_DOWNLOAD_WORKERS,
+                        help=f'并发下载数 (默认: {PIPELINE_DOWNLOAD_WORKERS})')
+    parser.add_argument('--compute-workers', type=int, default=PIPELINE_COMPUTE_WORKERS,
+                        help=f'因子计算进程数 (默认: {PIPELINE_COMPUTE_WORKERS})')
+    parser.add_argument('--queue-size', type=int, default=PIPELINE_QUEUE_SIZE,
+                        help=f'已下载未计算的天数上限 (默认: {PIPELINE_QUEUE_SIZE})')
+    parser.add_argument('--checksum', type=int, default=1, choices=[0, 1],
+                        help='1 表示下载并校验 CHECKSUM 文件 (默认: 1)')
+    parser.add_argument('--log-level', type=str, default=LOG_LEVEL,
+                        choices=['DEBUG', 'INFO', 'WARNING', 'ERROR'],
+                        help=f'日志级别 (默认: {LOG_LEVEL})')
+
+    args = parser.parse_args()
+
+    ensure_directories()
+    setup_logging(LOG_FILE, args.log_level)
+
+    start_time = datetime.now()
+    stats = run_pipeline(
+        args.start_date,
+        args.end_date,
+        args.download_workers,
+        args.compute_workers,
+        max(args.queue_size, 1),
+        args.checksum
+    )
+
+    logger.info("="*80)
+    logger.info(f"完成 {stats['computed']} 天，下载失败 {stats['failed_download']} 天，"
+                f"计算失败 {stats['failed_compute']} 天，跳过 {stats['skipped']} 天")
+    logger.info(f"总耗时: {datetime.now() - start_time}")
+    logger.info("="*80)
+
+    return 0 if stats["failed_download"] == 0 and stats["failed_compute"] == 0 else 1
+
+
+if __name__ == "__main__":
+    exit(main())
@@ -5,10 +5,26 @@
 
 import polars as pl
 import argparse
+import time
 from pathlib import Path
 from datetime import datetime
-from typing import List, Tuple
+from calendar import monthrange
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, List, Optional, Tuple
 import logging
+import json
+
+from feature_stats import load_daily_stats, summarize_stats
+from feature_store import read_output_metadata, save_output_metadata
+
+
+# 输出格式对应的扩展名
+FORMAT_SUFFIXES = {"ipc": ".feather", "parquet": ".parquet"}
+COMPRESSIONS = ["zstd", "lz4", "none"]
+DEFAULT_WORKERS = 4
+
+# 各分段归一化参数的输出文件名
+SPLIT_STATS_FILENAME = "split_stats.json"
 
 
 def setup_logging(level: str = "INFO"):
@@ -43,11 +59,186 @@ def parse_date_ranges(ranges_str: str) -> List[Tuple[str, str]]:
     return ranges
 
 
+def scan_time_index(input_file: Path, time_column: str) -> Tuple[pl.LazyFrame, pl.Series]:
+    """
+    懒加载特征文件，只读取时间列用于定位分割边界
+
+    IPC 文件按内存映射方式打开，后续每个分段只读取自己的行范围。
+    时间列未排序时，整体读入并排序一次（此时内存占用为整个文件）。
+
+    Args:
+        input_file: 输入文件路径
+        time_column: 时间列名称
+
+    Returns:
+        (LazyFrame, 升序的时间列)
+    """
+    logger = logging.getLogger(__name__)
+
+    lf = pl.scan_ipc(input_file)
+
+    # 确保时间列是datetime类型
+    if lf.collect_schema()[time_column] == pl.Utf8:
+        logger.info(f"转换时间列 {time_column} 为 datetime 类型")
+        lf = lf.with_columns(
+            pl.col(time_column).str.strptime(pl.Datetime, "%Y-%m-%d %H:%M:%S")
+        )
+
+    times = lf.select(time_column).collect().to_series()
+    if not times.is_sorted():
+        logger.warning(f"时间列 {time_column} 未排序，整体读入并排序")
+        df = lf.collect().sort(time_column)
+        return df.lazy(), df[time_column]
+
+    return lf, times.set_sorted()
+
+
+def slice_bounds(times: pl.Series, start_dt: datetime, end_dt: datetime) -> Tuple[int, int]:
+    """
+    二分查找 [start_dt, end_dt] 在升序时间列中的行范围
+
+    Args:
+        times: 升序的时间列
+        start_dt: 起始时间（含）
+        end_dt: 结束时间（含）
+
+    Returns:
+        (起始行号, 行数)
+    """
+    offset = times.search_sorted(start_dt, side="left")
+    end = times.search_sorted(end_dt, side="right")
+    return offset, max(end - offset, 0)
+
+
+def write_slice(
+    lf: pl.LazyFrame,
+    offset: int,
+    length: int,
+    output_path: Path,
+    file_format: str = "ipc",
+    compression: str = "none",
+    compression_level: Optional[int] = None,
+    metadata: Optional[Dict[str, str]] = None
+) -> Tuple[int, float]:
+    """
+    读取 [offset, offset + length) 行并写出；只有这一段数据进入内存
+
+    Args:
+        lf: 输入 LazyFrame
+        offset: 起始行号
+        length: 行数
+        output_path: 输出文件路径
+        file_format: "ipc" 或 "parquet"
+        compression: "zstd"、"lz4" 或 "none"
+        compression_level: 压缩级别，仅 parquet 的 zstd 支持
+        metadata: 键值元数据（滞后需求等），parquet 写入文件，ipc 写入旁路文件
+
+    Returns:
+        (写出字节数, 耗时秒数)
+    """
+    start = time.perf_counter()
+    df = lf.slice(offset, length).collect()
+    codec = "uncompressed" if compression == "none" else compression
+    if file_format == "parquet":
+        df.write_parquet(output_path, compression=codec, compression_level=compression_level, metadata=metadata)
+    else:
+        df.write_ipc(output_path, compression=codec)
+        save_output_metadata(output_path, metadata)
+    return output_path.stat().st_size, time.perf_counter() - start
+
+
+def write_partitions(
+    lf: pl.LazyFrame,
+    partitions: List[Tuple[int, int, Path]],
+    file_format: str = "ipc",
+    compression: str = "none",
+    compression_level: Optional[int] = None,
+    workers: int = DEFAULT_WORKERS,
+    metadata: Optional[Dict[str, str]] = None
+) -> None:
+    """
+    用线程池并发写出各分段，并记录每个分段的字节数和吞吐
+
+    同时在内存中的分段数不超过 workers。
+
+    Args:
+        lf: 输入 LazyFrame
+        partitions: [(起始行号, 行数, 输出路径), ...]
+        file_format: "ipc" 或 "parquet"
+        compression: "zstd"、"lz4" 或 "none"
+        compression_level: 压缩级别
+        workers: 并发写出的分段数
+        metadata: 各分段记录的键值元数据
+    """
+    logger = logging.getLogger(__name__)
+
+    def write_one(partition: Tuple[int, int, Path]) -> None:
+        offset, length, output_path = partition
+        size, seconds = write_slice(lf, offset, length, output_path, file_format, compression, compression_level,
+                                    metadata)
+        logger.info(
+            f"成功保存 {length} 行数据到 {output_path.name}: {size / 1e6:.1f} MB, "
+            f"{seconds:.2f}s, {size / 1e6 / max(seconds, 1e-9):.1f} MB/s"
+        )
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=max(workers, 1)) as executor:
+        # list() 让写出异常在这里抛出
+        list(executor.map(write_one, partitions))
+    total = sum(path.stat().st_size for _, _, path in partitions)
+    seconds = time.perf_counter() - start
+    logger.info(f"共写出 {len(partitions)} 个文件, {total / 1e6:.1f} MB, {seconds:.2f}s, "
+                f"{total / 1e6 / max(seconds, 1e-9):.1f} MB/s")
+
+
+def write_split_stats(
+    stats_path: Path,
+    split_ranges: List[Tuple[str, datetime, datetime]],
+    output_dir: Path
+) -> Optional[Path]:
+    """
+    由 feature_stats.json 的按日累加器得到各分段的归一化参数，不重新读取数据
+
+    Args:
+        stats_path: feature_stats.json 或其所在目录
+        split_ranges: [(输出文件名, 起始时间, 结束时间), ...]
+        output_dir: 输出目录
+
+    Returns:
+        split_stats.json 路径，没有统计量时为 None
+    """
+    logger = logging.getLogger(__name__)
+
+    daily_stats = load_daily_stats(stats_path)
+    if not daily_stats:
+        logger.info(f"未找到因子统计量 ({stats_path})，跳过归一化参数")
+        return None
+
+    split_stats = {
+        name: {
+            "start": start_dt.date().isoformat(),
+            "end": end_dt.date().isoformat(),
+            "features": summarize_stats(daily_stats, start_dt.date(), end_dt.date())
+        }
+        for name, start_dt, end_dt in split_ranges
+    }
+    output_path = output_dir / SPLIT_STATS_FILENAME
+    with open(output_path, "w") as f:
+        json.dump(split_stats, f, indent=2, ensure_ascii=False)
+    logger.info(f"各分段归一化参数已保存到: {output_path}")
+    return output_path
+
+
 def split_features(
     input_file: Path,
     date_ranges: List[Tuple[str, str]],
     output_dir: Path,
-    time_column: str = "candle_begin_time"
+    time_column: str = "candle_begin_time",
+    file_format: str = "ipc",
+    compression: str = "none",
+    compression_level: Optional[int] = None,
+    workers: int = DEFAULT_WORKERS,
+    stats_path: Optional[Path] = None
 ) -> None:
     """
     按时间段分割特征文件
@@ -57,27 +248,27 @@ def split_features(
         date_ranges: 日期范围列表 [(start1, end1), (start2, end2), ...]
         output_dir: 输出目录
         time_column: 时间列名称
+        file_format: 输出格式 "ipc" 或 "parquet"
+        compression: 压缩方式 "zstd"、"lz4" 或 "none"
+        compression_level: 压缩级别
+        workers: 并发写出的分段数
+        stats_path: feature_stats.json 或其所在目录，默认输入文件所在目录
     """
     logger = logging.getLogger(__name__)
 
-    # 读取数据
+    # 只读取时间列，数据按分段读取
     logger.info(f"读取输入文件: {input_file}")
-    df = pl.read_ipc(input_file)
+    lf, times = scan_time_index(input_file, time_column)
 
-    logger.info(f"总数据行数: {len(df)}")
+    logger.info(f"总数据行数: {len(times)}")
     logger.info(f"时间列: {time_column}")
 
     # 确保输出目录存在
     output_dir.mkdir(parents=True, exist_ok=True)
 
-    # 确保时间列是datetime类型
-    if df[time_column].dtype != pl.Datetime:
-        logger.info(f"转换时间列 {time_column} 为 datetime 类型")
-        df = df.with_columns(
-            pl.col(time_column).str.strptime(pl.Datetime, "%Y-%m-%d %H:%M:%S")
-        )
-
     # 按时间段分割
+    partitions = []
+    split_ranges = []
     for start_date, end_date in date_ranges:
         logger.info(f"\n处理时间段: {start_date} 至 {end_date}")
 
@@ -85,13 +276,7 @@ def split_features(
         start_dt = datetime.strptime(start_date, "%Y%m%d")
         end_dt = datetime.strptime(end_date, "%Y%m%d").replace(hour=23, minute=59, second=59)
 
-        # 过滤数据
-        filtered_df = df.filter(
-            (pl.col(time_column) >= start_dt) &
-            (pl.col(time_column) <= end_dt)
-        )
-
-        rows_count = len(filtered_df)
+        offset, rows_count = slice_bounds(times, start_dt, end_dt)
         logger.info(f"该时间段数据行数: {rows_count}")
 
         if rows_count == 0:
@@ -99,24 +284,48 @@ def split_features(
             continue
 
         # 生成输出文件名
-        output_filename = f"split_{start_date}_{end_date}.feather"
+        output_filename = f"split_{start_date}_{end_date}{FORMAT_SUFFIXES[file_format]}"
         output_path = output_dir / output_filename
 
-        # 保存文件
         logger.info(f"保存到: {output_path}")
-        filtered_df.write_ipc(output_path)
+        partitions.append((offset, rows_count, output_path))
+        split_ranges.append((output_filename, start_dt, end_dt))
 
-        logger.info(f"成功保存 {rows_count} 行数据")
+    # 保存文件，沿用输入文件记录的元数据（滞后需求等）
+    write_partitions(lf, partitions, file_format, compression, compression_level, workers,
+                     read_output_metadata(input_file))
+    write_split_stats(stats_path or input_file.parent, split_ranges, output_dir)
 
     logger.info("\n所有分割完成！")
 
 
+def month_ranges(first: datetime, last: datetime) -> List[Tuple[str, str]]:
+    """
+    覆盖 [first, last] 的自然月列表
+
+    Returns:
+        [(月初 YYYYMMDD, 月末 YYYYMMDD), ...]
+    """
+    ranges = []
+    year, month = first.year, first.month
+    while (year, month) <= (last.year, last.month):
+        last_day = monthrange(year, month)[1]
+        ranges.append((f"{year}{month:02d}01", f"{year}{month:02d}{last_day:02d}"))
+        year, month = (year + 1, 1) if month == 12 else (year, month + 1)
+    return ranges
+
+
 def auto_split_by_months(
     input_file: Path,
     output_dir: Path,
     start_date: str,
     end_date: str,
-    time_column: str = "candle_begin_time"
+    time_column: str = "candle_begin_time",
+    file_format: str = "ipc",
+    compression: str = "none",
+    compression_level: Optional[int] = None,
+    workers: int = DEFAULT_WORKERS,
+    stats_path: Optional[Path] = None
 ) -> None:
     """
     按月自动分割特征文件
@@ -127,45 +336,43 @@ def auto_split_by_months(
         start_date: 起始日期 YYYYMMDD
         end_date: 结束日期 YYYYMMDD
         time_column: 时间列名称
+        file_format: 输出格式 "ipc" 或 "parquet"
+        compression: 压缩方式 "zstd"、"lz4" 或 "none"
+        compression_level: 压缩级别
+        workers: 并发写出的分段数
+        stats_path: feature_stats.json 或其所在目录，默认输入文件所在目录
     """
     logger = logging.getLogger(__name__)
 
-    # 读取数据
+    # 只读取时间列，数据按月读取
     logger.info(f"读取输入文件: {input_file}")
-    df = pl.read_ipc(input_file)
+    lf, times = scan_time_index(input_file, time_column)
 
-    logger.info(f"总数据行数: {len(df)}")
+    logger.info(f"总数据行数: {len(times)}")
+
+    if len(times) == 0:
+        logger.warning("输入文件没有数据")
+        return
 
     # 确保输出目录存在
     output_dir.mkdir(parents=True, exist_ok=True)
 
-    # 确保时间列是datetime类型
-    if df[time_column].dtype != pl.Datetime:
-        logger.info(f"转换时间列 {time_column} 为 datetime 类型")
-        df = df.with_columns(
-            pl.col(time_column).str.strptime(pl.Datetime, "%Y-%m-%d %H:%M:%S")
-        )
-
-    # 按月分组
+    # 按月分组：月份边界由二分查找得到
     logger.info("\n按月分割数据...")
-    df_with_month = df.with_columns(
-        pl.col(time_column).dt.strftime("%Y%m").alias("month")
-    )
-
-    # 获取所有唯一的月份
-    months = df_with_month["month"].unique().sort()
+    months = month_ranges(times[0], times[-1])
 
     logger.info(f"找到 {len(months)} 个不同的月份")
 
     # 为每个月保存数据
-    for month in months:
-        month_str = str(month)
+    partitions = []
+    split_ranges = []
+    for month_start, month_end in months:
+        month_str = month_start[:6]
         logger.info(f"\n处理月份: {month_str}")
 
-        # 过滤该月的数据
-        month_df = df_with_month.filter(pl.col("month") == month).drop("month")
-
-        rows_count = len(month_df)
+        start_dt = datetime.strptime(month_start, "%Y%m%d")
+        end_dt = datetime.strptime(month_end, "%Y%m%d").replace(hour=23, minute=59, second=59)
+        offset, rows_count = slice_bounds(times, start_dt, end_dt)
         logger.info(f"该月数据行数: {rows_count}")
 
         if rows_count == 0:
@@ -173,30 +380,17 @@ def auto_split_by_months(
             continue
 
         # 生成输出文件名 - 月初到月末
-        month_start = f"{month_str}01"
-
-        # 计算月末日期
-        year = int(month_str[:4])
-        month_num = int(month_str[4:])
-        if month_num == 12:
-            next_year = year + 1
-            next_month = 1
-        else:
-            next_year = year
-            next_month = month_num + 1
-
-        from calendar import monthrange
-        last_day = monthrange(year, month_num)[1]
-        month_end = f"{month_str}{last_day:02d}"
-
-        output_filename = f"split_{month_start}_{month_end}.feather"
+        output_filename = f"split_{month_start}_{month_end}{FORMAT_SUFFIXES[file_format]}"
         output_path = output_dir / output_filename
 
-        # 保存文件
         logger.info(f"保存到: {output_path}")
-        month_df.write_ipc(output_path)
+        partitions.append((offset, rows_count, output_path))
+        split_ranges.append((output_filename, start_dt, end_dt))
 
-        logger.info(f"成功保存 {rows_count} 行数据")
+    # 保存文件，沿用输入文件记录的元数据（滞后需求等）
+    write_partitions(lf, partitions, file_format, compression, compression_level, workers,
+                     read_output_metadata(input_file))
+    write_split_stats(stats_path or input_file.parent, split_ranges, output_dir)
 
     logger.info("\n所有分割完成！")
 
@@ -219,6 +413,10 @@ def main():
 3. 指定输出目录:
    python split_features.py -i features_20230101_20251231.feather \\
        -r "20230101-20250131,20250201-20250531" -o ./split_output
+
+4. 输出 zstd 压缩的 parquet，8 个分段并发写出:
+   python split_features.py -i features_20230101_20251231.feather --auto-monthly \\
+       --format parquet --compression zstd --compression-level 3 --workers 8
         """
     )
 
@@ -255,6 +453,43 @@ def main():
         help='自动按月分割'
     )
 
+    parser.add_argument(
+        '--format',
+        type=str,
+        default='ipc',
+        choices=list(FORMAT_SUFFIXES),
+        help='输出格式: ipc (.feather) 或 parquet (默认: ipc)'
+    )
+
+    parser.add_argument(
+        '--compression',
+        type=str,
+        default='none',
+        choices=COMPRESSIONS,
+        help='压缩方式 (默认: none)'
+    )
+
+    parser.add_argument(
+        '--compression-level',
+        type=int,
+        default=None,
+        help='压缩级别，仅 parquet 支持，zstd 为 1-22 (默认: 编解码器默认值)'
+    )
+
+    parser.add_argument(
+        '--workers',
+        type=int,
+        default=DEFAULT_WORKERS,
+        help=f'并发写出的分段数，也是同时在内存中的分段数上限 (默认: {DEFAULT_WORKERS})'
+    )
+
+    parser.add_argument(
+        '--stats',
+        type=str,
+        default=None,
+        help=f'feature_stats.json 或其所在目录，用于生成各分段的归一化参数 {SPLIT_STATS_FILENAME} (默认: 输入文件所在目录)'
+    )
+
     parser.add_argument(
         '--log-level',
         type=str,
@@ -283,6 +518,8 @@ def main():
     logger.info(f"输入文件: {input_file}")
     logger.info(f"输出目录: {output_dir}")
     logger.info(f"时间列: {args.time_column}")
+    logger.info(f"输出格式: {args.format}, 压缩: {args.compression}"
+                + (f" (级别 {args.compression_level})" if args.compression_level is not None else ""))
     logger.info("="*80)
 
     try:
@@ -294,7 +531,12 @@ def main():
                 output_dir=output_dir,
                 start_date="",
                 end_date="",
-                time_column=args.time_column
+                time_column=args.time_column,
+                file_format=args.format,
+                compression=args.compression,
+                compression_level=args.compression_level,
+                workers=args.workers,
+                stats_path=Path(args.stats) if args.stats else None
             )
         elif args.ranges:
             # 按指定范围分割
@@ -313,7 +555,12 @@ def main():
                 input_file=input_file,
                 date_ranges=date_ranges,
                 output_dir=output_dir,
-                time_column=args.time_column
+                time_column=args.time_column,
+                file_format=args.format,
+                compression=args.compression,
+                compression_level=args.compression_level,
+                workers=args.workers,
+                stats_path=Path(args.stats) if args.stats else None
             )
         else:
             logger.error("请指定 --ranges 或 --auto-monthly 参数")
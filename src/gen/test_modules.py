@@ -5,6 +5,7 @@
 
 import polars as pl
 import logging
+from datetime import datetime, timedelta
 from pathlib import Path
 import sys
 
@@ -16,6 +17,24 @@ logging.basicConfig(
 logger = logging.getLogger(__name__)
 
 
+def make_minute_frame(start: datetime, count: int, **columns) -> pl.DataFrame:
+    """
+    测试用的 1 分钟数据：timestamp 从 start 起连续 count 分钟，其余列由关键字参数给出（标量会广播）
+
+    Args:
+        start: 起始时间
+        count: 行数
+        **columns: 列名 -> 数组或标量
+
+    Returns:
+        DataFrame
+    """
+    return pl.DataFrame({
+        "timestamp": pl.datetime_range(start, start + timedelta(minutes=count - 1), "1m", eager=True),
+        **columns
+    })
+
+
 def test_config():
     """测试配置模块"""
     logger.info("\n" + "="*60)
@@ -224,6 +243,741 @@ def test_feature_calculator():
         return False
 
 
+def test_aggtrades_klines():
+    """测试由聚合成交数据重建K线"""
+    logger.info("\n" + "="*60)
+    logger.info("测试 5: 聚合成交重建K线")
+    logger.info("="*60)
+
+    try:
+        import io
+        import tempfile
+        import zipfile
+        from data_loader import aggregate_aggtrades_file, preprocess_kline, fill_empty_bars
+
+        # 创建模拟的聚合成交归档（首行为空行，与 biance_example/aggtrades.csv 一致）
+        # 1688083200000 = 2023-06-30 00:00:00 UTC，每 20 秒一笔，共 10 笔
+        base = 1688083200000
+        rows = ["agg_trade_id,price,quantity,first_trade_id,last_trade_id,transact_time,is_buyer_maker"]
+        rows += [
+            f"{i},{100 + i},1.0,{10 * i},{10 * i + 1},{base + i * 20000},{'true' if i % 2 else 'false'}"
+            for i in range(10)
+        ]
+
+        with tempfile.TemporaryDirectory() as tmp:
+            tmp_dir = Path(tmp)
+            zip_path = tmp_dir / "ETHUSDT-aggTrades-2023-06.zip"
+            with zipfile.ZipFile(zip_path, 'w') as z:
+                z.writestr("ETHUSDT-aggTrades-2023-06.csv", "\n" + "\n".join(rows) + "\n")
+
+            # 每批 4 行，确保跨批次的K线能正确合并
+            bars = aggregate_aggtrades_file(zip_path, "1m", batch_rows=4)
+            logger.info(f"重建K线: {bars.shape}")
+            assert len(bars) == 4, "K线数量错误"
+
+            first = bars.row(0, named=True)
+            assert first["open"] == 100 and first["high"] == 102 and first["close"] == 102, "OHLC 错误"
+            assert first["volume"] == 3.0, "成交量错误"
+            assert first["taker_buy_volume"] == 2.0, "主动买入量错误"
+            assert first["count"] == 6, "成交笔数错误"
+
+            # 补齐空K线后应能直接交给 preprocess_kline
+            filled = fill_empty_bars(bars, base, base + 10 * 60_000, 60_000)
+            assert len(filled) == 10, "补齐后K线数量错误"
+            assert filled["close"][-1] == 109.0, "空K线应沿用上一根收盘价"
+            assert filled["volume"][-1] == 0.0, "空K线成交量应为 0"
+
+            processed = preprocess_kline(filled)
+            assert "taker_buy_volume" in processed.columns, "缺少 taker_buy_volume 列"
+
+            # 只聚合需要的时间范围（例如缺失的某几天），其余成交不进入K线
+            window = [(base + 60_000, base + 120_000)]
+            window_bars = aggregate_aggtrades_file(zip_path, "1m", batch_rows=4, time_ranges=window)
+            assert window_bars is not None and window_bars.equals(bars.slice(1, 1)), "按时间范围聚合的K线错误"
+
+            # 下载时转换出的同名 .parquet 优先于 ZIP，结果应一致
+            pl.read_csv(io.StringIO("\n".join(rows))).write_parquet(zip_path.with_suffix(".parquet"))
+            zip_path.unlink()
+            columnar_bars = aggregate_aggtrades_file(zip_path, "1m", batch_rows=4)
+            assert columnar_bars is not None and columnar_bars.equals(bars), "列式文件重建的K线与 ZIP 不一致"
+            assert aggregate_aggtrades_file(zip_path, "1m", batch_rows=4, time_ranges=window).equals(window_bars), \
+                "列式文件按时间范围聚合的K线与 ZIP 不一致"
+
+        logger.info("✓ 聚合成交重建K线测试通过")
+        return True
+
+    except Exception as e:
+        logger.error(f"✗ 聚合成交重建K线测试失败: {str(e)}", exc_info=True)
+        return False
+
+
+def test_tardis_trades():
+    """测试 Tardis 成交读取与K线聚合"""
+    logger.info("\n" + "="*60)
+    logger.info("测试 6: Tardis 成交读取")
+    logger.info("="*60)
+
+    try:
+        import gzip
+        import tempfile
+        from data_loader import iter_tardis_trades, load_tardis_trade_klines
+
+        # 1580515200000000 = 2020-02-01 00:00:00 UTC（微秒）
+        rows = [
+            "exchange,symbol,timestamp,local_timestamp,id,side,price,amount",
+            "binance-futures,BTCUSDT,1580515202342000,1580515202497052,1,buy,9364.51,1.0",
+            "binance-futures,BTCUSDT,1580515230000000,1580515230100000,2,sell,9360.00,2.0",
+            "binance-futures,BTCUSDT,1580515265000000,1580515265100000,3,buy,9370.00,0.5",
+        ]
+        with tempfile.TemporaryDirectory() as tmp:
+            tmp_dir = Path(tmp)
+            gz_path = tmp_dir / "BTCUSDT.csv.gz"
+            with gzip.open(gz_path, 'wt') as f:
+                f.write("\n".join(rows) + "\n")
+
+            batches = list(iter_tardis_trades(gz_path, batch_rows=2))
+            assert len(batches) == 2, "分批数量错误"
+            trades = pl.concat(batches)
+            assert trades["is_buyer_maker"].to_list() == [False, True, False], "side 映射错误"
+            assert trades["timestamp"].dtype == pl.Datetime("us"), "时间戳应为微秒精度"
+
+            bars = load_tardis_trade_klines(gz_path, "1m", batch_rows=2)
+            logger.info(f"聚合K线: {bars.shape}")
+            assert bars["open_time"].to_list() == [1580515200000, 1580515260000], "K线时间错误"
+            assert bars["volume"].to_list() == [3.0, 0.5], "成交量错误"
+            assert bars["taker_buy_volume"].to_list() == [1.0, 0.5], "主动买入量错误"
+            assert bars["count"].to_list() == [2, 1], "成交笔数错误"
+
+        logger.info("✓ Tardis 成交读取测试通过")
+        return True
+
+    except Exception as e:
+        logger.error(f"✗ Tardis 成交读取测试失败: {str(e)}", exc_info=True)
+        return False
+
+
+def test_monthly_klines():
+    """测试月度K线归档优先、日K线补充未结束月份"""
+    logger.info("\n" + "="*60)
+    logger.info("测试 7: 月度K线归档")
+    logger.info("="*60)
+
+    import config
+    saved_paths = (config.KLINE_MONTHLY_BASE_PATH, config.KLINE_BASE_PATH)
+
+    try:
+        import tempfile
+        import zipfile
+        from data_loader import load_date_range_data
+
+        with tempfile.TemporaryDirectory() as tmp:
+            tmp_dir = Path(tmp)
+            config.KLINE_MONTHLY_BASE_PATH = tmp_dir / "monthly"
+            config.KLINE_BASE_PATH = tmp_dir / "daily"
+            config.KLINE_MONTHLY_BASE_PATH.mkdir()
+            config.KLINE_BASE_PATH.mkdir()
+
+            def kline_row(open_time: int) -> str:
+                return f"{open_time},1,2,0.5,1.5,10,{open_time + 59_999},15,3,4,6,0"
+
+            # 2023-06 月度归档（无表头）：6 月 29 日、30 日各两根K线
+            # 1688083200000 = 2023-06-30 00:00:00 UTC
+            june_30 = 1688083200000
+            june_rows = [kline_row(t) for t in (june_30 - 86_400_000, june_30 - 86_340_000, june_30, june_30 + 60_000)]
+            with zipfile.ZipFile(config.KLINE_MONTHLY_BASE_PATH / "ETHUSDT-1m-2023-06.zip", 'w') as z:
+                z.writestr("ETHUSDT-1m-2023-06.csv", "\n".join(june_rows) + "\n")
+
+            # 7 月尚未结束，只有日K线文件（带表头）
+            header = "open_time,open,high,low,close,volume,close_time,quote_volume,count,taker_buy_volume,taker_buy_quote_volume,ignore"
+            with zipfile.ZipFile(config.KLINE_BASE_PATH / "ETHUSDT-1m-2023-07-01.zip", 'w') as z:
+                z.writestr("ETHUSDT-1m-2023-07-01.csv", header + "\n" + kline_row(june_30 + 86_400_000) + "\n")
+
+            _, kline_df = load_date_range_data("2023-06-30", "2023-07-02", data_type="kline")
+            logger.info(f"加载K线: {kline_df.shape}")
+            assert kline_df["date"].to_list() == ["2023-06-30", "2023-06-30", "2023-07-01"], "日期切片错误"
+            assert kline_df["open_time"].to_list() == [june_30, june_30 + 60_000, june_30 + 86_400_000], "K线时间错误"
+
+        logger.info("✓ 月度K线归档测试通过")
+        return True
+
+    except Exception as e:
+        logger.error(f"✗ 月度K线归档测试失败: {str(e)}", exc_info=True)
+        return False
+
+    finally:
+        config.KLINE_MONTHLY_BASE_PATH, config.KLINE_BASE_PATH = saved_paths
+
+
+def test_read_features():
+    """测试按时间范围读取多个重叠的因子输出文件"""
+    logger.info("\n" + "="*60)
+    logger.info("测试 8: 因子输出读取")
+    logger.info("="*60)
+
+    try:
+        import json
+        import tempfile
+        from config import FEATURES_MANIFEST_FILENAME
+        from feature_store import read_features
+
+        with tempfile.TemporaryDirectory() as tmp:
+            tmp_dir = Path(tmp)
+
+            # 单文件覆盖 6 月 1-2 日，按月文件覆盖整个 6 月，split 旧输出覆盖 7 月 1 日
+            make_minute_frame(datetime(2023, 6, 1), 2 * 1440, feature_a=1.0, feature_b=2.0).write_ipc(
+                tmp_dir / "features_20230601_20230603.feather")
+            make_minute_frame(datetime(2023, 6, 1), 30 * 1440, feature_a=1.0, feature_b=2.0).write_parquet(
+                tmp_dir / "features_202306.parquet")
+            make_minute_frame(datetime(2023, 7, 1), 1440, feature_a=1.0, feature_b=2.0).rename({"timestamp": "candle_begin_time"}).write_ipc(
+                tmp_dir / "split_20230701_20230701.feather")
+
+            df = read_features("2023-06-30", "2023-07-02", columns=["feature_a"], roots=[tmp_dir]).collect()
+            logger.info(f"读取结果: {df.shape}")
+            assert df.columns == ["timestamp", "feature_a"], "列投影错误"
+            assert len(df) == 2 * 1440, "行数错误"
+            assert df["timestamp"].is_sorted() and df["timestamp"].n_unique() == len(df), "时间未排序或有重复"
+
+            # 重叠的时间段只保留一份
+            df = read_features("2023-06-01", "2023-06-03", roots=[tmp_dir]).collect()
+            assert len(df) == 2 * 1440 and df["timestamp"].n_unique() == len(df), "重叠文件去重失败"
+
+            manifest = json.loads((tmp_dir / FEATURES_MANIFEST_FILENAME).read_text())
+            assert len(manifest) == 3, "清单条目数错误"
+            assert manifest["split_20230701_20230701.feather"]["time_column"] == "candle_begin_time"
+
+            # 不重叠的交易对不返回数据
+            assert read_features(symbols=["BTCUSDT"], roots=[tmp_dir]).collect().is_empty()
+
+        logger.info("✓ 因子输出读取测试通过")
+        return True
+
+    except Exception as e:
+        logger.error(f"✗ 因子输出读取测试失败: {str(e)}", exc_info=True)
+        return False
+
+
+def test_partitioned_output():
+    """测试 Hive 分区输出的写入、分区替换和读取"""
+    logger.info("\n" + "="*60)
+    logger.info("测试 9: Hive 分区输出")
+    logger.info("="*60)
+
+    try:
+        import tempfile
+        from feature_store import write_partitioned, read_features
+
+        with tempfile.TemporaryDirectory() as tmp:
+            tmp_dir = Path(tmp)
+
+            # 6 月 30 日到 7 月 1 日，跨两个分区，乱序写入
+            written = write_partitioned(make_minute_frame(datetime(2023, 6, 30), 2 * 1440, feature_a=1.0).reverse(), tmp_dir, "ETHUSDT")
+            assert [p.relative_to(tmp_dir).as_posix() for p in written] == [
+                "symbol=ETHUSDT/year=2023/month=06", "symbol=ETHUSDT/year=2023/month=07"], "分区路径错误"
+
+            part = pl.read_parquet(written[0] / "part-00000.parquet")
+            assert part["timestamp"].is_sorted(), "分区内未按时间排序"
+
+            # 重跑 7 月 1 日中午之后的数据：只替换该时间范围，分区内其余数据保留
+            write_partitioned(make_minute_frame(datetime(2023, 7, 1, 12), 720, feature_a=2.0), tmp_dir, "ETHUSDT")
+            july = pl.read_parquet(written[1] / "*.parquet")
+            assert len(july) == 1440 and july["timestamp"].is_sorted(), "分区替换行数错误"
+            assert july["feature_a"].sum() == 720 * 1.0 + 720 * 2.0, "分区替换数据错误"
+            assert not any(p.name.startswith(".") for p in written[1].parent.iterdir()), "残留临时目录"
+
+            df = read_features("2023-06-30", "2023-07-02", symbols=["ETHUSDT"], roots=[tmp_dir]).collect()
+            assert len(df) == 2 * 1440 and df["symbol"].unique().to_list() == ["ETHUSDT"], "分区读取错误"
+
+        logger.info("✓ Hive 分区输出测试通过")
+        return True
+
+    except Exception as e:
+        logger.error(f"✗ Hive 分区输出测试失败: {str(e)}", exc_info=True)
+        return False
+
+
+def test_matrix_export():
+    """测试 float32 训练矩阵导出与内存映射读取"""
+    logger.info("\n" + "="*60)
+    logger.info("测试 10: 训练矩阵导出")
+    logger.info("="*60)
+
+    try:
+        import tempfile
+        import numpy as np
+        from feature_matrix import export_feature_matrix, load_feature_matrix
+
+        with tempfile.TemporaryDirectory() as tmp:
+            tmp_dir = Path(tmp)
+            df = make_minute_frame(datetime(2023, 6, 30), 250, wap_1=np.arange(250, dtype=np.float64),
+                                   volume_imbalance=np.linspace(-1, 1, 250), other=0.0)
+
+            # 分块大小不整除行数，检查块边界
+            export_feature_matrix(df, tmp_dir / "features", columns=["volume_imbalance", "wap_1"], chunk_rows=64)
+            fm = load_feature_matrix(tmp_dir / "features")
+
+            assert isinstance(fm.matrix, np.memmap) and fm.matrix.dtype == np.float32, "矩阵类型错误"
+            assert fm.matrix.shape == (250, 2) and fm.matrix.flags["C_CONTIGUOUS"], "矩阵形状或内存布局错误"
+            assert fm.columns == ["volume_imbalance", "wap_1"], "列索引错误"
+            assert np.array_equal(fm.column("wap_1"), np.arange(250, dtype=np.float32)), "矩阵数据错误"
+            assert fm.timestamps[1] - fm.timestamps[0] == 60_000, "时间戳错误"
+            assert fm.timestamps[0] == 1688083200000, "起始时间戳错误"
+
+        logger.info("✓ 训练矩阵导出测试通过")
+        return True
+
+    except Exception as e:
+        logger.error(f"✗ 训练矩阵导出测试失败: {str(e)}", exc_info=True)
+        return False
+
+
+def test_window_iterator():
+    """测试滑动窗口迭代器（跨步视图、缺口、打乱、预取）"""
+    logger.info("\n" + "="*60)
+    logger.info("测试 11: 滑动窗口迭代器")
+    logger.info("="*60)
+
+    try:
+        import tempfile
+        import numpy as np
+        from feature_matrix import export_feature_matrix, load_feature_matrix, iter_windows
+
+        with tempfile.TemporaryDirectory() as tmp:
+            tmp_dir = Path(tmp)
+            # 删除第 40、41 分钟，制造一个缺口
+            keep = [i for i in range(100) if i not in (40, 41)]
+            df = make_minute_frame(datetime(2023, 6, 30), 100, wap_1=np.arange(100, dtype=np.float64),
+                                   volume_imbalance=-np.arange(100, dtype=np.float64))[keep]
+            export_feature_matrix(df, tmp_dir / "features", columns=["wap_1", "volume_imbalance"])
+            fm = load_feature_matrix(tmp_dir / "features")
+
+            windows = list(iter_windows(fm, 5))
+            # 缺口前 36 个窗口 (0..39)，缺口后 54 个窗口 (42..99)
+            assert len(windows) == 36 + 54, f"窗口数量错误: {len(windows)}"
+            assert windows[0].shape == (5, 2) and np.shares_memory(windows[0], fm.matrix), "窗口应为矩阵视图"
+            for w in windows:
+                assert np.all(np.diff(w[:, 0]) == 1), "窗口跨越了缺口"
+
+            batches = list(iter_windows(fm, 5, columns=["wap_1"], batch_size=16, shuffle=True, seed=7, prefetch=2))
+            assert [b.shape[0] for b in batches] == [16] * 5 + [10], "批次大小错误"
+            assert batches[0].shape[1:] == (5, 1), "选列后批次形状错误"
+            firsts = np.sort(np.concatenate([b[:, 0, 0] for b in batches]))
+            assert np.array_equal(firsts, np.sort([w[0, 0] for w in windows])), "打乱后窗口集合不一致"
+
+            # 提前退出不应阻塞后台预取线程
+            it = iter_windows(fm, 5, batch_size=1, prefetch=1)
+            next(it)
+            it.close()
+
+        logger.info("✓ 滑动窗口迭代器测试通过")
+        return True
+
+    except Exception as e:
+        logger.error(f"✗ 滑动窗口迭代器测试失败: {str(e)}", exc_info=True)
+        return False
+
+
+def test_lag_features():
+    """测试滞后需求：物化的滞后列与读取时的跨步视图一致"""
+    logger.info("\n" + "="*60)
+    logger.info("测试 12: 滞后因子")
+    logger.info("="*60)
+
+    try:
+        import tempfile
+        import numpy as np
+        from feature_calculator import calculate_lag_features, get_lag_column_name
+        import json
+        from feature_matrix import export_feature_matrix, load_feature_matrix, load_lag_views
+        from feature_store import write_feature_file, scan_feature_file, read_output_metadata, read_lag_spec
+        from split_features import write_slice
+
+        with tempfile.TemporaryDirectory() as tmp:
+            tmp_dir = Path(tmp)
+            df = make_minute_frame(datetime(2023, 6, 30), 50, wap_1=np.arange(50, dtype=np.float64),
+                                   volume_imbalance=np.linspace(-1, 1, 50))
+            lag_spec = {"wap_1": 3, "volume_imbalance": 2}
+
+            lagged = calculate_lag_features(df, lag_spec)
+            assert lagged.width == df.width + 5, "滞后列数量错误"
+            assert lagged[get_lag_column_name("wap_1", 3)][3] == 0.0, "滞后值错误"
+
+            # 元数据只记录导出的列
+            export_feature_matrix(df, tmp_dir / "features", columns=["wap_1", "volume_imbalance"],
+                                  lag_spec={**lag_spec, "other": 1})
+            fm = load_feature_matrix(tmp_dir / "features")
+            assert fm.lags == lag_spec, f"列索引中的滞后需求错误: {fm.lags}"
+
+            view = fm.lag_view("wap_1")
+            assert view.shape == (47, 4) and np.shares_memory(view, fm.matrix), "滞后视图应为矩阵视图"
+            expected = lagged.select(
+                ["wap_1"] + [get_lag_column_name("wap_1", i) for i in range(1, 4)]
+            ).slice(3).to_numpy().astype(np.float32)
+            assert np.array_equal(view, expected), "滞后视图与物化的滞后列不一致"
+
+            views = fm.lag_views()
+            assert views["wap_1"].shape[0] == views["volume_imbalance"].shape[0] == 47, "滞后视图未对齐"
+            assert views["volume_imbalance"][0, 0] == fm.column("volume_imbalance")[3], "滞后视图对齐错误"
+
+            # 因子输出（Parquet 写入文件元数据，IPC 写入旁路文件）读取时同样生成滞后视图；分割后保留滞后需求
+            metadata = {"lag_spec": json.dumps(lag_spec)}
+            for name in ("features.parquet", "features.feather"):
+                write_feature_file(df, tmp_dir / name, metadata)
+                assert read_lag_spec(tmp_dir / name) == lag_spec, f"{name} 的滞后需求错误"
+                file_views = load_lag_views(tmp_dir / name)
+                assert np.array_equal(file_views["wap_1"], views["wap_1"]), f"{name} 的滞后视图错误"
+                write_slice(scan_feature_file(tmp_dir / name), 10, 20, tmp_dir / f"split_{name}",
+                            "parquet" if name.endswith("parquet") else "ipc",
+                            metadata=read_output_metadata(tmp_dir / name))
+                assert read_lag_spec(tmp_dir / f"split_{name}") == lag_spec, f"分割后 {name} 的滞后需求丢失"
+
+        logger.info("✓ 滞后因子测试通过")
+        return True
+
+    except Exception as e:
+        logger.error(f"✗ 滞后因子测试失败: {str(e)}", exc_info=True)
+        return False
+
+
+def test_feature_stats():
+    """测试可合并的因子统计量（Welford 累加器）"""
+    logger.info("\n" + "="*60)
+    logger.info("测试 13: 因子统计量")
+    logger.info("="*60)
+
+    try:
+        import json
+        import tempfile
+        import numpy as np
+        from feature_stats import (
+            compute_daily_stats, merge_daily_stats, summarize_stats,
+            save_batch_stats, write_feature_stats, load_daily_stats
+        )
+        from split_features import write_split_stats, SPLIT_STATS_FILENAME
+        from config import FEATURE_STATS_FRAGMENT_DIR
+
+        with tempfile.TemporaryDirectory() as tmp:
+            tmp_dir = Path(tmp)
+            rows = 3 * 1440
+            rng = np.random.default_rng(0)
+            wap = rng.normal(100, 5, rows)
+            wap[10] = np.inf
+            df = make_minute_frame(datetime(2023, 6, 1), rows, wap_1=wap, volume_imbalance=rng.uniform(-1, 1, rows))
+
+            # 按天切分的批次：第 1 天和第 2-3 天；之后换批次边界重跑第 1-2 天（较新的文件），不应重复计数
+            import os
+            day_batches = [df.slice(0, 1440), df.slice(1440, rows - 1440)]
+            for i, batch in enumerate(day_batches):
+                save_batch_stats(compute_daily_stats(batch), f"batch_{i}", tmp_dir)
+            save_batch_stats(compute_daily_stats(df.slice(0, 2 * 1440)), "rerun", tmp_dir)
+            write_feature_stats(tmp_dir)
+            fragment_dir = tmp_dir / FEATURE_STATS_FRAGMENT_DIR
+            assert sorted(p.name for p in fragment_dir.glob("*.json")) == ["batch_1.json", "rerun.json"], \
+                "被完全覆盖的批次文件未删除"
+            # 旧文件的修改时间变化（复制、恢复）不影响新旧判断
+            os.utime(fragment_dir / "batch_1.json", ns=(2**62, 2**62))
+            write_feature_stats(tmp_dir)
+
+            daily = load_daily_stats(tmp_dir)
+            assert sorted(daily) == ["2023-06-01", "2023-06-02", "2023-06-03"], "按日统计的日期错误"
+            total = summarize_stats(daily)
+            finite = df.filter(pl.col("wap_1").is_finite())
+            assert total["wap_1"]["count"] == rows - 1, "非有限值应被排除"
+            assert abs(total["wap_1"]["mean"] - finite["wap_1"].mean()) < 1e-9, "均值错误"
+            assert abs(total["wap_1"]["std"] - finite["wap_1"].std()) < 1e-9, "标准差错误"
+            assert total["volume_imbalance"]["max"] == df["volume_imbalance"].max(), "最大值错误"
+
+            # 同一次运行中边界不对齐到天的批次，按日累加器合并后应与整体计算一致
+            batches = [df.slice(0, 1000), df.slice(1000, 2000), df.slice(3000, rows - 3000)]
+            merged = merge_daily_stats([compute_daily_stats(b) for b in batches])
+            assert abs(summarize_stats(merged)["wap_1"]["std"] - total["wap_1"]["std"]) < 1e-12, "合并顺序影响结果"
+
+            # 分段归一化参数只合并对应日期
+            write_split_stats(tmp_dir, [("split_0602.feather", datetime(2023, 6, 2), datetime(2023, 6, 2, 23, 59))], tmp_dir)
+            with open(tmp_dir / SPLIT_STATS_FILENAME) as f:
+                split_stats = json.load(f)
+            day2 = df.filter(pl.col("timestamp").dt.day() == 2)
+            assert split_stats["split_0602.feather"]["features"]["wap_1"]["count"] == len(day2), "分段行数错误"
+            assert abs(split_stats["split_0602.feather"]["features"]["volume_imbalance"]["mean"]
+                       - day2["volume_imbalance"].mean()) < 1e-9, "分段均值错误"
+
+        logger.info("✓ 因子统计量测试通过")
+        return True
+
+    except Exception as e:
+        logger.error(f"✗ 因子统计量测试失败: {str(e)}", exc_info=True)
+        return False
+
+
+def test_feature_sketch():
+    """测试分位数草图与流式统计"""
+    logger.info("\n" + "="*60)
+    logger.info("测试 14: 分位数草图")
+    logger.info("="*60)
+
+    try:
+        import tempfile
+        import numpy as np
+        from feature_sketch import QuantileSketch, load_sketches, population_stability_index
+        from test_results import FeatureValidator, DRIFT_PSI_THRESHOLD
+
+        rng = np.random.default_rng(0)
+        values = np.concatenate([rng.lognormal(0, 2, 50000), -rng.exponential(3, 20000), np.zeros(100)])
+
+        # 分两半分别建草图再合并，结果与一次建草图相同
+        merged = QuantileSketch().update(values[:30000]).merge(QuantileSketch().update(values[30000:]))
+        whole = QuantileSketch().update(values)
+        assert merged.to_dict() == whole.to_dict(), "合并后的草图与整体草图不一致"
+
+        qs = [0.01, 0.1, 0.5, 0.9, 0.99]
+        estimated = np.array(whole.quantiles(qs))
+        exact = np.quantile(values, qs, method="lower")
+        assert np.all(np.abs(estimated - exact) <= whole.relative_accuracy * np.abs(exact) + 1e-12), \
+            f"分位数误差超出相对精度: {estimated} vs {exact}"
+        assert whole.histogram([-np.inf, 0, np.inf]).sum() == whole.count, "直方图计数错误"
+
+        # 流式统计：每批 1000 行
+        with tempfile.TemporaryDirectory() as tmp:
+            tmp_dir = Path(tmp)
+            rows = 5000
+            wap = rng.normal(100, 1, rows)
+            df = make_minute_frame(datetime(2024, 1, 1), rows, wap_1=wap, volume_imbalance=rng.uniform(-1.1, 1, rows))
+            df.write_ipc(tmp_dir / "features.feather")
+
+            validator = FeatureValidator(tmp_dir / "features.feather", batch_rows=1000)
+            ranges = validator.check_data_ranges()
+            assert ranges["问题列表"][0]["影响行数"] == (df["volume_imbalance"] < -1).sum(), "范围检查计数错误"
+            stats = validator.check_statistics()
+            assert abs(stats["wap_1"]["均值"] - wap.mean()) < 1e-9, "流式均值错误"
+            assert abs(stats["wap_1"]["标准差"] - df["wap_1"].std()) < 1e-9, "流式标准差错误"
+            assert abs(stats["wap_1"]["p50"] - np.median(wap)) <= 0.01 * abs(np.median(wap)), "中位数错误"
+
+            # 草图保存后可直接用于漂移比较
+            path = validator.save_sketches()
+            saved = load_sketches(path)
+            assert population_stability_index(saved["wap_1"], validator.sketches["wap_1"]) < 1e-9, "相同分布的 PSI 应为 0"
+            shifted = QuantileSketch().update(wap + 5)
+            assert population_stability_index(saved["wap_1"], shifted) > 0.25, "明显漂移未被检出"
+
+            # 同一分布的不同样本（一天的分钟数）不应报告漂移
+            for seed in range(5):
+                sample_rng = np.random.default_rng(100 + seed)
+                first = QuantileSketch().update(sample_rng.normal(0, 1, 1440))
+                second = QuantileSketch().update(sample_rng.normal(0, 1, 1440))
+                assert population_stability_index(first, second) < DRIFT_PSI_THRESHOLD, "抽样噪声被报告为漂移"
+
+        logger.info("✓ 分位数草图测试通过")
+        return True
+
+    except Exception as e:
+        logger.error(f"✗ 分位数草图测试失败: {str(e)}", exc_info=True)
+        return False
+
+
+def test_fused_validation():
+    """测试单次扫描的融合验证与逐项检查结果一致"""
+    logger.info("\n" + "="*60)
+    logger.info("测试 15: 单次扫描验证")
+    logger.info("="*60)
+
+    try:
+        import tempfile
+        import numpy as np
+        from test_results import FeatureValidator
+
+        with tempfile.TemporaryDirectory() as tmp:
+            tmp_dir = Path(tmp)
+            rows = 3000
+            rng = np.random.default_rng(1)
+            wap = rng.normal(100, 1, rows)
+            wap[[5, 2500]] = np.inf
+            kmid = rng.normal(0, 1, rows)
+            df = make_minute_frame(datetime(2024, 1, 1), rows, bid1_price=rng.uniform(99, 100, rows),
+                                   ask1_price=rng.uniform(99.8, 101, rows), wap_1=wap,
+                                   kmid=pl.Series(kmid).scatter([0, 1, 2], None))
+            times = df["timestamp"]
+            # 交换两个时间点，文件不再有序
+            df = df.with_columns(times.scatter([1500, 1501], [times[1501], times[1500]]))
+            df.write_parquet(tmp_dir / "features.parquet")
+
+            def run_checks(validator):
+                return (validator.check_basic_info()["行数"], validator.check_null_values(),
+                        validator.check_data_ranges(), validator.check_statistics(), validator.check_time_continuity())
+
+            # 融合扫描：文件只读取一遍
+            fused = FeatureValidator(tmp_dir / "features.parquet", batch_rows=700)
+            scans = []
+            iter_batches = fused.iter_batches
+            fused.iter_batches = lambda *args, **kwargs: scans.append(1) or iter_batches(*args, **kwargs)
+            fused.scan_file()
+            fused_results = run_checks(fused)
+            assert len(scans) == 1, f"融合验证扫描了 {len(scans)} 次"
+
+            # 逐项检查：每项只扫描自己需要的部分
+            separate_results = run_checks(FeatureValidator(tmp_dir / "features.parquet", batch_rows=1000))
+            assert fused_results[:3] == separate_results[:3], "融合扫描与逐项检查的结果不一致"
+            assert fused_results[4] == separate_results[4], "时间检查结果不一致"
+            for col, stats in fused_results[3].items():
+                for key, value in stats.items():
+                    assert abs(value - separate_results[3][col][key]) < 1e-9, f"{col} 的 {key} 不一致"
+
+            # 只统计行数时不扫描数据列
+            counting = FeatureValidator(tmp_dir / "features.parquet")
+            counting.iter_batches = lambda *args, **kwargs: (_ for _ in ()).throw(AssertionError("统计行数时扫描了数据"))
+            assert counting.check_basic_info()["行数"] == rows, "行数错误"
+
+            rows_, nulls, ranges, stats, time_info = fused_results
+            assert rows_ == rows and nulls["总空值数"] == 3, "行数或空值数错误"
+            issues = {issue["问题"]: issue["影响行数"] for issue in ranges["问题列表"]}
+            assert issues["bid1_price >= ask1_price"] == (df["bid1_price"] >= df["ask1_price"]).sum(), "价差检查错误"
+            assert issues["wap_1 存在无穷值"] == 2, "无穷值检查错误"
+            assert abs(stats["kmid"]["均值"] - df["kmid"].mean()) < 1e-9, "均值错误"
+            assert time_info["是否有序"] is False and time_info["结束时间"] == str(times[-1]), "时间检查错误"
+
+        logger.info("✓ 单次扫描验证测试通过")
+        return True
+
+    except Exception as e:
+        logger.error(f"✗ 单次扫描验证测试失败: {str(e)}", exc_info=True)
+        return False
+
+
+def test_parallel_validation():
+    """测试多文件并行验证与汇总"""
+    logger.info("\n" + "="*60)
+    logger.info("测试 16: 多文件并行验证")
+    logger.info("="*60)
+
+    try:
+        import tempfile
+        import numpy as np
+        from test_results import validate_files, save_summary, SUMMARY_REPORT_FILENAME
+
+        with tempfile.TemporaryDirectory() as tmp:
+            tmp_dir = Path(tmp)
+            rng = np.random.default_rng(2)
+            frames = []
+            # 三个文件：第一个文件内缺 5 分钟，第二、三个文件之间缺 30 分钟
+            for name, start, rows in [("a", datetime(2024, 1, 1), 600),
+                                      ("b", datetime(2024, 1, 1, 10), 600),
+                                      ("c", datetime(2024, 1, 1, 20, 30), 600)]:
+                df = make_minute_frame(start, rows, bid1_price=rng.uniform(99, 100, rows),
+                                       ask1_price=rng.uniform(99.8, 101, rows), wap_1=rng.normal(100, 1, rows),
+                                       kmid=pl.Series(rng.normal(0, 1, rows)).scatter([0], None))
+                if name == "a":
+                    df = df.filter((pl.col("timestamp") < start + timedelta(minutes=100)) |
+                                   (pl.col("timestamp") > start + timedelta(minutes=104)))
+                df.write_parquet(tmp_dir / f"{name}.parquet")
+                frames.append(df)
+            full = pl.concat(frames)
+            files = sorted(tmp_dir.glob("*.parquet"))
+
+            sequential = validate_files(files, workers=1, batch_rows=250)
+            parallel = validate_files(files, workers=2, batch_rows=250)
+
+            for merged in (sequential, parallel):
+                assert merged["rows"] == len(full), "行数错误"
+                assert merged["nulls"]["kmid"] == 3, "空值数错误"
+                assert merged["ranges"]["bid1_price >= ask1_price"] == (full["bid1_price"] >= full["ask1_price"]).sum(), \
+                    "范围违规数错误"
+                assert [(name, gap[-1]) for name, *gap in merged["gaps"]] == [("a.parquet", 5)], "文件内缺口错误"
+                assert [(prev, cur, gap[-1]) for prev, cur, *gap in merged["boundary_gaps"]] == \
+                    [("b.parquet", "c.parquet", 30)], "文件之间缺口错误"
+                assert abs(merged["statistics"]["wap_1"].mean - full["wap_1"].mean()) < 1e-9, "合并均值错误"
+                assert abs(merged["statistics"]["wap_1"].std - full["wap_1"].std()) < 1e-9, "合并标准差错误"
+                assert merged["sketches"]["wap_1"].count == len(full), "合并草图计数错误"
+
+            assert parallel["files"] == sequential["files"] and parallel["gaps"] == sequential["gaps"], \
+                "并行与顺序验证结果不一致"
+
+            report_path = save_summary(parallel, tmp_dir)
+            assert report_path.name == SUMMARY_REPORT_FILENAME and "缺失 30 个" in report_path.read_text(encoding="utf-8"), \
+                "汇总报告错误"
+
+        logger.info("✓ 多文件并行验证测试通过")
+        return True
+
+    except Exception as e:
+        logger.error(f"✗ 多文件并行验证测试失败: {str(e)}", exc_info=True)
+        return False
+
+
+def test_gap_index():
+    """测试时间缺口索引（检测、合并、窗口跳过缺口、批次索引合并）"""
+    logger.info("\n" + "="*60)
+    logger.info("测试 17: 时间缺口索引")
+    logger.info("="*60)
+
+    try:
+        import tempfile
+        import numpy as np
+        from gap_index import GapIndex, merge_gap_indexes, save_batch_gaps, write_gap_index, load_gap_index
+        from config import GAP_INDEX_FRAGMENT_DIR
+        from feature_matrix import valid_window_starts, export_feature_matrix, load_feature_matrix
+
+        interval = 60_000
+        rng = np.random.default_rng(3)
+        # 随机删除约 5% 的分钟
+        minutes = np.flatnonzero(rng.random(5000) > 0.05)
+        timestamps = minutes.astype(np.int64) * interval
+        index = GapIndex.from_timestamps(timestamps, interval)
+
+        missing = np.setdiff1d(np.arange(minutes[0], minutes[-1] + 1), minutes)
+        assert index.total_missing == len(missing), "缺失分钟数错误"
+        assert np.array_equal(index.missing, np.diff(minutes)[np.diff(minutes) > 1] - 1), "缺口长度错误"
+        assert GapIndex.from_timestamps(rng.permutation(timestamps), interval).to_dict() == index.to_dict(), \
+            "无序输入的缺口错误"
+        assert GapIndex.from_dict(index.to_dict()).to_dict() == index.to_dict(), "序列化错误"
+
+        # 按缺口索引选窗口起点与逐窗口比较首尾的结果一致
+        for window in (1, 5, 30):
+            assert np.array_equal(valid_window_starts(timestamps, window, interval, index),
+                                  valid_window_starts(timestamps, window, interval)), f"窗口 {window} 起点不一致"
+
+        # 区间是否跨越缺口
+        starts = timestamps[:-10]
+        ends = starts + 9 * interval
+        expected = np.isin(minutes[:-10, None] + np.arange(10), missing).any(axis=1)
+        assert np.array_equal(index.contains_gap(starts, ends), expected), "区间缺口判断错误"
+        first_gap = int(index.starts[0])
+        assert index.next_window_start(first_gap, 2) == int(index.ends[0]), "下一个窗口起点错误"
+
+        # 分段（含重叠的预热数据）合并后与整体检测一致
+        parts = [timestamps[:2000], timestamps[1900:3500], timestamps[3500:]]
+        merged = merge_gap_indexes(GapIndex.from_timestamps(p, interval) for p in parts)
+        assert merged.to_dict() == index.to_dict(), "分段合并的缺口错误"
+
+        # 批次索引合并为 gap_index.json，训练矩阵导出缺口索引
+        with tempfile.TemporaryDirectory() as tmp:
+            tmp_dir = Path(tmp)
+            for i, p in enumerate(parts):
+                save_batch_gaps({"input": GapIndex.from_timestamps(p, interval)}, f"batch{i}", tmp_dir)
+            write_gap_index(tmp_dir)
+            assert load_gap_index(tmp_dir)["input"].to_dict() == index.to_dict(), "批次索引合并错误"
+
+            # 重跑中间批次后数据少了一分钟：被覆盖的旧批次文件删除，不再以并集掩盖新的缺口
+            rerun = np.delete(parts[1], 600)
+            save_batch_gaps({"input": GapIndex.from_timestamps(rerun, interval)}, "rerun", tmp_dir)
+            write_gap_index(tmp_dir)
+            assert not (tmp_dir / GAP_INDEX_FRAGMENT_DIR / "batch1.json").exists(), "被覆盖的批次索引未删除"
+            expected = GapIndex.from_timestamps(np.setdiff1d(timestamps, parts[1][600]), interval)
+            assert load_gap_index(tmp_dir)["input"].to_dict() == expected.to_dict(), "重跑批次的缺口错误"
+
+            df = pl.DataFrame({
+                "timestamp": pl.Series(timestamps).cast(pl.Datetime("ms")),
+                "wap_1": minutes.astype(np.float64)
+            })
+            export_feature_matrix(df, tmp_dir / "features", columns=["wap_1"])
+            fm = load_feature_matrix(tmp_dir / "features")
+            assert fm.gaps is not None and fm.gaps.to_dict() == index.to_dict(), "训练矩阵的缺口索引错误"
+
+        logger.info("✓ 时间缺口索引测试通过")
+        return True
+
+    except Exception as e:
+        logger.error(f"✗ 时间缺口索引测试失败: {str(e)}", exc_info=True)
+        return False
+
+
 def test_integration():
     """集成测试：完整流程测试"""
     logger.info("\n" + "="*60)
@@ -314,7 +1068,20 @@ def main():
         "配置模块": test_config(),
         "数据加载模块": test_data_loader(),
         "因子计算模块": test_feature_calculator(),
-        "集成测试": test_integration()
+        "集成测试": test_integration(),
+        "聚合成交重建K线": test_aggtrades_klines(),
+        "Tardis 成交读取": test_tardis_trades(),
+        "月度K线归档": test_monthly_klines(),
+        "因子输出读取": test_read_features(),
+        "Hive 分区输出": test_partitioned_output(),
+        "训练矩阵导出": test_matrix_export(),
+        "滑动窗口迭代器": test_window_iterator(),
+        "滞后因子": test_lag_features(),
+        "因子统计量": test_feature_stats(),
+        "分位数草图": test_feature_sketch(),
+        "单次扫描验证": test_fused_validation(),
+        "多文件并行验证": test_parallel_validation(),
+        "时间缺口索引": test_gap_index()
     }
 
     # 输出测试总结
@@ -5,15 +5,25 @@
 
 import polars as pl
 import logging
+import multiprocessing
+from datetime import datetime, timedelta
 from pathlib import Path
+from concurrent.futures import ProcessPoolExecutor
 from typing import Dict, List, Tuple, Optional
 import sys
 
 from config import (
     FEATURES_OUTPUT_DIR,
     OUTPUT_FORMAT,
+    VALIDATION_BATCH_ROWS,
+    VALIDATION_QUANTILES,
+    TIMEFRAME,
+    TIMEFRAME_MS,
     get_feature_columns
 )
+from feature_stats import RunningStats, finite_values, running_stats_exprs, running_stats_from_row
+from gap_index import GapIndex, merge_gap_indexes, save_gap_index
+from feature_sketch import QuantileSketch, update_sketches, merge_sketches, save_sketches, load_sketches, compare_sketches
 
 
 # 配置日志
@@ -23,52 +33,213 @@ logging.basicConfig(
 )
 logger = logging.getLogger(__name__)
 
+# PSI 超过该值的列在报告中列为分布漂移
+DRIFT_PSI_THRESHOLD = 0.25
+
+# 相邻时间点的预期间隔，超过即为缺口
+EXPECTED_INTERVAL = timedelta(milliseconds=TIMEFRAME_MS[TIMEFRAME])
+
+# 报告中最多列出的缺口数
+REPORT_MAX_GAPS = 10
+
+# 多文件验证的汇总报告文件名
+SUMMARY_REPORT_FILENAME = "validation_summary.txt"
+
+
+def make_gap(start: datetime, end: datetime) -> Tuple[datetime, datetime, int]:
+    """
+    缺口 (缺口前最后一个时间点, 缺口后第一个时间点, 缺失的时间点数)
+    """
+    return (start, end, int((end - start) / EXPECTED_INTERVAL) - 1)
+
 
 class FeatureValidator:
-    """特征数据验证器"""
+    """
+    特征数据验证器
+
+    数据相关的检查（行数、空值、数据范围、统计信息、时间范围）编译为每批一次的聚合，
+    run_all_checks 只流式扫描文件一遍；单独调用某个检查时只扫描该检查需要的部分。
+    """
+
+    # 一次扫描可以计算的部分
+    SCAN_PARTS = ("nulls", "ranges", "statistics", "time")
 
-    def __init__(self, file_path: Path):
+    def __init__(self, file_path: Path, batch_rows: int = VALIDATION_BATCH_ROWS):
         """
         初始化验证器
 
         Args:
             file_path: 特征数据文件路径
+            batch_rows: 流式检查时每批读取的行数
         """
         self.file_path = file_path
-        self.df: Optional[pl.DataFrame] = None
+        self.batch_rows = batch_rows
         self.validation_results = {}
+        self.sketches = {}
+        self._schema: Optional[pl.Schema] = None
+        self._scan_results = {}
+
+    def scan(self) -> pl.LazyFrame:
+        """按文件格式懒加载"""
+        if self.file_path.suffix == ".parquet":
+            return pl.scan_parquet(self.file_path)
+        elif self.file_path.suffix in (".feather", ".ipc", ".arrow"):
+            return pl.scan_ipc(self.file_path)
+        elif self.file_path.suffix == ".csv":
+            return pl.scan_csv(self.file_path)
+        raise ValueError(f"不支持的文件格式: {self.file_path.suffix}")
+
+    @property
+    def schema(self) -> pl.Schema:
+        """文件的列名和类型（只读取元数据）"""
+        if self._schema is None:
+            self._schema = self.scan().collect_schema()
+        return self._schema
+
+    def iter_batches(self, columns: Optional[List[str]] = None):
+        """
+        按批流式读取（每批最多 self.batch_rows 行）
+
+        Args:
+            columns: 只读取这些列，默认全部列
 
-    def load_data(self) -> bool:
+        Yields:
+            pl.DataFrame
         """
-        加载数据
+        lf = self.scan()
+        if columns is not None:
+            lf = lf.select(columns)
+        yield from lf.collect_batches(chunk_size=self.batch_rows)
 
-        Returns:
-            是否加载成功
+    def _range_checks(self) -> Dict[str, pl.Expr]:
+        """数据范围检查：问题描述 -> 违规行的布尔表达式"""
+        schema = self.schema
+        checks = {}
+
+        # 检查 bid1_price < ask1_price
+        if 'bid1_price' in schema and 'ask1_price' in schema:
+            checks["bid1_price >= ask1_price"] = pl.col("bid1_price") >= pl.col("ask1_price")
+
+        # 检查 volume_imbalance 范围 [-1, 1]
+        if 'volume_imbalance' in schema:
+            checks["volume_imbalance 超出 [-1, 1]"] = (
+                (pl.col("volume_imbalance") < -1) | (pl.col("volume_imbalance") > 1)
+            )
+
+        # 检查价格是否为正（排除对数收益率和趋势因子，因为它们可以为负）
+        price_columns = [col for col in schema
+                        if 'price' in col.lower()
+                        and 'log_return' not in col.lower()
+                        and 'trend' not in col.lower()]
+        for col in price_columns:
+            checks[f"{col} 存在非正值"] = pl.col(col) <= 0
+
+        return checks
+
+    def _inf_checks(self) -> Dict[str, pl.Expr]:
+        """无穷值检查：问题描述 -> 无穷值的布尔表达式"""
+        return {
+            f"{col} 存在无穷值": pl.col(col).is_infinite()
+            for col, dtype in self.schema.items() if dtype in (pl.Float32, pl.Float64)
+        }
+
+    def scan_file(self, parts: Tuple[str, ...] = SCAN_PARTS) -> Dict:
         """
-        try:
-            logger.info(f"加载数据文件: {self.file_path}")
-
-            if not self.file_path.exists():
-                logger.error(f"文件不存在: {self.file_path}")
-                return False
-
-            # 根据文件格式加载
-            if self.file_path.suffix == ".parquet":
-                self.df = pl.read_parquet(self.file_path)
-            elif self.file_path.suffix == ".feather":
-                self.df = pl.read_ipc(self.file_path)
-            elif self.file_path.suffix == ".csv":
-                self.df = pl.read_csv(self.file_path)
-            else:
-                logger.error(f"不支持的文件格式: {self.file_path.suffix}")
-                return False
-
-            logger.info(f"数据加载成功: {self.df.shape[0]} 行 × {self.df.shape[1]} 列")
-            return True
+        流式扫描文件一遍，同时计算 parts 中各部分的结果
 
-        except Exception as e:
-            logger.error(f"加载数据失败: {str(e)}")
-            return False
+        每批数据只执行一次 select（空值数、各范围检查的违规行数、数值列的累加器、时间最值和缺口），
+        分位数草图和缺口索引在同一批数据上更新。时间列不排序，只检查批内和批间是否有序；
+        各批的缺口索引按覆盖的时间段合并，文件无序时缺口也正确。
+
+        Args:
+            parts: "nulls"、"ranges"、"statistics"、"time" 的子集
+
+        Returns:
+            各部分的原始统计，同时缓存供 check_* 使用
+        """
+        schema = self.schema
+        has_time = "timestamp" in schema
+        range_checks = {**self._range_checks(), **self._inf_checks()} if "ranges" in parts else {}
+        stat_columns = [col for col, dtype in schema.items() if dtype.is_numeric()] if "statistics" in parts else []
+
+        exprs = []
+        if "nulls" in parts:
+            exprs += [pl.col(col).null_count().alias(f"null:{col}") for col in schema]
+        exprs += [expr.sum().alias(f"range:{name}") for name, expr in range_checks.items()]
+        # 有限值列只计算一次，各累加器的聚合直接使用
+        finite_columns = [finite_values(col).alias(f"finite:{col}") for col in stat_columns]
+        for col in stat_columns:
+            exprs += running_stats_exprs(f"finite:{col}", f"stat:{col}", finite=True)
+        if "time" in parts and has_time:
+            exprs += [
+                pl.col("timestamp").min().alias("time:min"),
+                pl.col("timestamp").max().alias("time:max"),
+                pl.col("timestamp").first().alias("time:first"),
+                pl.col("timestamp").last().alias("time:last"),
+                pl.col("timestamp").is_sorted().alias("time:sorted"),
+            ]
+
+        rows = 0
+        nulls = dict.fromkeys(schema, 0)
+        violations = dict.fromkeys(range_checks, 0)
+        accumulators = {col: RunningStats() for col in stat_columns}
+        sketches = {}
+        time_min = time_max = first = last = None
+        time_sorted = True
+        batch_gaps = []
+
+        for batch in self.iter_batches():
+            rows += len(batch)
+            if len(batch) == 0:
+                continue
+            if finite_columns:
+                batch = batch.with_columns(finite_columns)
+            row = batch.select(exprs).row(0, named=True) if exprs else {}
+
+            for col in nulls:
+                nulls[col] += row.get(f"null:{col}", 0)
+            for name in violations:
+                violations[name] += row[f"range:{name}"] or 0
+
+            if "time:min" in row and row["time:min"] is not None:
+                time_min = row["time:min"] if time_min is None else min(time_min, row["time:min"])
+                time_max = row["time:max"] if time_max is None else max(time_max, row["time:max"])
+                if not row["time:sorted"] or (last is not None and row["time:first"] is not None
+                                              and row["time:first"] < last):
+                    time_sorted = False
+                batch_gaps.append(GapIndex.from_timestamps(batch["timestamp"]))
+                first = row["time:first"] if first is None else first
+                last = row["time:last"] if row["time:last"] is not None else last
+
+            for col in stat_columns:
+                accumulators[col].merge(running_stats_from_row(row, f"stat:{col}"))
+            if stat_columns:
+                update_sketches(sketches, batch.select([pl.col(f"finite:{col}").alias(col) for col in stat_columns]),
+                                stat_columns)
+
+        self._scan_results["rows"] = rows
+        if "nulls" in parts:
+            self._scan_results["nulls"] = nulls
+        if "ranges" in parts:
+            self._scan_results["ranges"] = violations
+        if "statistics" in parts:
+            self._scan_results["statistics"] = accumulators
+            self.sketches = sketches
+        if "time" in parts and has_time:
+            gap_index = merge_gap_indexes(batch_gaps)
+            self._scan_results["time"] = {
+                "min": time_min, "max": time_max, "first": first, "last": last,
+                "sorted": time_sorted, "gaps": gap_index.gaps(), "gap_index": gap_index.to_dict()
+            }
+        return self._scan_results
+
+    def _scanned(self, part: str):
+        """取某部分的扫描结果，尚未扫描时只扫描这一部分（只要行数时不读取数据列）"""
+        if part == "rows" and part not in self._scan_results:
+            self._scan_results["rows"] = self.scan().select(pl.len()).collect().item()
+        elif part not in self._scan_results:
+            self.scan_file((part,) if part in self.SCAN_PARTS else ())
+        return self._scan_results.get(part)
 
     def check_basic_info(self) -> Dict:
         """
@@ -82,10 +253,10 @@ class FeatureValidator:
         logger.info("="*60)
 
         info = {
-            "行数": len(self.df),
-            "列数": len(self.df.columns),
+            "行数": self._scanned("rows"),
+            "列数": len(self.schema),
             "文件大小": f"{self.file_path.stat().st_size / (1024*1024):.2f} MB",
-            "列名": self.df.columns
+            "列名": list(self.schema)
         }
 
         logger.info(f"数据行数: {info['行数']:,}")
@@ -114,7 +285,7 @@ class FeatureValidator:
 
         missing_columns = []
         for col in required_columns:
-            if col not in self.df.columns:
+            if col not in self.schema:
                 missing_columns.append(col)
 
         if missing_columns:
@@ -138,9 +309,9 @@ class FeatureValidator:
         logger.info("="*60)
 
         expected_features = get_feature_columns()
-        existing_features = [col for col in expected_features if col in self.df.columns]
-        missing_features = [col for col in expected_features if col not in self.df.columns]
-        logger.info(f"数据前100行: {self.df.head(200)}")
+        existing_features = [col for col in expected_features if col in self.schema]
+        missing_features = [col for col in expected_features if col not in self.schema]
+        logger.debug(f"数据前5行: {self.scan().head(5).collect()}")
         result = {
             "预期因子数": len(expected_features),
             "实际因子数": len(existing_features),
@@ -171,15 +342,15 @@ class FeatureValidator:
         logger.info("4. 空值检查")
         logger.info("="*60)
 
-        null_counts = self.df.null_count()
-        total_nulls = sum(null_counts.row(0))
+        null_counts = self._scanned("nulls")
+        rows = self._scanned("rows")
+        total_nulls = sum(null_counts.values())
 
         # 找出有空值的列
         columns_with_nulls = []
-        for col in self.df.columns:
-            null_count = self.df[col].null_count()
+        for col, null_count in null_counts.items():
             if null_count > 0:
-                null_pct = (null_count / len(self.df)) * 100
+                null_pct = (null_count / rows) * 100
                 columns_with_nulls.append({
                     "列名": col,
                     "空值数": null_count,
@@ -224,64 +395,22 @@ class FeatureValidator:
         logger.info("5. 数据范围检查")
         logger.info("="*60)
 
-        issues = []
-
-        # 检查 bid1_price < ask1_price
-        if 'bid1_price' in self.df.columns and 'ask1_price' in self.df.columns:
-            invalid_spread = self.df.filter(pl.col("bid1_price") >= pl.col("ask1_price"))
-            if len(invalid_spread) > 0:
-                issues.append({
-                    "问题": "bid1_price >= ask1_price",
-                    "影响行数": len(invalid_spread),
-                    "比例": f"{len(invalid_spread)/len(self.df)*100:.2f}%"
-                })
-                logger.error(f"发现 {len(invalid_spread)} 行数据 bid1_price >= ask1_price ✗")
-            else:
-                logger.info("bid1_price < ask1_price 检查通过 ✓")
+        counts = self._scanned("ranges")
+        rows = self._scanned("rows")
+        inf_checks = self._inf_checks()
 
-        # 检查 volume_imbalance 范围 [-1, 1]
-        if 'volume_imbalance' in self.df.columns:
-            out_of_range = self.df.filter(
-                (pl.col("volume_imbalance") < -1) | (pl.col("volume_imbalance") > 1)
-            )
-            if len(out_of_range) > 0:
-                issues.append({
-                    "问题": "volume_imbalance 超出 [-1, 1]",
-                    "影响行数": len(out_of_range),
-                    "比例": f"{len(out_of_range)/len(self.df)*100:.2f}%"
-                })
-                logger.error(f"发现 {len(out_of_range)} 行 volume_imbalance 超出范围 ✗")
-            else:
-                logger.info("volume_imbalance 范围检查通过 ✓")
-
-        # 检查价格是否为正（排除对数收益率和趋势因子，因为它们可以为负）
-        price_columns = [col for col in self.df.columns
-                        if 'price' in col.lower()
-                        and 'log_return' not in col.lower()
-                        and 'trend' not in col.lower()]
-        for col in price_columns:
-            negative_count = self.df.filter(pl.col(col) <= 0).shape[0]
-            if negative_count > 0:
+        issues = []
+        for name, count in counts.items():
+            if count > 0:
                 issues.append({
-                    "问题": f"{col} 存在非正值",
-                    "影响行数": negative_count,
-                    "比例": f"{negative_count/len(self.df)*100:.2f}%"
+                    "问题": name,
+                    "影响行数": count,
+                    "比例": f"{count/max(rows, 1)*100:.2f}%"
                 })
-                logger.error(f"{col} 存在 {negative_count} 个非正值 ✗")
-
-        # 检查无穷值
-        inf_count = 0
-        for col in self.df.columns:
-            if self.df[col].dtype in [pl.Float32, pl.Float64]:
-                inf_in_col = self.df.filter(pl.col(col).is_infinite()).shape[0]
-                if inf_in_col > 0:
-                    inf_count += inf_in_col
-                    issues.append({
-                        "问题": f"{col} 存在无穷值",
-                        "影响行数": inf_in_col,
-                        "比例": f"{inf_in_col/len(self.df)*100:.2f}%"
-                    })
+                if name not in inf_checks:
+                    logger.error(f"{name}: {count} 行 ✗")
 
+        inf_count = sum(counts[name] for name in inf_checks)
         if inf_count > 0:
             logger.error(f"发现 {inf_count} 个无穷值 ✗")
         else:
@@ -299,6 +428,9 @@ class FeatureValidator:
         """
         计算统计信息
 
+        每列维护可合并的累加器（均值/标准差/最小/最大）和分位数草图，内存与文件大小无关。
+        草图保存在 self.sketches，可用 save_sketches 保存用于分布漂移比较。
+
         Returns:
             统计信息
         """
@@ -306,7 +438,21 @@ class FeatureValidator:
         logger.info("6. 统计信息")
         logger.info("="*60)
 
+        accumulators = self._scanned("statistics")
+
         stats = {}
+        for col, acc in accumulators.items():
+            if acc.count == 0:
+                continue
+            stats[col] = {
+                "均值": acc.mean,
+                "标准差": acc.std,
+                "最小值": acc.min,
+                "最大值": acc.max
+            }
+            quantiles = self.sketches[col].quantiles(VALIDATION_QUANTILES)
+            for q, value in zip(VALIDATION_QUANTILES, quantiles):
+                stats[col][f"p{q * 100:g}"] = value
 
         # 关键因子的统计
         key_features = [
@@ -316,26 +462,66 @@ class FeatureValidator:
 
         logger.info("\n关键因子统计:")
         for feat in key_features:
-            if feat in self.df.columns:
-                col_stats = self.df[feat].describe()
-                stats[feat] = {
-                    "均值": float(self.df[feat].mean()),
-                    "标准差": float(self.df[feat].std()),
-                    "最小值": float(self.df[feat].min()),
-                    "最大值": float(self.df[feat].max())
-                }
+            if feat in stats:
                 logger.info(f"\n{feat}:")
                 logger.info(f"  均值: {stats[feat]['均值']:.6f}")
-                logger.info(f"  标准差: {stats[feat]['标准差']:.6f}")
+                if stats[feat]['标准差'] is not None:
+                    logger.info(f"  标准差: {stats[feat]['标准差']:.6f}")
                 logger.info(f"  范围: [{stats[feat]['最小值']:.6f}, {stats[feat]['最大值']:.6f}]")
+                logger.info("  分位数: " + ", ".join(
+                    f"p{q * 100:g}={stats[feat][f'p{q * 100:g}']:.6f}" for q in VALIDATION_QUANTILES))
 
         self.validation_results['statistics'] = stats
         return stats
 
+    def save_sketches(self) -> Optional[Path]:
+        """
+        保存各列的分位数草图（<文件名>_sketches.json）
+
+        Returns:
+            草图文件路径，尚未计算统计信息时为 None
+        """
+        if not self.sketches:
+            return None
+        path = self.file_path.parent / f"{self.file_path.stem}_sketches.json"
+        save_sketches(path, self.sketches, self.file_path.name)
+        logger.info(f"分位数草图已保存到: {path}")
+        return path
+
+    def check_drift(self, baseline_path: Path) -> Dict:
+        """
+        与基准草图（例如上个月输出的 _sketches.json）比较分布漂移
+
+        Args:
+            baseline_path: 基准草图文件
+
+        Returns:
+            {列名: {"psi": PSI, "baseline": 基准分位数, "current": 当前分位数}}
+        """
+        logger.info("\n" + "="*60)
+        logger.info("分布漂移检查")
+        logger.info("="*60)
+
+        drift = compare_sketches(load_sketches(baseline_path), self.sketches, VALIDATION_QUANTILES)
+        drifted = {col: d for col, d in drift.items() if d["psi"] is not None and d["psi"] > DRIFT_PSI_THRESHOLD}
+        for col, d in sorted(drifted.items(), key=lambda item: -item[1]["psi"]):
+            logger.warning(f"{col}: PSI={d['psi']:.3f}")
+        if not drifted:
+            logger.info(f"所有列 PSI <= {DRIFT_PSI_THRESHOLD} ✓")
+
+        self.validation_results['drift'] = {
+            "基准": str(baseline_path),
+            "漂移列": sorted(drifted, key=lambda col: -drifted[col]["psi"]),
+            "详情": drift
+        }
+        return drift
+
     def check_time_continuity(self) -> Dict:
         """
         检查时间连续性
 
+        缺口来自扫描时各批的缺口索引（一次 diff），列出缺口前后的时间点和缺失的时间点数。
+
         Returns:
             时间连续性检查结果
         """
@@ -343,30 +529,35 @@ class FeatureValidator:
         logger.info("7. 时间连续性检查")
         logger.info("="*60)
 
-        if 'timestamp' not in self.df.columns:
+        if 'timestamp' not in self.schema:
             logger.warning("没有 timestamp 列，跳过时间连续性检查")
             return {}
 
-        # 计算时间差
-        df_sorted = self.df.sort("timestamp")
-        time_diffs = df_sorted["timestamp"].diff()
-
-        # 统计时间间隔
-        expected_interval = pl.duration(minutes=1)
+        time_range = self._scanned("time")
+        rows = self._scanned("rows")
 
-        # 找出异常间隔
-        if len(time_diffs) > 1:
-            # 跳过第一个（因为diff的第一个值是null）
-            non_null_diffs = time_diffs[1:]
+        gaps = time_range["gaps"]
+        missing = sum(gap[2] for gap in gaps)
 
-            # 注意：这里需要根据实际数据类型调整
-            logger.info(f"总时间点数: {len(df_sorted)}")
-            logger.info(f"时间范围: {df_sorted['timestamp'].min()} 至 {df_sorted['timestamp'].max()}")
+        logger.info(f"总时间点数: {rows}")
+        logger.info(f"时间范围: {time_range['min']} 至 {time_range['max']}")
+        if not time_range["sorted"]:
+            logger.warning("timestamp 列未按时间排序")
+        if gaps:
+            logger.warning(f"发现 {len(gaps)} 个缺口，共缺失 {missing} 个时间点")
+            for start, end, count in gaps[:REPORT_MAX_GAPS]:
+                logger.warning(f"  {start} -> {end}: 缺失 {count} 个")
+        else:
+            logger.info("时间连续 ✓")
 
         result = {
-            "总时间点数": len(df_sorted),
-            "起始时间": str(df_sorted['timestamp'].min()),
-            "结束时间": str(df_sorted['timestamp'].max())
+            "总时间点数": rows,
+            "起始时间": str(time_range['min']),
+            "结束时间": str(time_range['max']),
+            "是否有序": time_range["sorted"],
+            "缺口数": len(gaps),
+            "缺失点数": missing,
+            "缺口": [(str(start), str(end), count) for start, end, count in gaps]
         }
 
         self.validation_results['time_continuity'] = result
@@ -436,13 +627,40 @@ class FeatureValidator:
                     report_lines.append(f"   - {issue['问题']}: {issue['影响行数']} 行")
             report_lines.append("")
 
+        # 6. 分位数
+        if 'statistics' in self.validation_results:
+            stats = self.validation_results['statistics']
+            labels = [f"p{q * 100:g}" for q in VALIDATION_QUANTILES]
+            report_lines.append(f"6. 分位数 ({' / '.join(labels)})")
+            for col in [c for c in get_feature_columns() if c in stats]:
+                values = " / ".join(f"{stats[col][label]:.6g}" for label in labels)
+                report_lines.append(f"   - {col}: {values}")
+            report_lines.append("")
+
+        # 7. 时间连续性
+        if 'time_continuity' in self.validation_results:
+            result = self.validation_results['time_continuity']
+            status = "✓ 连续" if result['缺口数'] == 0 else f"✗ {result['缺口数']} 个缺口，缺失 {result['缺失点数']} 个时间点"
+            report_lines.append(f"7. 时间连续性: {status}")
+            report_lines.append(f"   - 时间范围: {result['起始时间']} 至 {result['结束时间']}")
+            if not result['是否有序']:
+                report_lines.append("   - timestamp 未排序")
+            for start, end, count in result['缺口'][:REPORT_MAX_GAPS]:
+                report_lines.append(f"   - {start} -> {end}: 缺失 {count} 个")
+            report_lines.append("")
+
+        # 分布漂移
+        if 'drift' in self.validation_results:
+            drift = self.validation_results['drift']
+            status = "✓ 无明显漂移" if not drift['漂移列'] else f"✗ {len(drift['漂移列'])} 列 PSI > {DRIFT_PSI_THRESHOLD}"
+            report_lines.append(f"分布漂移 (基准 {drift['基准']}): {status}")
+            for col in drift['漂移列'][:10]:
+                report_lines.append(f"   - {col}: PSI={drift['详情'][col]['psi']:.3f}")
+            report_lines.append("")
+
         # 总结
         report_lines.append("="*80)
-        total_issues = (
-            (0 if self.validation_results.get('required_columns', False) else 1) +
-            len(self.validation_results.get('feature_columns', {}).get('缺失因子', [])) +
-            self.validation_results.get('data_ranges', {}).get('问题数', 0)
-        )
+        total_issues = self.count_issues()
 
         if total_issues == 0:
             report_lines.append("验证结果: ✓ 全部通过")
@@ -454,14 +672,27 @@ class FeatureValidator:
         report = "\n".join(report_lines)
         return report
 
-    def run_all_checks(self) -> bool:
+    def run_all_checks(self, baseline_sketches: Optional[Path] = None, print_report: bool = True) -> bool:
         """
         运行所有检查
 
+        Args:
+            baseline_sketches: 基准草图文件，给出时比较分布漂移（漂移只报告，不计为失败）
+            print_report: 是否把报告打印到标准输出（报告文件总会保存）
+
         Returns:
             是否全部通过
         """
-        if not self.load_data():
+        if not self.file_path.exists():
+            logger.error(f"文件不存在: {self.file_path}")
+            return False
+
+        try:
+            # 所有数据相关的检查共用一次流式扫描
+            logger.info(f"扫描数据文件: {self.file_path}")
+            self.scan_file()
+        except Exception as e:
+            logger.error(f"读取数据失败: {str(e)}")
             return False
 
         self.check_basic_info()
@@ -471,10 +702,14 @@ class FeatureValidator:
         self.check_data_ranges()
         self.check_statistics()
         self.check_time_continuity()
+        self.save_sketches()
+        if baseline_sketches is not None:
+            self.check_drift(baseline_sketches)
 
         # 生成报告
         report = self.generate_report()
-        print("\n" + report)
+        if print_report:
+            print("\n" + report)
 
         # 保存报告
         report_path = self.file_path.parent / f"{self.file_path.stem}_validation_report.txt"
@@ -483,13 +718,35 @@ class FeatureValidator:
         logger.info(f"\n报告已保存到: {report_path}")
 
         # 判断是否通过
-        total_issues = (
+        return self.count_issues() == 0
+
+    def count_issues(self) -> int:
+        """已运行的检查发现的问题数（缺少必需列、缺失因子、数据范围问题）"""
+        return (
             (0 if self.validation_results.get('required_columns', False) else 1) +
             len(self.validation_results.get('feature_columns', {}).get('缺失因子', [])) +
             self.validation_results.get('data_ranges', {}).get('问题数', 0)
         )
 
-        return total_issues == 0
+    def summary(self) -> Dict:
+        """
+        可合并的验证结果（只含基本类型，可在进程间传递）
+
+        Returns:
+            行数、空值数、范围违规数、累加器、分位数草图、时间范围和缺口、是否通过
+        """
+        time_range = self._scan_results.get("time") or {}
+        return {
+            "file": self.file_path.name,
+            "rows": self._scan_results.get("rows", 0),
+            "nulls": self._scan_results.get("nulls", {}),
+            "ranges": self._scan_results.get("ranges", {}),
+            "statistics": {col: acc.to_dict() for col, acc in self._scan_results.get("statistics", {}).items()},
+            "sketches": {col: sketch.to_dict() for col, sketch in self.sketches.items()},
+            "time": time_range,
+            "missing_features": self.validation_results.get('feature_columns', {}).get('缺失因子', []),
+            "passed": bool(self._scan_results) and self.count_issues() == 0,
+        }
 
 
 def find_output_files(output_dir: Path = FEATURES_OUTPUT_DIR) -> List[Path]:
@@ -518,6 +775,235 @@ def find_output_files(output_dir: Path = FEATURES_OUTPUT_DIR) -> List[Path]:
     return all_files
 
 
+def validate_file(
+    file_path: Path,
+    batch_rows: int = VALIDATION_BATCH_ROWS,
+    baseline_sketches: Optional[Path] = None
+) -> Dict:
+    """
+    验证单个文件并返回可合并的结果（进程池的任务函数）
+
+    Args:
+        file_path: 特征数据文件路径
+        batch_rows: 每批读取的行数
+        baseline_sketches: 基准草图文件
+
+    Returns:
+        FeatureValidator.summary() 的结果
+    """
+    validator = FeatureValidator(Path(file_path), batch_rows)
+    validator.run_all_checks(baseline_sketches, print_report=False)
+    return validator.summary()
+
+
+def merge_summaries(summaries: List[Dict]) -> Dict:
+    """
+    合并多个文件的验证结果
+
+    空值数和范围违规数按列累加，累加器和分位数草图按列合并；
+    文件按起始时间排序后检查相邻文件之间的缺口和时间重叠。
+
+    Args:
+        summaries: 各文件 FeatureValidator.summary() 的结果
+
+    Returns:
+        汇总结果
+    """
+    nulls, ranges = {}, {}
+    accumulators, sketches = {}, {}
+    for summary in summaries:
+        for col, count in summary["nulls"].items():
+            nulls[col] = nulls.get(col, 0) + count
+        for name, count in summary["ranges"].items():
+            ranges[name] = ranges.get(name, 0) + count
+        for col, acc in summary["statistics"].items():
+            accumulators.setdefault(col, RunningStats()).merge(RunningStats.from_dict(acc))
+        merge_sketches(sketches, {col: QuantileSketch.from_dict(s) for col, s in summary["sketches"].items()})
+
+    gaps = [(summary["file"], *gap) for summary in summaries for gap in summary["time"].get("gaps", [])]
+
+    # 相邻文件之间的缺口和重叠
+    timed = sorted((s for s in summaries if s["time"].get("min") is not None), key=lambda s: s["time"]["min"])
+    boundary_gaps, overlaps = [], []
+    for prev, cur in zip(timed, timed[1:]):
+        if cur["time"]["min"] <= prev["time"]["max"]:
+            overlaps.append((prev["file"], cur["file"], cur["time"]["min"], prev["time"]["max"]))
+        elif cur["time"]["min"] - prev["time"]["max"] > EXPECTED_INTERVAL:
+            boundary_gaps.append((prev["file"], cur["file"], *make_gap(prev["time"]["max"], cur["time"]["min"])))
+
+    return {
+        "files": [s["file"] for s in summaries],
+        "failed": [s["file"] for s in summaries if not s["passed"]],
+        "unsorted": [s["file"] for s in summaries if s["time"] and not s["time"]["sorted"]],
+        "rows": sum(s["rows"] for s in summaries),
+        "nulls": nulls,
+        "ranges": ranges,
+        "statistics": accumulators,
+        "sketches": sketches,
+        "time_min": timed[0]["time"]["min"] if timed else None,
+        "time_max": max(s["time"]["max"] for s in timed) if timed else None,
+        "gaps": gaps,
+        "boundary_gaps": boundary_gaps,
+        "overlaps": overlaps,
+        "gap_index": merge_gap_indexes(GapIndex.from_dict(s["time"]["gap_index"]) for s in timed),
+        "missing_features": sorted({f for s in summaries for f in s["missing_features"]}),
+    }
+
+
+def generate_summary_report(merged: Dict, baseline_sketches: Optional[Path] = None) -> str:
+    """
+    生成多文件汇总报告
+
+    Args:
+        merged: merge_summaries 的结果
+        baseline_sketches: 基准草图文件，给出时比较合并后的分布漂移
+
+    Returns:
+        报告文本
+    """
+    lines = []
+    lines.append("="*80)
+    lines.append("特征数据验证汇总报告")
+    lines.append("="*80)
+    lines.append(f"验证时间: {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}")
+    lines.append(f"文件数: {len(merged['files'])}")
+    lines.append(f"总行数: {merged['rows']:,}")
+    lines.append(f"时间范围: {merged['time_min']} 至 {merged['time_max']}")
+    lines.append("")
+
+    if merged['failed']:
+        lines.append(f"未通过的文件: {len(merged['failed'])} 个")
+        for name in merged['failed']:
+            lines.append(f"   - {name}")
+        lines.append("")
+
+    if merged['missing_features']:
+        lines.append(f"缺失因子: {', '.join(merged['missing_features'])}")
+        lines.append("")
+
+    null_cols = {col: count for col, count in merged['nulls'].items() if count > 0}
+    lines.append("空值")
+    lines.append(f"   - 总空值数: {sum(null_cols.values()):,}")
+    lines.append(f"   - 有空值的列: {len(null_cols)} 个")
+    for col, count in sorted(null_cols.items(), key=lambda item: -item[1])[:5]:
+        lines.append(f"   - {col}: {count:,}")
+    lines.append("")
+
+    issues = {name: count for name, count in merged['ranges'].items() if count > 0}
+    lines.append(f"数据范围: {'✓ 通过' if not issues else f'✗ 发现 {len(issues)} 个问题'}")
+    for name, count in sorted(issues.items(), key=lambda item: -item[1]):
+        lines.append(f"   - {name}: {count} 行")
+    lines.append("")
+
+    gaps, boundary_gaps = merged['gaps'], merged['boundary_gaps']
+    missing = sum(gap[-1] for gap in gaps) + sum(gap[-1] for gap in boundary_gaps)
+    lines.append(f"时间连续性: 文件内缺口 {len(gaps)} 个，文件之间缺口 {len(boundary_gaps)} 个，共缺失 {missing} 个时间点")
+    for name, start, end, count in gaps[:REPORT_MAX_GAPS]:
+        lines.append(f"   - {name}: {start} -> {end} 缺失 {count} 个")
+    for prev, cur, start, end, count in boundary_gaps[:REPORT_MAX_GAPS]:
+        lines.append(f"   - {prev} | {cur}: {start} -> {end} 缺失 {count} 个")
+    for prev, cur, start, end in merged['overlaps']:
+        lines.append(f"   - 时间重叠 {prev} | {cur}: {start} 至 {end}")
+    for name in merged['unsorted']:
+        lines.append(f"   - {name}: timestamp 未排序")
+    lines.append("")
+
+    labels = [f"p{q * 100:g}" for q in VALIDATION_QUANTILES]
+    lines.append(f"统计信息 (均值 / 标准差 / {' / '.join(labels)})")
+    for col in [c for c in get_feature_columns() if c in merged['statistics']]:
+        acc = merged['statistics'][col]
+        if acc.count == 0:
+            continue
+        std = f"{acc.std:.6g}" if acc.std is not None else "-"
+        quantiles = " / ".join(f"{q:.6g}" for q in merged['sketches'][col].quantiles(VALIDATION_QUANTILES))
+        lines.append(f"   - {col}: {acc.mean:.6g} / {std} / {quantiles}")
+    lines.append("")
+
+    if baseline_sketches is not None:
+        drift = compare_sketches(load_sketches(baseline_sketches), merged['sketches'], VALIDATION_QUANTILES)
+        drifted = sorted((col for col, d in drift.items() if d["psi"] is not None and d["psi"] > DRIFT_PSI_THRESHOLD),
+                         key=lambda col: -drift[col]["psi"])
+        status = "✓ 无明显漂移" if not drifted else f"✗ {len(drifted)} 列 PSI > {DRIFT_PSI_THRESHOLD}"
+        lines.append(f"分布漂移 (基准 {baseline_sketches}): {status}")
+        for col in drifted[:10]:
+            lines.append(f"   - {col}: PSI={drift[col]['psi']:.3f}")
+        lines.append("")
+
+    lines.append("="*80)
+    if merged['failed']:
+        lines.append(f"验证结果: ✗ {len(merged['failed'])}/{len(merged['files'])} 个文件未通过")
+    else:
+        lines.append("验证结果: ✓ 全部通过")
+    lines.append("="*80)
+    return "\n".join(lines)
+
+
+def validate_files(
+    files: List[Path],
+    workers: int = 1,
+    batch_rows: int = VALIDATION_BATCH_ROWS,
+    baseline_sketches: Optional[Path] = None
+) -> Dict:
+    """
+    验证多个文件并合并结果
+
+    每个文件的报告照常保存；workers > 1 时各文件在进程池中并行验证。
+
+    Args:
+        files: 文件列表
+        workers: 并行进程数
+        batch_rows: 每批读取的行数
+        baseline_sketches: 基准草图文件
+
+    Returns:
+        merge_summaries 的结果
+    """
+    if workers > 1 and len(files) > 1:
+        # polars 的线程池在 fork 后可能死锁，验证进程用 spawn 启动
+        with ProcessPoolExecutor(
+            max_workers=min(workers, len(files)),
+            mp_context=multiprocessing.get_context("spawn")
+        ) as pool:
+            futures = [pool.submit(validate_file, path, batch_rows, baseline_sketches) for path in files]
+            summaries = [future.result() for future in futures]
+    else:
+        summaries = []
+        for i, path in enumerate(files, 1):
+            logger.info(f"\n{'='*80}")
+            logger.info(f"验证文件 {i}/{len(files)}: {path.name}")
+            logger.info(f"{'='*80}")
+            summaries.append(validate_file(path, batch_rows, baseline_sketches))
+
+    return merge_summaries(summaries)
+
+
+def save_summary(merged: Dict, output_dir: Path, baseline_sketches: Optional[Path] = None) -> Path:
+    """
+    保存汇总报告（validation_summary.txt）、合并后的分位数草图（validation_summary_sketches.json）
+    和所有文件合并的缺口索引（validation_summary_gaps.json）
+
+    Args:
+        merged: merge_summaries 的结果
+        output_dir: 输出目录
+        baseline_sketches: 基准草图文件
+
+    Returns:
+        汇总报告路径
+    """
+    report = generate_summary_report(merged, baseline_sketches)
+    print("\n" + report)
+
+    report_path = Path(output_dir) / SUMMARY_REPORT_FILENAME
+    with open(report_path, 'w', encoding='utf-8') as f:
+        f.write(report)
+    if merged['sketches']:
+        save_sketches(report_path.with_name(f"{report_path.stem}_sketches.json"), merged['sketches'],
+                      ", ".join(merged['files']))
+    save_gap_index(report_path.with_name(f"{report_path.stem}_gaps.json"), {"output": merged['gap_index']})
+    logger.info(f"\n汇总报告已保存到: {report_path}")
+    return report_path
+
+
 def main():
     """主函数"""
     import argparse
@@ -528,6 +1014,10 @@ def main():
                         help='输出目录路径（默认从配置读取）')
     parser.add_argument('--all', action='store_true',
                         help='验证目录中的所有文件')
+    parser.add_argument('--baseline', type=str, default=None,
+                        help='基准分位数草图 (<文件名>_sketches.json)，用于比较分布漂移')
+    parser.add_argument('--workers', type=int, default=1,
+                        help='--all 时并行验证的进程数（默认 1）')
 
     args = parser.parse_args()
 
@@ -535,16 +1025,18 @@ def main():
     logger.info("特征数据验证工具")
     logger.info("="*80)
 
+    baseline = Path(args.baseline) if args.baseline else None
+
     if args.file:
         # 验证指定文件
         file_path = Path(args.file)
         validator = FeatureValidator(file_path)
-        success = validator.run_all_checks()
+        success = validator.run_all_checks(baseline)
         return 0 if success else 1
 
     elif args.all:
         # 验证所有文件
-        output_dir = Path("output/features")
+        output_dir = Path(args.dir)
         logger.info(f"目录 {output_dir}")
         files = find_output_files(output_dir)
 
@@ -552,17 +1044,11 @@ def main():
             logger.error("没有找到任何输出文件")
             return 1
 
-        logger.info(f"找到 {len(files)} 个文件")
-
-        all_passed = True
-        for i, file_path in enumerate(files, 1):
-            logger.info(f"\n{'='*80}")
-            logger.info(f"验证文件 {i}/{len(files)}: {file_path.name}")
-            logger.info(f"{'='*80}")
+        logger.info(f"找到 {len(files)} 个文件，并行进程数 {args.workers}")
 
-            validator = FeatureValidator(file_path)
-            if not validator.run_all_checks():
-                all_passed = False
+        merged = validate_files(files, args.workers, baseline_sketches=baseline)
+        save_summary(merged, output_dir, baseline)
+        all_passed = not merged['failed']
 
         logger.info("\n" + "="*80)
         if all_passed:
@@ -591,7 +1077,7 @@ def main():
         # 验证第一个文件
         logger.info(f"\n验证: {files[0].name}")
         validator = FeatureValidator(files[0])
-        success = validator.run_all_checks()
+        success = validator.run_all_checks(baseline)
 
         return 0 if success else 1
 